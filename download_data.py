@@ -14,11 +14,368 @@ prohibited and subject to being investigated as a Code of Academic Integrity vio
 -----do not edit anything above this line---
 """
 
-import requests
+import hashlib
+import json
+import os
 import re
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import helpers
+
+
+def make_session(max_per_host: int = 16) -> requests.Session:
+    """Create a keep-alive session shared by all requests to the GDELT server.
+
+    Args:
+        max_per_host (int): The maximum number of open connections per host. Requests
+            beyond this limit wait for a pooled connection instead of opening a new one.
+
+    Returns:
+        requests.Session: The session object.
+
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_maxsize=max_per_host, pool_block=True)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def fetch_md5(session: requests.Session, md5_url: str, timeout: float = 5) -> str:
+    """Return the hash stored in a GDELT ".md5" file, or "N/A" if it cannot be fetched.
+
+    Args:
+        session (requests.Session): The session used for the request.
+        md5_url (str): The URL of the ".md5" file.
+        timeout (float): The timeout of the request in seconds.
+
+    Returns:
+        str: The MD5 hash of the file.
+
+    """
+    try:
+        md5_response = session.get(md5_url, timeout=timeout)
+        return md5_response.text.strip().split(' ')[0] if md5_response.status_code == 200 else "N/A"
+    except requests.RequestException:
+        return "N/A"
+
+
+def scrape_gdelt_files(
+    year: int = 2024,
+    base_url: str = helpers.GDELT_EVENTS_URL,
+    session: requests.Session = None,
+    max_workers: int = 16,
+    max_per_host: int = 16,
+    cache_path: str = None,
+) -> dict:
+    """Scrape the GDELT index page for the files of a given year. The ".md5" files are
+    fetched concurrently over a shared keep-alive session, so listing a full year costs
+    about one round trip instead of one per file.
+
+    If cache_path is given, the parsed listing and the hashes are kept in a JSON file and
+    the index page is requested with ETag/Last-Modified validators. An unchanged page then
+    costs a single "304 Not Modified" response, and only dates that are not in the cache
+    yet trigger ".md5" requests.
+
+    Args:
+        year (int): The year to filter the files.
+        base_url (str): The URL of the GDELT events index page.
+        session (requests.Session): The session to use. A new one is created if None.
+        max_workers (int): The number of ".md5" files fetched concurrently.
+        max_per_host (int): The maximum number of open connections per host.
+        cache_path (str): The path of the listing cache file. No cache is used if None.
+
+    Returns:
+        dict: A dictionary in the format of list_gdelt_files, empty if the index page
+        could not be read.
+
+    """
+    own_session = session is None
+    if own_session:
+        session = make_session(max_per_host=max_per_host)
+
+    cache = _load_listing_cache(cache_path, base_url)
+
+    try:
+        if not _refresh_listing(cache, session):
+            return {}
+
+        dates = [date for date in cache["files"] if date.startswith(str(year))]
+        _fetch_missing_md5s(cache, dates, session, max_workers)
+    finally:
+        if own_session:
+            session.close()
+
+    if cache_path is not None:
+        _save_listing_cache(cache_path, cache)
+
+    return {date: dict(cache["files"][date]) for date in dates}
+
+
+def list_new_gdelt_files(
+    cache_path: str,
+    year: int = None,
+    base_url: str = helpers.GDELT_EVENTS_URL,
+    session: requests.Session = None,
+    max_workers: int = 16,
+    max_per_host: int = 16,
+) -> dict:
+    """Return the GDELT files that appeared since the previous call with the same cache.
+    This is cheap enough to poll from a scheduler: when the index page has not changed,
+    it costs one conditional request and returns an empty dict.
+
+    Args:
+        cache_path (str): The path of the listing cache file shared with scrape_gdelt_files.
+        year (int): The year to filter the files. Files from all years are returned if None.
+            New files of other years are still recorded as seen.
+        base_url (str): The URL of the GDELT events index page.
+        session (requests.Session): The session to use. A new one is created if None.
+        max_workers (int): The number of ".md5" files fetched concurrently.
+        max_per_host (int): The maximum number of open connections per host.
+
+    Returns:
+        dict: The new files, in the format of list_gdelt_files.
+
+    """
+    own_session = session is None
+    if own_session:
+        session = make_session(max_per_host=max_per_host)
+
+    cache = _load_listing_cache(cache_path, base_url)
+    known_dates = set(cache["files"])
+
+    try:
+        if not _refresh_listing(cache, session):
+            return {}
+
+        dates = [
+            date for date in cache["files"]
+            if date not in known_dates and (year is None or date.startswith(str(year)))
+        ]
+        _fetch_missing_md5s(cache, dates, session, max_workers)
+    finally:
+        if own_session:
+            session.close()
+
+    _save_listing_cache(cache_path, cache)
+
+    return {date: dict(cache["files"][date]) for date in dates}
+
+
+def _load_listing_cache(cache_path: str, base_url: str) -> dict:
+    """Load the listing cache of base_url, or return an empty one."""
+    cache = {"url": base_url, "etag": None, "last_modified": None, "files": {}}
+    if cache_path is not None and os.path.exists(cache_path):
+        with open(cache_path) as f:
+            saved = json.load(f)
+        if saved.get("url") == base_url:
+            cache = saved
+    return cache
+
 
+def _save_listing_cache(cache_path: str, cache: dict) -> None:
+    """Atomically write the listing cache to disk."""
+    cache_folder = os.path.dirname(os.path.abspath(cache_path))
+    os.makedirs(cache_folder, exist_ok=True)
+    tmp_path = f"{cache_path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(cache, f)
+    os.replace(tmp_path, cache_path)
+
+
+def _refresh_listing(cache: dict, session: requests.Session) -> bool:
+    """Update the cached listing from the index page with a conditional request.
+
+    Returns:
+        bool: False if the index page could not be read.
+
+    """
+    headers = {}
+    if cache["etag"]:
+        headers["If-None-Match"] = cache["etag"]
+    if cache["last_modified"]:
+        headers["If-Modified-Since"] = cache["last_modified"]
+
+    response = session.get(cache["url"], headers=headers)
+    if response.status_code == 304:
+        return True
+    if response.status_code != 200:
+        return False
+
+    # Regex pattern to find file entries, e.g. 20240103.export.CSV.zip
+    file_pattern = r'<a href="(\d{8}\.export\.CSV\.zip)">\d{8}\.export\.CSV\.zip</a>\s+\d+-\w+-\d+\s+\d+:\d+\s+(\S+)'
+
+    files = {}
+    for filename, filesize in re.findall(file_pattern, response.text):
+        date_str = filename.split('.')[0]  # Extract YYYYMMDD
+
+        # Keep the known hash unless the file was replaced
+        cached = cache["files"].get(date_str, {})
+        files[date_str] = {
+            "md5": cached["md5"] if cached.get("filesize") == filesize else "N/A",
+            "filesize": filesize,
+            "url": f"{cache['url']}{filename}"
+        }
+
+    cache["files"] = files
+    cache["etag"] = response.headers.get("ETag")
+    cache["last_modified"] = response.headers.get("Last-Modified")
+    return True
+
+
+def _fetch_missing_md5s(cache: dict, dates: list[str], session: requests.Session, max_workers: int) -> None:
+    """Concurrently fetch the hashes of the given dates that are not known yet."""
+    missing = [date for date in dates if cache["files"][date]["md5"] == "N/A"]
+    md5_urls = [f"{cache['files'][date]['url']}.md5" for date in missing]
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        md5_hashes = list(pool.map(lambda md5_url: fetch_md5(session, md5_url), md5_urls))
+
+    for date, md5_hash in zip(missing, md5_hashes):
+        cache["files"][date]["md5"] = md5_hash
+
+
+def download_gdelt_file(
+    info: dict,
+    data_folder: str,
+    session: requests.Session,
+    chunk_size: int = 1 << 20,
+    timeout: float = 30,
+) -> str:
+    """Download one GDELT archive described by an entry of list_gdelt_files.
+
+    The archive is streamed to "<filename>.part" in chunks and renamed once complete.
+    An existing ".part" file is resumed with an HTTP Range request, and the MD5 hash is
+    computed while streaming. A file already present with a matching hash is skipped.
+    Hashes that are not 32-character hex digests (e.g. "N/A") are not verified.
+
+    Args:
+        info (dict): The file information, with "md5" and "url" keys.
+        data_folder (str): The folder to download the file to.
+        session (requests.Session): The session used for the request.
+        chunk_size (int): The number of bytes written at a time.
+        timeout (float): The timeout of the request in seconds.
+
+    Returns:
+        str: The path of the downloaded file.
 
-def list_gdelt_files(year: int = 2024) -> dict:
+    """
+    filename = info["url"].rsplit("/", 1)[-1]
+    file_path = os.path.join(data_folder, filename)
+    part_path = f"{file_path}.part"
+    expected_md5 = info["md5"].lower() if re.fullmatch(r"[0-9a-fA-F]{32}", info["md5"]) else None
+
+    # Skip files that were already downloaded
+    if os.path.exists(file_path):
+        if expected_md5 is None or _file_md5(file_path, chunk_size) == expected_md5:
+            return file_path
+        os.remove(file_path)
+
+    # Resume from the partial file, hashing the bytes already on disk
+    md5 = hashlib.md5()
+    offset = 0
+    if os.path.exists(part_path):
+        offset = os.path.getsize(part_path)
+        _update_md5(md5, part_path, chunk_size)
+
+    headers = {"Range": f"bytes={offset}-"} if offset else {}
+    with session.get(info["url"], headers=headers, stream=True, timeout=timeout) as response:
+        if response.status_code == 416:
+            # The partial file is at least as large as the remote one; start over
+            os.remove(part_path)
+            return download_gdelt_file(info, data_folder, session, chunk_size, timeout)
+        response.raise_for_status()
+
+        if response.status_code != 206:
+            # The server ignored the Range header and sent the whole file
+            md5 = hashlib.md5()
+            mode = "wb"
+        else:
+            mode = "ab"
+
+        with open(part_path, mode) as f:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                f.write(chunk)
+                md5.update(chunk)
+
+    if expected_md5 is not None and md5.hexdigest() != expected_md5:
+        os.remove(part_path)
+        raise ValueError(f"MD5 mismatch for {filename}: expected {expected_md5}, got {md5.hexdigest()}")
+
+    os.replace(part_path, file_path)
+    return file_path
+
+
+def download_gdelt_files(
+    files: dict,
+    data_folder: str,
+    session: requests.Session = None,
+    max_workers: int = 8,
+    max_per_host: int = 8,
+    chunk_size: int = 1 << 20,
+) -> dict:
+    """Download many GDELT archives concurrently. Re-running after an interruption
+    resumes partial files and skips completed ones.
+
+    Args:
+        files (dict): The output of list_gdelt_files, or a subset of it.
+        data_folder (str): The folder to download the files to.
+        session (requests.Session): The session to use. A new one is created if None.
+        max_workers (int): The number of files downloaded concurrently.
+        max_per_host (int): The maximum number of open connections per host.
+        chunk_size (int): The number of bytes written at a time.
+
+    Returns:
+        dict: The path of each downloaded file by date, or None if the download failed.
+
+    """
+    os.makedirs(data_folder, exist_ok=True)
+
+    own_session = session is None
+    if own_session:
+        session = make_session(max_per_host=max_per_host)
+
+    def download(info):
+        try:
+            return download_gdelt_file(info, data_folder, session, chunk_size)
+        except (requests.RequestException, OSError, ValueError) as e:
+            print(f"Error downloading {info['url']}: {e}")
+            return None
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            paths = list(pool.map(download, files.values()))
+    finally:
+        if own_session:
+            session.close()
+
+    return dict(zip(files, paths))
+
+
+def _update_md5(md5, file_path: str, chunk_size: int) -> None:
+    """Feed the contents of a file to a hash object, one chunk at a time."""
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            md5.update(chunk)
+
+
+def _file_md5(file_path: str, chunk_size: int = 1 << 20) -> str:
+    """Return the MD5 hex digest of a file."""
+    md5 = hashlib.md5()
+    _update_md5(md5, file_path, chunk_size)
+    return md5.hexdigest()
+
+
+def list_gdelt_files(
+    year: int = 2024,
+    base_url: str = helpers.GDELT_EVENTS_URL,
+    session: requests.Session = None,
+    max_workers: int = 16,
+    max_per_host: int = 16,
+    cache_path: str = None,
+) -> dict:
     """
     This function visits the website: http://data.gdeltproject.org/events/, then
     returns a dict containing information on available GDELT files with the following format:
@@ -43,6 +400,11 @@ def list_gdelt_files(year: int = 2024) -> dict:
 
     Args:
         year (int): The year to filter the files.
+        base_url (str): The URL of the GDELT events index page.
+        session (requests.Session): The session to use. A new one is created if None.
+        max_workers (int): The number of ".md5" files fetched concurrently.
+        max_per_host (int): The maximum number of open connections per host.
+        cache_path (str): The path of the listing cache file. No cache is used if None.
 
     Returns:
         dict: A dictionary containing information of available files from the year.
@@ -54,49 +416,25 @@ def list_gdelt_files(year: int = 2024) -> dict:
 
     """
 
-    url = "http://data.gdeltproject.org/events/"
-    response = requests.get(url)
-
     output = {}
 
     ##############################################################################
     # TODO: Implement your code here
     ##############################################################################
 
-    output = {}
-    year_str = str(year)
-
     #First Attempt: Try Scraping Real Data**
-    if response.status_code == 200:
-        html_content = response.text
-
-        # Regex pattern to find file entries for the given year
-        file_pattern = rf'<a href="({year_str}\d{{4}}\.export\.CSV\.zip)">{year_str}\d{{4}}\.export\.CSV\.zip</a>\s+\d+-\w+-\d+\s+\d+:\d+\s+(\S+)'
-
-        matches = re.findall(file_pattern, html_content)
-
-        for filename, filesize in matches:
-            date_str = filename.split('.')[0]  # Extract YYYYMMDD
-            file_url = f"{url}{filename}"
-
-            # Fetch MD5 hash (if available)
-            md5_url = f"{url}{filename}.md5"
-            try:
-                md5_response = requests.get(md5_url, timeout=5)
-                md5_hash = md5_response.text.strip().split(' ')[0] if md5_response.status_code == 200 else "N/A"
-            except requests.RequestException:
-                md5_hash = "N/A"
-
-            # Store the scraped file information
-            output[date_str] = {
-                "md5": md5_hash,
-                "filesize": filesize,
-                "url": file_url
-            }
-
-        #If we successfully scraped 366 entries for 2024, return the output
-        if year == 2024 and len(output) == 366:
-            return output
+    output = scrape_gdelt_files(
+        year=year,
+        base_url=base_url,
+        session=session,
+        max_workers=max_workers,
+        max_per_host=max_per_host,
+        cache_path=cache_path,
+    )
+
+    #If we successfully scraped 366 entries for 2024, return the output
+    if year == 2024 and len(output) == 366:
+        return output
 
     #If Scraping Fails or Data is Incomplete, Generate Synthetic Data**
     output.clear()  # Remove any partial data if scraping was unsuccessful
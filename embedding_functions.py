@@ -0,0 +1,384 @@
+""" embedding_functions.py: Embedding functions for vector_database.py.
+
+Copyright 2025, Cornell University
+
+Cornell University asserts copyright ownership of this template and all derivative
+works, including solutions to the projects assigned in this course. Students
+and other users of this template code are advised not to share it with others
+or to make it available on publicly viewable websites including online repositories
+such as Github.
+
+Sharing solutions with current or future students of ENMGT5400 is
+prohibited and subject to being investigated as a Code of Academic Integrity violation.
+
+-----do not edit anything above this line---
+"""
+
+import hashlib
+import json
+import os
+import threading
+import warnings
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from functools import cached_property, partial
+
+import chromadb
+import chromadb.utils.embedding_functions as ef
+import numpy as np
+
+
+class CachedEmbeddingFunction(chromadb.EmbeddingFunction):
+    """Wrap an embedding function and cache the embedding of each document text.
+
+    The same event documents recur across daily files, so their embeddings are
+    computed once. Vectors are kept in a memory-mapped float32 array of capacity
+    rows, next to the md5 hash of their text and a last-used counter. The hash
+    index is rebuilt from these arrays when the cache is reopened, and the least
+    recently used vector is evicted when the cache is full. The texts of the
+    current call are never evicted by it. The name and configuration of the
+    wrapped function are saved with the cache, which starts over when they
+    change. Without a cache_folder, the cache only lives in memory.
+
+    The name and configuration are those of the wrapped function, so collections
+    created with either can be opened with the other.
+
+    """
+
+    def __init__(
+        self,
+        embedding_function: chromadb.EmbeddingFunction,
+        cache_folder: str = None,
+        capacity: int = 100_000,
+    ):
+        """
+        Args:
+            embedding_function (chromadb.EmbeddingFunction): The embedding function to cache.
+            cache_folder (str): The folder of the cache files, in memory only if None.
+            capacity (int): The maximum number of cached embeddings.
+
+        """
+        self.embedding_function = embedding_function
+        self.cache_folder = cache_folder
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._index = OrderedDict()  # md5 digest -> slot, least recently used first
+        self._vectors = None
+        self._hashes = None
+        self._ticks = None
+        self._tick = 0
+
+        if cache_folder is not None and os.path.exists(self._path("cache.json")):
+            with open(self._path("cache.json")) as f:
+                config = json.load(f)
+            if config["capacity"] == capacity and config.get("model") == self._model():
+                self._open(config["dimension"], mode="r+")
+
+    def __call__(self, input: list[str]) -> list[np.ndarray]:
+        keys = [hashlib.md5(text.encode("utf-8")).digest() for text in input]
+
+        with self._lock:
+            slots = [self._touch(key) for key in keys]
+            missing = list(dict.fromkeys(key for key, slot in zip(keys, slots) if slot is None))
+            self.hits += len(keys) - sum(slot is None for slot in slots)
+            self.misses += sum(slot is None for slot in slots)
+
+            # Copied now, as storing the missing embeddings can reuse their slots
+            found = {key: np.array(self._vectors[slot]) for key, slot in zip(keys, slots) if slot is not None}
+
+        if not missing:
+            return [found[key] for key in keys]
+
+        # Embed each missing text once, outside the lock
+        texts = dict(zip(keys, input))
+        embeddings = self.embedding_function([texts[key] for key in missing])
+        computed = dict(zip(missing, (np.asarray(embedding, dtype=np.float32) for embedding in embeddings)))
+
+        with self._lock:
+            if self._vectors is None:
+                self._open(len(embeddings[0]), mode="w+")
+            pinned = set(keys)
+            for key, embedding in computed.items():
+                if key not in self._index:
+                    self._store(key, embedding, pinned)
+
+        return [computed[key] if key in computed else found[key] for key in keys]
+
+    def name(self) -> str:
+        return self.embedding_function.name()
+
+    def get_config(self) -> dict:
+        return self.embedding_function.get_config()
+
+    def build_from_config(self, config: dict) -> chromadb.EmbeddingFunction:
+        return self.embedding_function.build_from_config(config)
+
+    def default_space(self) -> str:
+        return self.embedding_function.default_space()
+
+    def supported_spaces(self) -> list[str]:
+        return self.embedding_function.supported_spaces()
+
+    def stats(self) -> dict:
+        """Return the hits, misses, hit rate and size of the cache."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size": len(self._index),
+        }
+
+    def flush(self) -> None:
+        """Write the cached embeddings to disk."""
+        with self._lock:
+            for array in (self._vectors, self._hashes, self._ticks):
+                if isinstance(array, np.memmap):
+                    array.flush()
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def _path(self, filename: str) -> str:
+        return os.path.join(self.cache_folder, filename)
+
+    def _open(self, dimension: int, mode: str) -> None:
+        """Create or open the arrays of the cache and rebuild its index."""
+        if self.cache_folder is None:
+            self._vectors = np.zeros((self.capacity, dimension), dtype=np.float32)
+            self._hashes = np.zeros((self.capacity, 16), dtype=np.uint8)
+            self._ticks = np.zeros(self.capacity, dtype=np.int64)
+            return
+
+        if mode == "w+":
+            os.makedirs(self.cache_folder, exist_ok=True)
+            with open(self._path("cache.json"), "w") as f:
+                json.dump({"capacity": self.capacity, "dimension": dimension, "model": self._model()}, f)
+
+        self._vectors = np.memmap(self._path("vectors.f32"), np.float32, mode, shape=(self.capacity, dimension))
+        self._hashes = np.memmap(self._path("hashes.u8"), np.uint8, mode, shape=(self.capacity, 16))
+        self._ticks = np.memmap(self._path("ticks.i64"), np.int64, mode, shape=(self.capacity,))
+
+        # A slot is used once its tick is set, which is written last
+        used = np.flatnonzero(self._ticks)
+        for slot in used[np.argsort(self._ticks[used])]:
+            self._index[self._hashes[slot].tobytes()] = int(slot)
+        self._tick = int(self._ticks.max()) if len(used) else 0
+
+    def _model(self) -> dict:
+        """Return the name and configuration of the wrapped function, as saved in cache.json."""
+        with warnings.catch_warnings():
+            # Functions without a configuration return NotImplemented, with a warning
+            warnings.simplefilter("ignore", DeprecationWarning)
+            config = self.embedding_function.get_config()
+        model = {"name": self.embedding_function.name(), "config": config if isinstance(config, dict) else None}
+        return json.loads(json.dumps(model, sort_keys=True, default=str))
+
+    def _touch(self, key: bytes) -> int:
+        """Return the slot of key and mark it as recently used, or None if it is not cached."""
+        slot = self._index.get(key)
+        if slot is not None:
+            self._index.move_to_end(key)
+            self._tick += 1
+            self._ticks[slot] = self._tick
+        return slot
+
+    def _store(self, key: bytes, embedding: np.ndarray, pinned: set = frozenset()) -> None:
+        """Store an embedding in a free slot, or in the slot of the least recently used one.
+
+        Embeddings whose key is pinned are not evicted, and the embedding is not
+        stored if all the slots are pinned.
+
+        """
+        if len(self._index) < self.capacity:
+            slot = len(self._index)
+        else:
+            # The pinned keys were used last, so the search stops early
+            victim = next((old_key for old_key in self._index if old_key not in pinned), None)
+            if victim is None:
+                return
+            slot = self._index.pop(victim)
+            self._ticks[slot] = 0
+
+        self._vectors[slot] = embedding
+        self._hashes[slot] = np.frombuffer(key, dtype=np.uint8)
+        self._tick += 1
+        self._ticks[slot] = self._tick
+        self._index[key] = slot
+
+
+class ThreadedONNXMiniLM_L6_V2(ef.ONNXMiniLM_L6_V2):
+    """Chroma's default MiniLM model, with an ONNX session limited to a number of threads.
+
+    ONNX Runtime uses every core of the machine by default, so worker processes
+    sharing the machine each get their share of the cores instead. The session
+    is built like Chroma's own, from the model it downloads on the first call,
+    on the CPU.
+
+    """
+
+    def __init__(self, num_threads: int):
+        """
+        Args:
+            num_threads (int): The number of threads of the ONNX session.
+
+        """
+        super().__init__(preferred_providers=["CPUExecutionProvider"])
+        self.num_threads = num_threads
+
+    @cached_property
+    def model(self):
+        options = self.ort.SessionOptions()
+        options.log_severity_level = 3
+        options.graph_optimization_level = self.ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = self.num_threads
+        options.inter_op_num_threads = 1
+
+        return self.ort.InferenceSession(
+            os.path.join(self.DOWNLOAD_PATH, self.EXTRACTED_FOLDER_NAME, "model.onnx"),
+            providers=["CPUExecutionProvider"],
+            sess_options=options,
+        )
+
+
+def onnx_embedding_function(num_threads: int = None) -> chromadb.EmbeddingFunction:
+    """Return Chroma's default MiniLM model, holding one ONNX session for all calls.
+
+    DefaultEmbeddingFunction loads a new ONNX session on every call, and ONNX
+    Runtime uses every core of the machine by default.
+
+    Args:
+        num_threads (int): The number of threads of the ONNX session, ONNX Runtime's default if None.
+
+    Returns:
+        chromadb.EmbeddingFunction: The embedding function.
+
+    """
+    if num_threads:
+        return ThreadedONNXMiniLM_L6_V2(num_threads)
+    return ef.ONNXMiniLM_L6_V2(preferred_providers=["CPUExecutionProvider"])
+
+
+def default_embedding_function() -> chromadb.EmbeddingFunction:
+    """Return Chroma's default embedding function, loading its model on the first call only.
+
+    Returns:
+        chromadb.EmbeddingFunction: The embedding function, named like DefaultEmbeddingFunction.
+
+    """
+    return ParallelEmbeddingFunction(num_workers=1, threads_per_worker=os.cpu_count())
+
+
+class ParallelEmbeddingFunction(chromadb.EmbeddingFunction):
+    """Embed documents in batches spread over a pool of worker processes.
+
+    Each worker builds its own embedding function with factory when it starts,
+    and keeps it, and its model session, for all the batches it embeds. By
+    default, the workers run Chroma's default model with the cores of the
+    machine split evenly between them, and the name and configuration are
+    those of DefaultEmbeddingFunction.
+
+    """
+
+    def __init__(
+        self,
+        num_workers: int = None,
+        batch_size: int = 64,
+        factory=None,
+        threads_per_worker: int = None,
+    ):
+        """
+        Args:
+            num_workers (int): The number of worker processes, the number of CPUs if None.
+            batch_size (int): The number of documents sent to a worker at a time.
+            factory (callable): A picklable function returning the embedding function of a worker,
+                Chroma's default model if None.
+            threads_per_worker (int): The number of ONNX threads of each worker with the default model,
+                the number of CPUs divided by num_workers if None.
+
+        """
+        self.num_workers = num_workers or os.cpu_count()
+        self.batch_size = batch_size
+
+        if factory is None:
+            threads_per_worker = threads_per_worker or max(1, os.cpu_count() // self.num_workers)
+            self.factory = partial(onnx_embedding_function, threads_per_worker)
+            self.embedding_function = ef.DefaultEmbeddingFunction()
+        else:
+            self.factory = factory
+            self.embedding_function = factory()
+
+        self._local = None
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def __call__(self, input: list[str]) -> list[np.ndarray]:
+        batches = [input[i:i + self.batch_size] for i in range(0, len(input), self.batch_size)]
+
+        if self.num_workers == 1 or len(batches) <= 1:
+            with self._lock:
+                if self._local is None:
+                    self._local = self.factory()
+                return list(self._local(list(input)))
+
+        embeddings = []
+        for batch in self._pool().map(_embed_in_worker, batches):
+            embeddings.extend(batch)
+        return embeddings
+
+    def name(self) -> str:
+        return self.embedding_function.name()
+
+    def get_config(self) -> dict:
+        return self.embedding_function.get_config()
+
+    def build_from_config(self, config: dict) -> chromadb.EmbeddingFunction:
+        return self.embedding_function.build_from_config(config)
+
+    def default_space(self) -> str:
+        return self.embedding_function.default_space()
+
+    def supported_spaces(self) -> list[str]:
+        return self.embedding_function.supported_spaces()
+
+    def close(self) -> None:
+        """Stop the worker processes."""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def _pool(self) -> ProcessPoolExecutor:
+        """Return the pool of workers, started on first use."""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.num_workers,
+                    initializer=_init_embedding_worker,
+                    initargs=(self.factory,),
+                )
+            return self._executor
+
+
+# The embedding function of a worker process, built by _init_embedding_worker
+_worker_embedding_function = None
+
+
+def _init_embedding_worker(factory) -> None:
+    """Build the embedding function of a ParallelEmbeddingFunction process."""
+    global _worker_embedding_function
+    _worker_embedding_function = factory()
+
+
+def _embed_in_worker(documents: list[str]) -> list[np.ndarray]:
+    """Embed a batch of documents in a ParallelEmbeddingFunction process."""
+    return [np.asarray(embedding, dtype=np.float32) for embedding in _worker_embedding_function(documents)]
@@ -87,9 +87,16 @@ GDELTFIELDNAMES = [
 ]
 
 
+GDELT_EVENTS_URL = "http://data.gdeltproject.org/events/"
+
 COLLECTION_NAME = "gdelt"
 
 DATABASE_FOLDER = os.path.join(
     os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
     "vector_database",
 )
+
+CACHE_FOLDER = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "cache",
+)
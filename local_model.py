@@ -14,7 +14,11 @@ prohibited and subject to being investigated as a Code of Academic Integrity vio
 -----do not edit anything above this line---
 """
 
-import ollama
+import asyncio
+import re
+import time
+
+from response_cache import ResponseCache
 
 
 def select_short(country: str) -> str:
@@ -27,11 +31,16 @@ def select_long(country: str) -> str:
     return f"Long {country}"
 
 
-def generate_response(prompt: str) -> str:
+def generate_response(
+    prompt: str, cache: ResponseCache = None, options: dict = None, bypass_cache: bool = False
+) -> str:
     """Return response from the model. The response is a string that answers the prompt.
 
     Args:
         prompt (str): The prompt to send to the model.
+        cache (ResponseCache): The cache of the responses, used if options has a temperature of zero.
+        options (dict): The options of the model, e.g. {"temperature": 0}.
+        bypass_cache (bool): Whether to generate the response again, and update the cache with it.
 
     Returns:
         str: The summary of the events.
@@ -45,15 +54,23 @@ def generate_response(prompt: str) -> str:
     # TODO: Implement your code here
     ##############################################################################
 
+    key, cached = _cached_response(cache, bypass_cache, model, prompt, options)
+    if cached is not None:
+        return cached
+
     try:
-        client = ollama.Client()
-        response = client.generate(model=model, prompt=prompt)
+        response = _generate(prompt, model, options)
 
         # Extract response safely
         event_summary = response.get("response", "").strip()
 
     except Exception as e:
-        event_summary = f"Error generating response: {str(e)}"
+        event_summary = _generation_error(e)
+
+    else:
+        # Outside the try, so that a cache error is not reported as a generation error
+        if key is not None:
+            cache.set(key, event_summary)
 
     return event_summary
 
@@ -62,7 +79,144 @@ def generate_response(prompt: str) -> str:
     return event_summary
 
 
-def recommend_trade(country_of_interest: str, event_summary: str) -> str:
+def stream_response(
+    prompt: str,
+    model: str = "llama3.2",
+    options: dict = None,
+    stop_keywords: list[str] = None,
+    max_tokens: int = None,
+    stats: dict = None,
+    cache: ResponseCache = None,
+    bypass_cache: bool = False,
+):
+    """Yield the response of the model to a prompt chunk by chunk, as it is generated.
+
+    The first words can be shown after the time to first token rather than
+    after the whole response. Generation stops early, and the request is closed
+    so the server stops too, once the response contains one of stop_keywords as
+    a whole word or max_tokens chunks were received. Only complete responses
+    are cached. If the request fails, the error is yielded like generate_response
+    returns it, and the reason of the stop in stats is "error".
+
+    Args:
+        prompt (str): The prompt to send to the model.
+        model (str): The model to use.
+        options (dict): The options of the model, e.g. {"temperature": 0}.
+        stop_keywords (list[str]): Stop after the chunk completing one of these words, as a whole word,
+            ignoring case.
+        max_tokens (int): Stop after this number of chunks, each about one token, no limit if None.
+        stats (dict): If given, filled with the time to first token and the total time in seconds,
+            the number of tokens, the tokens per second and the reason of an early stop, if any:
+            "keyword", "max_tokens" or "error".
+        cache (ResponseCache): The cache of the responses, used if options has a temperature of zero.
+        bypass_cache (bool): Whether to generate the response again, and update the cache with it.
+
+    Yields:
+        str: The chunks of the response.
+
+    """
+    start_time = time.perf_counter()
+    if stats is not None:
+        stats.update(ttft=None, seconds=0.0, tokens=0, tokens_per_sec=0.0, stopped=None, cached=False)
+
+    key, cached = _cached_response(cache, bypass_cache, model, prompt, options)
+    if cached is not None:
+        if stats is not None:
+            stats.update(ttft=time.perf_counter() - start_time, cached=True)
+        yield cached
+        return
+
+    # A keyword is complete once the next character is not part of the same word
+    stop_pattern = None
+    if stop_keywords:
+        stop_pattern = re.compile(rf"\b(?:{'|'.join(map(re.escape, stop_keywords))})(?=\W)", re.IGNORECASE)
+        longest = max(map(len, stop_keywords))
+
+    text = ""
+    tokens = 0
+    stopped = None
+    error = None
+    stream = None
+    last = None
+    try:
+        stream = _generate(prompt, model, options, stream=True)
+        for chunk in stream:
+            last = chunk
+            piece = chunk.get("response", "")
+            if not piece:
+                continue
+
+            if tokens == 0 and stats is not None:
+                stats["ttft"] = time.perf_counter() - start_time
+            tokens += 1
+            text += piece
+            yield piece
+
+            # Only the end of the text can complete a keyword
+            if stop_pattern and stop_pattern.search(text, max(0, len(text) - len(piece) - longest - 1)):
+                stopped = "keyword"
+            elif max_tokens is not None and tokens >= max_tokens:
+                stopped = "max_tokens"
+            if stopped:
+                break
+
+    except Exception as e:
+        stopped = "error"
+        error = _generation_error(e)
+
+    finally:
+        # Closing the stream early ends the HTTP request, which stops the generation on the server.
+        # This also runs when the caller stops iterating.
+        if hasattr(stream, "close"):
+            stream.close()
+        if stats is not None:
+            _stream_stats(stats, time.perf_counter() - start_time, tokens, stopped, last)
+
+    if error is not None:
+        yield error
+    elif key is not None and stopped is None:
+        cache.set(key, text.strip())
+
+
+def _generate(prompt: str, model: str, options: dict = None, stream: bool = False):
+    """Send the generate request of generate_response, or of stream_response if stream is True.
+
+    Returns:
+        The response, or an iterator of its chunks if stream is True.
+
+    """
+    import ollama
+
+    client = ollama.Client()
+    kwargs = {"options": options} if options else {}
+    if stream:
+        kwargs["stream"] = True
+    return client.generate(model=model, prompt=prompt, **kwargs)
+
+
+def _generation_error(error: Exception) -> str:
+    """Return the text that replaces a response when its request failed."""
+    return f"Error generating response: {str(error)}"
+
+
+def _stream_stats(stats: dict, seconds: float, tokens: int, stopped: str, last) -> None:
+    """Fill the statistics of stream_response, given the last chunk received."""
+    stats.update(seconds=seconds, tokens=tokens, stopped=stopped)
+    if last is not None and last.get("done") and last.get("eval_duration"):
+        # The server's own count, without the time to load the model and read the prompt
+        stats["tokens"] = last.get("eval_count") or tokens
+        stats["tokens_per_sec"] = stats["tokens"] / (last.get("eval_duration") / 1e9)
+    elif tokens and stats["ttft"] is not None and seconds > stats["ttft"]:
+        stats["tokens_per_sec"] = (tokens - 1) / (seconds - stats["ttft"])
+
+
+def recommend_trade(
+    country_of_interest: str,
+    event_summary: str,
+    stats: dict = None,
+    cache: ResponseCache = None,
+    bypass_cache: bool = False,
+) -> str:
     """Return outputs from mode's selected function. The model selects a function
     to short or long a country based on a given summary of events in a country.
 
@@ -74,6 +228,10 @@ def recommend_trade(country_of_interest: str, event_summary: str) -> str:
     Args:
         country_of_interest (str): The country of interest.
         event_summary (str): The summary of events in the country.
+        stats (dict): If given, filled with the latency of the request in seconds, whether a tool
+            was selected and whether the decision came from the cache.
+        cache (ResponseCache): The cache of the trade decisions.
+        bypass_cache (bool): Whether to ask the model again, and update the cache with its decision.
 
     Returns:
         str: The output from the model's selected function.
@@ -85,55 +243,324 @@ def recommend_trade(country_of_interest: str, event_summary: str) -> str:
     # TODO: Implement your code here
     # Note: Use the temperature of zero for deterministic outputs
     ##############################################################################
-    
-    try:
-        client = ollama.Client()
-        model = "llama3.2"
-
-        #Prompt Engineering: Ensure the model ONLY responds with 'long' or 'short'**
-        response = client.chat(
-            model=model,
-            messages=[
-                {"role": "system", "content": (
-                    "You are an expert financial analyst specializing in trading strategies. "
-                    "Based on the event summary below, determine if we should 'long' or 'short' "
-                    f"assets for {country_of_interest}.\n"
-                    "STRICT RULE: Your response MUST be either 'long' or 'short'. No explanations."
-                )},
-                {"role": "user", "content": event_summary.strip()}
-            ]
-        )
-        
-        if "DO NOT INVEST IN" in event_summary:
-            return select_short(country_of_interest)
-    
-        if "INVEST IN" in event_summary:
-            return select_long(country_of_interest)
-        
-        # Handle the case of mocked response in tests
-        if hasattr(response := client.chat(
-            model=model,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": f"Event summary for {country_of_interest}: {event_summary}"}
-            ]
-        ), 'message') and hasattr(response.message, 'tool_calls') and response.message.tool_calls:
-            # Extract function name from the tool call
-            tool_call = response.message.tool_calls[0]
-            function_name = tool_call.function.name
-            
-            if function_name == "select_long":
-                return select_long(country_of_interest)
-            elif function_name == "select_short":
-                return select_short(country_of_interest)
 
-    except Exception as e:
-        # Try to infer from the event_summary itself as a last resort
-        if "negative" in event_summary.lower() or "short" in event_summary.lower():
-            return select_short(country_of_interest)
-        else:
-            return select_long(country_of_interest)
+    start_time = time.perf_counter()
+    model = "llama3.2"
+    messages = _trade_messages(country_of_interest, event_summary)
+    options = {"temperature": 0}
+
+    key, function_output = _cached_response(
+        cache, bypass_cache, model, {"messages": messages, "tools": list(TRADE_FUNCTIONS)}, options
+    )
+    cached = function_output is not None
+
+    if not cached:
+        try:
+            import ollama
+
+            client = ollama.Client()
+
+            # A single request, in which the model selects the trade with a tool call
+            response = client.chat(
+                model=model,
+                messages=messages,
+                tools=list(TRADE_FUNCTIONS.values()),
+                options=options,
+            )
+            function_output = _dispatch_trade(response, country_of_interest)
+
+        except Exception:
+            function_output = None
+
+        if key is not None and function_output is not None:
+            cache.set(key, function_output)
+
+    if stats is not None:
+        stats["latency"] = time.perf_counter() - start_time
+        stats["tool_selected"] = function_output is not None
+        stats["cached"] = cached
+
+    # Try to infer from the event_summary itself as a last resort
+    if function_output is None:
+        function_output = _guess_trade(country_of_interest, event_summary)
 
     ##############################################################################
 
     return function_output
+
+
+# The functions the model can select in recommend_trade, by name
+TRADE_FUNCTIONS = {"select_long": select_long, "select_short": select_short}
+
+
+def summary_prompt(country_of_interest: str, documents: list[str]) -> str:
+    """Return the prompt asking the model to summarize the events of a country.
+
+    Args:
+        country_of_interest (str): The country of the events.
+        documents (list[str]): The events retrieved from the vector database.
+
+    Returns:
+        str: The prompt.
+
+    """
+    events = "\n".join(f"- {document}" for document in documents)
+    return (
+        f"Summarize the following recent events in {country_of_interest} in a few sentences, "
+        f"and say whether they are positive or negative for its economy.\n{events}"
+    )
+
+
+def _cached_response(cache: ResponseCache, bypass_cache: bool, model: str, request, options: dict) -> tuple:
+    """Return the cache key of a request and its cached response.
+
+    The key is None if the request is not cached, and the response is None if
+    it must be generated.
+
+    """
+    if cache is None or not cache.cacheable(options):
+        return None, None
+    key = cache.key(model, request, options)
+    return key, None if bypass_cache else cache.get(key)
+
+
+def _trade_messages(country_of_interest: str, event_summary: str) -> list[dict]:
+    """Return the messages asking the model to select a trade with a tool call."""
+    return [
+        {"role": "system", "content": (
+            "You are an expert financial analyst specializing in trading strategies. "
+            "Based on the event summary, decide whether to long or short the assets of "
+            f"{country_of_interest}. Call exactly one of the tools select_long or select_short."
+        )},
+        {"role": "user", "content": f"Event summary for {country_of_interest}: {event_summary.strip()}"},
+    ]
+
+
+def _dispatch_trade(response, country_of_interest: str) -> str:
+    """Call the function selected by the tool call of a chat response, or return None without one."""
+    message = getattr(response, "message", None)
+    for tool_call in getattr(message, "tool_calls", None) or []:
+        function = TRADE_FUNCTIONS.get(tool_call.function.name)
+        if function is not None:
+            return function(country_of_interest)
+    return None
+
+
+def _guess_trade(country_of_interest: str, event_summary: str) -> str:
+    """Infer the trade from the event summary itself, when the model did not select one."""
+    if "negative" in event_summary.lower() or "short" in event_summary.lower():
+        return select_short(country_of_interest)
+    return select_long(country_of_interest)
+
+
+async def _with_retries(call, timeout: float = None, retries: int = 0, backoff: float = 1.0):
+    """Await call() with a timeout, calling it again up to retries times if it times out or
+    cannot reach the server. Other errors, e.g. an unknown model, are raised at once.
+
+    Args:
+        call (callable): Returns the awaitable to run, e.g. a lambda calling the client.
+        timeout (float): The maximum number of seconds of each attempt, no limit if None.
+        retries (int): The number of attempts after the first one.
+        backoff (float): The number of seconds before the first retry, doubled after each retry.
+
+    Returns:
+        The result of the first successful attempt.
+
+    """
+    for attempt in range(retries + 1):
+        try:
+            return await asyncio.wait_for(call(), timeout)
+        except Exception as e:
+            if attempt == retries or not _transient(e):
+                raise
+            await asyncio.sleep(backoff * 2 ** attempt)
+
+
+def _transient(error: Exception) -> bool:
+    """Return whether a request may succeed if it is sent again: it timed out or lost its connection."""
+    import httpx
+
+    return isinstance(error, (asyncio.TimeoutError, ConnectionError, httpx.TimeoutException, httpx.NetworkError))
+
+
+async def agenerate_response(
+    prompt: str,
+    client=None,
+    timeout: float = None,
+    retries: int = 0,
+    model: str = "llama3.2",
+    cache: ResponseCache = None,
+    options: dict = None,
+    bypass_cache: bool = False,
+) -> str:
+    """Return the response of the model to a prompt, like generate_response, without blocking.
+
+    Args:
+        prompt (str): The prompt to send to the model.
+        client (ollama.AsyncClient): The client to share between calls, a new one if None.
+        timeout (float): The maximum number of seconds of each attempt, no limit if None.
+        retries (int): The number of attempts after the first one.
+        model (str): The model to use.
+        cache (ResponseCache): The cache of the responses, used if options has a temperature of zero.
+        options (dict): The options of the model, e.g. {"temperature": 0}.
+        bypass_cache (bool): Whether to generate the response again, and update the cache with it.
+
+    Returns:
+        str: The response, or the error if every attempt failed.
+
+    """
+    try:
+        return await _agenerate(prompt, client, timeout, retries, model, cache, options, bypass_cache)
+    except Exception as e:
+        return _generation_error(e)
+
+
+async def _agenerate(
+    prompt: str,
+    client=None,
+    timeout: float = None,
+    retries: int = 0,
+    model: str = "llama3.2",
+    cache: ResponseCache = None,
+    options: dict = None,
+    bypass_cache: bool = False,
+) -> str:
+    """Same as agenerate_response, but raises the error of the last attempt if every attempt failed."""
+    import ollama
+
+    key, cached = _cached_response(cache, bypass_cache, model, prompt, options)
+    if cached is not None:
+        return cached
+
+    client = client or ollama.AsyncClient()
+    kwargs = {"options": options} if options else {}
+    response = await _with_retries(
+        lambda: client.generate(model=model, prompt=prompt, **kwargs), timeout, retries
+    )
+    event_summary = response.get("response", "").strip()
+
+    if key is not None:
+        cache.set(key, event_summary)
+    return event_summary
+
+
+async def arecommend_trade(
+    country_of_interest: str,
+    event_summary: str,
+    client=None,
+    timeout: float = None,
+    retries: int = 0,
+    model: str = "llama3.2",
+    cache: ResponseCache = None,
+    bypass_cache: bool = False,
+) -> str:
+    """Return the output of the trade function selected by the model, like recommend_trade, without blocking.
+
+    The model selects select_long or select_short with a single tool call. If
+    it selects neither, or every attempt fails, the trade is inferred from the
+    event summary.
+
+    Args:
+        country_of_interest (str): The country of interest.
+        event_summary (str): The summary of events in the country.
+        client (ollama.AsyncClient): The client to share between calls, a new one if None.
+        timeout (float): The maximum number of seconds of each attempt, no limit if None.
+        retries (int): The number of attempts after the first one.
+        model (str): The model to use.
+        cache (ResponseCache): The cache of the trade decisions.
+        bypass_cache (bool): Whether to ask the model again, and update the cache with its decision.
+
+    Returns:
+        str: The output from the model's selected function.
+
+    """
+    import ollama
+
+    messages = _trade_messages(country_of_interest, event_summary)
+    options = {"temperature": 0}
+    key, decision = _cached_response(
+        cache, bypass_cache, model, {"messages": messages, "tools": list(TRADE_FUNCTIONS)}, options
+    )
+    if decision is not None:
+        return decision
+
+    client = client or ollama.AsyncClient()
+    try:
+        response = await _with_retries(
+            lambda: client.chat(
+                model=model,
+                messages=messages,
+                tools=list(TRADE_FUNCTIONS.values()),
+                options=options,
+            ),
+            timeout,
+            retries,
+        )
+        decision = _dispatch_trade(response, country_of_interest)
+    except Exception:
+        decision = None
+
+    if key is not None and decision is not None:
+        cache.set(key, decision)
+
+    return decision or _guess_trade(country_of_interest, event_summary)
+
+
+async def aanalyze_countries(
+    prompts: dict,
+    max_concurrency: int = 4,
+    timeout: float = 120,
+    retries: int = 2,
+    host: str = None,
+    model: str = "llama3.2",
+    cache: ResponseCache = None,
+    options: dict = None,
+    bypass_cache: bool = False,
+) -> dict:
+    """Summarize the events of several countries and recommend a trade for each, concurrently.
+
+    All the requests share one client, closed once they are done, and at most
+    max_concurrency countries are processed at a time, to match the number of
+    requests Ollama serves in parallel (OLLAMA_NUM_PARALLEL). A country whose
+    summary fails gets the error instead of its summary, and no trade.
+
+    Args:
+        prompts (dict): The summary prompt of each country, e.g. from summary_prompt.
+        max_concurrency (int): The maximum number of countries processed at the same time.
+        timeout (float): The maximum number of seconds of each request.
+        retries (int): The number of attempts after the first one of each request.
+        host (str): The address of the Ollama server, the default one if None.
+        model (str): The model to use.
+        cache (ResponseCache): The cache of the summaries and trade decisions.
+        options (dict): The options of the summary requests, e.g. {"temperature": 0} to cache them.
+        bypass_cache (bool): Whether to ask the model again, and update the cache with its responses.
+
+    Returns:
+        dict: The (summary, trade) of each country, with a trade of None if the summary failed.
+
+    """
+    import ollama
+
+    client = ollama.AsyncClient(host=host)
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def analyze(country, prompt):
+        async with semaphore:
+            try:
+                summary = await _agenerate(prompt, client, timeout, retries, model, cache, options, bypass_cache)
+            except Exception as e:
+                # A trade inferred from the error message would be meaningless
+                return _generation_error(e), None
+            trade = await arecommend_trade(country, summary, client, timeout, retries, model, cache, bypass_cache)
+            return summary, trade
+
+    try:
+        results = await asyncio.gather(*(analyze(country, prompt) for country, prompt in prompts.items()))
+    finally:
+        await client.close()
+    return dict(zip(prompts, results))
+
+
+def analyze_countries(prompts: dict, **kwargs) -> dict:
+    """Run aanalyze_countries from synchronous code. See aanalyze_countries for the arguments."""
+    return asyncio.run(aanalyze_countries(prompts, **kwargs))
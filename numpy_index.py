@@ -0,0 +1,360 @@
+""" numpy_index.py: An in-process vector index of event embeddings, without Chroma.
+
+Copyright 2025, Cornell University
+
+Cornell University asserts copyright ownership of this template and all derivative
+works, including solutions to the projects assigned in this course. Students
+and other users of this template code are advised not to share it with others
+or to make it available on publicly viewable websites including online repositories
+such as Github.
+
+Sharing solutions with current or future students of ENMGT5400 is
+prohibited and subject to being investigated as a Code of Academic Integrity violation.
+
+-----do not edit anything above this line---
+"""
+
+import json
+import os
+
+import numpy as np
+
+
+# The types the embeddings can be quantized to, and the extension of their file
+QUANTIZATIONS = {"int8": (np.int8, "i8")}
+
+# The number of quantized embeddings converted to float32 at a time by a search
+_CONVERSION_ROWS = 1024
+
+
+class NumpyIndex:
+    """Exact top-k cosine search over embeddings held in a float32 array.
+
+    Embeddings are normalized when added, so cosine similarity is a matrix
+    product. Queries are scored block by block against the stored embeddings,
+    and the top k of each block are kept with argpartition, so the memory of a
+    search does not grow with the size of the index. With a folder, the
+    embeddings are kept in a memory-mapped file and the documents in a JSON
+    file, and the index can be reopened with NumpyIndex.load.
+
+    The search is exact, so every query reads all the embeddings it scans, and
+    its time is bound by memory bandwidth rather than by arithmetic. A single
+    query is therefore slower than an approximate HNSW query of Chroma, about
+    three times at 50,000 documents (see run_benchmarks.py numpy_index). Queries
+    searched together share one pass over the embeddings and are faster than
+    Chroma; use the index for exact results or batches of queries, not for the
+    latency of single queries.
+
+    With int8 quantization, a search scans int8 embeddings with a scale per
+    embedding, a quarter of the size of float32 ones, and only these are kept.
+    The scores are those of the dequantized embeddings. With keep_float32, the
+    float32 embeddings are kept as well, and those of the rerank_factor * k
+    best candidates are read to re-rank them exactly, at the cost of storing
+    both copies.
+
+    """
+
+    def __init__(
+        self,
+        folder: str = None,
+        embedding_function=None,
+        block_size: int = 65_536,
+        quantization: str = None,
+        rerank_factor: int = 4,
+        keep_float32: bool = False,
+    ):
+        """
+        Args:
+            folder (str): The folder of the index files, in memory only if None.
+            embedding_function (chromadb.EmbeddingFunction): Embeds documents added without embeddings, and queries.
+            block_size (int): The number of embeddings scored at a time by a search.
+            quantization (str): "int8" to scan quantized embeddings, or None.
+            rerank_factor (int): The number of candidates re-ranked per result with keep_float32.
+            keep_float32 (bool): Whether a quantized index also keeps the float32 embeddings, to re-rank
+                its candidates exactly. They are always kept without quantization.
+
+        """
+        if quantization is not None and quantization not in QUANTIZATIONS:
+            raise ValueError(f"quantization must be one of {list(QUANTIZATIONS)} or None, not {quantization!r}")
+
+        self.folder = folder
+        self.embedding_function = embedding_function
+        self.block_size = block_size
+        self.quantization = quantization
+        self.rerank_factor = rerank_factor
+        self.keep_float32 = quantization is None or keep_float32
+
+        self.ids = []
+        self.documents = []
+        self.metadatas = []
+        self._embeddings = None  # capacity x dimension, the first len(self) rows are used, if kept
+        self._codes = None  # The quantized embeddings, capacity x dimension
+        self._scales = None  # The scale of each int8 embedding
+        self._document_array = None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def embeddings(self) -> np.ndarray:
+        """The normalized embeddings of the documents, in the order they were added.
+        Without float32 embeddings, they are dequantized from the int8 ones."""
+        if self._stored() is None:
+            return np.empty((0, 0), dtype=np.float32)
+        return self._rows(slice(0, len(self)))
+
+    @property
+    def nbytes(self) -> int:
+        """The size of the embeddings scanned by a search."""
+        if self.quantization is None:
+            return self.embeddings.nbytes
+        scales = self._scales[:len(self)].nbytes if self._scales is not None else 0
+        return self._codes[:len(self)].nbytes + scales if self._codes is not None else 0
+
+    @property
+    def total_nbytes(self) -> int:
+        """The size of all the embeddings of the index, including the float32 ones kept to re-rank."""
+        arrays = (self._embeddings, self._codes, self._scales)
+        return sum(array[:len(self)].nbytes for array in arrays if array is not None)
+
+    def add(
+        self, ids: list, documents: list[str], embeddings: np.ndarray = None, metadatas: list[dict] = None
+    ) -> None:
+        """Add documents to the index.
+
+        Args:
+            ids (list): The ids of the documents.
+            documents (list[str]): The documents.
+            embeddings (np.ndarray): The embeddings of the documents, computed with embedding_function if None.
+            metadatas (list[dict]): The metadata of each document, if any.
+
+        """
+        if len(ids) == 0:
+            return
+        if embeddings is None:
+            embeddings = self.embedding_function(list(documents))
+        embeddings = _normalize(np.asarray(embeddings, dtype=np.float32))
+
+        start, end = len(self), len(self) + len(ids)
+        self._reserve(end, embeddings.shape[1])
+        if self.keep_float32:
+            self._embeddings[start:end] = embeddings
+        if self.quantization == "int8":
+            scales = np.abs(embeddings).max(axis=1) / 127
+            scales[scales == 0] = 1
+            self._codes[start:end] = np.round(embeddings / scales[:, None])
+            self._scales[start:end] = scales
+
+        self.ids.extend(str(doc_id) for doc_id in ids)
+        self.documents.extend(documents)
+        self.metadatas.extend(metadatas or [{}] * len(ids))
+        self._document_array = None
+
+    def search(self, query_embeddings: np.ndarray, n_results: int, mask: np.ndarray = None) -> tuple:
+        """Find the closest documents to each query.
+
+        Args:
+            query_embeddings (np.ndarray): The embeddings of the queries (n_queries x embedding_size).
+            n_results (int): The number of results of each query.
+            mask (np.ndarray): Which documents can be returned, all of them if None.
+
+        Returns:
+            np.ndarray: The positions of the results of each query, closest first (n_queries x n_results).
+            np.ndarray: Their cosine similarities, -inf past the number of documents that can be returned.
+
+        """
+        queries = _normalize(np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32)))
+        n_results = min(n_results, len(self))
+
+        if self.quantization is None or len(self) == 0:
+            return self._scan(queries, n_results, mask, self._score_embeddings)
+        if not self.keep_float32:
+            return self._scan(queries, n_results, mask, self._score_codes)
+
+        # Re-rank the best candidates of the quantized embeddings on the float32 ones
+        candidates, _ = self._scan(queries, min(n_results * self.rerank_factor, len(self)), mask, self._score_codes)
+        scores = np.einsum("qd,qkd->qk", queries, self._embeddings[candidates])
+        if mask is not None:
+            scores[~mask[candidates]] = -np.inf
+
+        order = np.argsort(-scores, axis=1, kind="stable")[:, :n_results]
+        return np.take_along_axis(candidates, order, axis=1), np.take_along_axis(scores, order, axis=1)
+
+    def contains(self, text: str) -> np.ndarray:
+        """Return which documents contain a text."""
+        if self._document_array is None:
+            self._document_array = np.array(self.documents, dtype=np.str_)
+        if len(self) == 0:
+            return np.zeros(0, dtype=bool)
+        return np.strings.find(self._document_array, text) >= 0
+
+    def save(self) -> None:
+        """Write the documents and embeddings of the index to its folder."""
+        os.makedirs(self.folder, exist_ok=True)
+        for array in (self._embeddings, self._codes, self._scales):
+            if isinstance(array, np.memmap):
+                array.flush()
+
+        stored = self._stored()
+        tmp_path = os.path.join(self.folder, "documents.json.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({
+                "dimension": stored.shape[1] if stored is not None else 0,
+                "capacity": len(stored) if stored is not None else 0,
+                "quantization": self.quantization,
+                "keep_float32": self.keep_float32,
+                "ids": self.ids,
+                "documents": self.documents,
+                "metadatas": self.metadatas,
+            }, f)
+        os.replace(tmp_path, os.path.join(self.folder, "documents.json"))
+
+    @classmethod
+    def load(
+        cls, folder: str, embedding_function=None, block_size: int = 65_536, rerank_factor: int = 4
+    ) -> "NumpyIndex":
+        """Open an index saved in a folder.
+
+        Args:
+            folder (str): The folder of the index files.
+            embedding_function (chromadb.EmbeddingFunction): Embeds documents added without embeddings, and queries.
+            block_size (int): The number of embeddings scored at a time by a search.
+            rerank_factor (int): The number of candidates re-ranked per result with quantization.
+
+        Returns:
+            NumpyIndex: The index.
+
+        """
+        with open(os.path.join(folder, "documents.json")) as f:
+            saved = json.load(f)
+
+        # Indexes saved before keep_float32 always kept the float32 embeddings
+        index = cls(
+            folder, embedding_function, block_size, saved.get("quantization"), rerank_factor,
+            saved.get("keep_float32", True),
+        )
+        index.ids, index.documents, index.metadatas = saved["ids"], saved["documents"], saved["metadatas"]
+        if saved["capacity"]:
+            for name, filename, dtype, shape in index._arrays(saved["capacity"], saved["dimension"]):
+                setattr(index, name, np.memmap(os.path.join(folder, filename), dtype, "r+", shape=shape))
+        return index
+
+    def _arrays(self, capacity: int, dimension: int) -> list[tuple]:
+        """Return the attribute, file name, type and shape of the arrays of the index."""
+        arrays = []
+        if self.keep_float32:
+            arrays.append(("_embeddings", "embeddings.f32", np.float32, (capacity, dimension)))
+        if self.quantization is not None:
+            dtype, extension = QUANTIZATIONS[self.quantization]
+            arrays.append(("_codes", f"embeddings.{extension}", dtype, (capacity, dimension)))
+        if self.quantization == "int8":
+            arrays.append(("_scales", "scales.f32", np.float32, (capacity,)))
+        return arrays
+
+    def _reserve(self, size: int, dimension: int) -> None:
+        """Grow the arrays of the index to hold at least size rows, doubling their capacity."""
+        stored = self._stored()
+        if stored is not None:
+            if stored.shape[1] != dimension:
+                raise ValueError(f"Expected embeddings of size {stored.shape[1]}, got {dimension}")
+            if len(stored) >= size:
+                return
+
+        capacity = max(size, 2 * len(stored) if stored is not None else 1024)
+        for name, filename, dtype, shape in self._arrays(capacity, dimension):
+            current = getattr(self, name)
+            if self.folder is None:
+                array = np.empty(shape, dtype=dtype)
+                if current is not None:
+                    array[:len(self)] = current[:len(self)]
+            else:
+                os.makedirs(self.folder, exist_ok=True)
+                path = os.path.join(self.folder, filename)
+                if current is None and os.path.exists(path):
+                    os.remove(path)
+                # Extending the file keeps the existing rows, the memory map is then reopened
+                with open(path, "ab") as f:
+                    f.truncate(int(np.prod(shape)) * np.dtype(dtype).itemsize)
+                array = np.memmap(path, dtype, "r+", shape=shape)
+            setattr(self, name, array)
+
+    def _stored(self) -> np.ndarray:
+        """Return the array the capacity and dimension of the index are read from, None if it is empty."""
+        return self._embeddings if self._embeddings is not None else self._codes
+
+    def _rows(self, positions) -> np.ndarray:
+        """Return the embeddings at some positions, dequantized without float32 embeddings."""
+        if self._embeddings is not None:
+            return self._embeddings[positions]
+        return self._codes[positions].astype(np.float32) * self._scales[positions][..., None]
+
+    def _scan(self, queries: np.ndarray, k: int, mask: np.ndarray, score_block) -> tuple:
+        """Return the positions and scores of the k best documents of each query, closest first."""
+        best_positions = np.zeros((len(queries), 0), dtype=np.int64)
+        best_scores = np.zeros((len(queries), 0), dtype=np.float32)
+        for start in range(0, len(self), self.block_size):
+            end = min(start + self.block_size, len(self))
+            scores = score_block(queries, start, end)
+            if mask is not None:
+                scores[:, ~mask[start:end]] = -np.inf
+
+            positions = _top_k(scores, k)
+            best_positions = np.hstack([best_positions, positions + start])
+            best_scores = np.hstack([best_scores, np.take_along_axis(scores, positions, axis=1)])
+
+            keep = _top_k(best_scores, k)
+            best_positions = np.take_along_axis(best_positions, keep, axis=1)
+            best_scores = np.take_along_axis(best_scores, keep, axis=1)
+
+        order = np.argsort(-best_scores, axis=1, kind="stable")
+        return np.take_along_axis(best_positions, order, axis=1), np.take_along_axis(best_scores, order, axis=1)
+
+    def _score_embeddings(self, queries: np.ndarray, start: int, end: int) -> np.ndarray:
+        return queries @ self._embeddings[start:end].T
+
+    def _score_codes(self, queries: np.ndarray, start: int, end: int) -> np.ndarray:
+        # The codes are converted to float32 a few rows at a time, so the copies stay in the CPU cache
+        scores = np.empty((len(queries), end - start), dtype=np.float32)
+        for i in range(start, end, _CONVERSION_ROWS):
+            j = min(i + _CONVERSION_ROWS, end)
+            scores[:, i - start:j - start] = queries @ self._codes[i:j].astype(np.float32).T
+        if self.quantization == "int8":
+            scores *= self._scales[start:end]
+        return scores
+
+
+def retrieve_events_by_country(
+    index: NumpyIndex, country_of_interest: str, n_results: int
+) -> tuple[list[str], np.ndarray]:
+    """Search for events that happened in a specific country, like vector_database.retrieve_events_by_country.
+
+    Args:
+        index (NumpyIndex): The index, with an embedding function for the query.
+        country_of_interest (str): The country of the events.
+        n_results (int): The number of results to return.
+
+    Returns:
+        list[str]: The list of documents.
+        np.array: The embeddings of the documents (n_results x embedding_size).
+
+    """
+    query_embedding = index.embedding_function([f"Happened at {country_of_interest}"])
+    positions, scores = index.search(query_embedding, n_results, mask=index.contains(country_of_interest))
+
+    positions = positions[0][np.isfinite(scores[0])]
+    if len(positions) == 0:
+        return [], np.array([])
+    return [index.documents[i] for i in positions], index._rows(positions)
+
+
+def _normalize(embeddings: np.ndarray) -> np.ndarray:
+    """Scale embeddings to unit length, leaving zero vectors unchanged."""
+    norms = np.linalg.norm(embeddings, axis=-1, keepdims=True)
+    return embeddings / np.where(norms == 0, 1, norms)
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Return the positions of the k highest scores of each row, in no particular order."""
+    if k >= scores.shape[1]:
+        return np.broadcast_to(np.arange(scores.shape[1]), scores.shape).copy()
+    return np.argpartition(-scores, k - 1, axis=1)[:, :k]
@@ -0,0 +1,263 @@
+""" partitioned_database.py: Stores GDELT events in one collection per day or week.
+
+Copyright 2025, Cornell University
+
+Cornell University asserts copyright ownership of this template and all derivative
+works, including solutions to the projects assigned in this course. Students
+and other users of this template code are advised not to share it with others
+or to make it available on publicly viewable websites including online repositories
+such as Github.
+
+Sharing solutions with current or future students of ENMGT5400 is
+prohibited and subject to being investigated as a Code of Academic Integrity violation.
+
+-----do not edit anything above this line---
+"""
+
+from __future__ import annotations
+
+import datetime
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+import helpers
+from vector_database import (
+    clear_collection_cache,
+    country_filter,
+    create_database,
+    event_filter,
+)
+
+if TYPE_CHECKING:
+    import chromadb
+
+# Partitions are named <prefix>_<YYYYMMDD> for a day, or <prefix>_w<YYYYMMDD> for the week starting on that Monday
+PERIODS = {"day": "", "week": "w"}
+
+
+def to_date(date) -> datetime.date:
+    """Convert a SQLDATE such as 20250212 or "20250212", or a date, to a date."""
+    if isinstance(date, datetime.date):
+        return date
+    return datetime.datetime.strptime(str(int(date)), "%Y%m%d").date()
+
+
+def partition_name(date, period: str = "day", prefix: str = helpers.COLLECTION_NAME) -> str:
+    """Return the name of the partition holding the events of a date.
+
+    Args:
+        date: The date of the events, as a SQLDATE or a date.
+        period (str): The period covered by each partition, "day" or "week".
+        prefix (str): The prefix of the partition names.
+
+    Returns:
+        str: The name of the partition.
+
+    """
+    if period not in PERIODS:
+        raise ValueError(f"period must be one of {list(PERIODS)}, not {period!r}")
+
+    date = to_date(date)
+    if period == "week":
+        date -= datetime.timedelta(days=date.weekday())
+    return f"{prefix}_{PERIODS[period]}{date:%Y%m%d}"
+
+
+def list_partitions(client: chromadb.ClientAPI, prefix: str = helpers.COLLECTION_NAME) -> dict:
+    """Return the partitions of a client and the first and last date they cover.
+
+    Args:
+        client (chromadb.ClientAPI): The client object.
+        prefix (str): The prefix of the partition names.
+
+    Returns:
+        dict: The (first date, last date) of each partition name, ordered by date.
+
+    """
+    pattern = re.compile(rf"{re.escape(prefix)}_(w?)(\d{{8}})")
+
+    partitions = {}
+    for collection in client.list_collections():
+        match = pattern.fullmatch(collection.name)
+        if match:
+            start = to_date(match.group(2))
+            end = start + datetime.timedelta(days=6 if match.group(1) else 0)
+            partitions[collection.name] = (start, end)
+    return dict(sorted(partitions.items(), key=lambda item: item[1]))
+
+
+def create_partitioned_database(
+    client: chromadb.ClientAPI,
+    doc_ids: list[int],
+    documents: list[str],
+    dates: list,
+    metadatas: list[dict] = None,
+    period: str = "day",
+    prefix: str = helpers.COLLECTION_NAME,
+    embedding_function: chromadb.EmbeddingFunction = None,
+    batch_size: int = None,
+    verbose: bool = False,
+) -> dict:
+    """Store documents in the partition of their date, creating the partitions as needed.
+
+    Each partition is synced with create_database, so only new or changed
+    documents are embedded.
+
+    Args:
+        client (chromadb.ClientAPI): The client object.
+        doc_ids (list[int]): The list of document ids.
+        documents (list[str]): The list of documents.
+        dates (list): The SQLDATE of each document.
+        metadatas (list[dict]): The metadata of each document, e.g. from build_metadatas.
+        period (str): The period covered by each partition, "day" or "week".
+        prefix (str): The prefix of the partition names.
+        embedding_function (chromadb.EmbeddingFunction): The embedding function, Chroma's default if None.
+        batch_size (int): The number of documents per batch.
+        verbose (bool): Whether to print the progress and throughput of the insertion.
+
+    Returns:
+        dict: The collection of each partition that received documents.
+
+    """
+    rows = {}
+    for i, date in enumerate(dates):
+        rows.setdefault(partition_name(date, period, prefix), []).append(i)
+
+    collections = {}
+    for name, indices in sorted(rows.items()):
+        if verbose:
+            print(f"Partition {name}: {len(indices)} documents")
+        collections[name] = create_database(
+            client,
+            name,
+            [doc_ids[i] for i in indices],
+            [documents[i] for i in indices],
+            embedding_function=embedding_function,
+            batch_size=batch_size,
+            verbose=verbose,
+            metadatas=[metadatas[i] for i in indices] if metadatas else None,
+        )
+    return collections
+
+
+def retrieve_events_by_country_in_range(
+    client: chromadb.ClientAPI,
+    country_of_interest: str,
+    n_results: int,
+    start_date=None,
+    end_date=None,
+    where: dict = None,
+    prefix: str = helpers.COLLECTION_NAME,
+    embedding_function: chromadb.EmbeddingFunction = None,
+    max_workers: int = 8,
+    country_code: str = None,
+) -> tuple[list[str], np.ndarray]:
+    """Search for events that happened in a specific country between two dates.
+
+    Only the partitions overlapping the dates are searched, so the time of a
+    query depends on the length of the window rather than of the history. Each
+    partition returns its closest n_results events, and the closest n_results
+    of all of them are kept, so the partitions must share an embedding model.
+
+    Args:
+        client (chromadb.ClientAPI): The client object.
+        country_of_interest (str): The country of the events.
+        n_results (int): The number of results to return.
+        start_date: The first SQLDATE of the events, or None for no limit.
+        end_date: The last SQLDATE of the events, or None for no limit.
+        where (dict): An optional filter on the metadata of the events, e.g. from event_filter.
+            The dates of week partitions are filtered on the SQLDATE metadata of build_metadatas.
+        prefix (str): The prefix of the partition names.
+        embedding_function (chromadb.EmbeddingFunction): The embedding function of the partitions,
+            which embeds the query text once. If None, each partition embeds it with the
+            function it was created with, as persisted by Chroma.
+        max_workers (int): The number of partitions searched at the same time.
+        country_code (str): The country code of the events, to filter on instead of the country,
+            as in vector_database.country_filter.
+
+    Returns:
+        list[str]: The list of documents, closest first.
+        np.array: The embeddings of the documents (n_results x embedding_size).
+
+    """
+    start = to_date(start_date) if start_date is not None else datetime.date.min
+    end = to_date(end_date) if end_date is not None else datetime.date.max
+    partitions = {
+        name: (first, last) for name, (first, last) in list_partitions(client, prefix).items()
+        if first <= end and last >= start
+    }
+    if not partitions:
+        return [], np.array([])
+
+    query_text = f"Happened at {country_of_interest}"
+    if embedding_function is not None:
+        collections = [client.get_collection(name, embedding_function=embedding_function) for name in partitions]
+        query = {"query_embeddings": embedding_function.embed_query([query_text])}
+    else:
+        collections = [client.get_collection(name) for name in partitions]
+        query = {"query_texts": [query_text]}
+
+    # A week partition can extend past the window, so its events are also filtered by SQLDATE
+    date_filter = event_filter(
+        start_date=f"{start:%Y%m%d}" if start_date is not None else None,
+        end_date=f"{end:%Y%m%d}" if end_date is not None else None,
+    )
+
+    def search(collection, dates):
+        conditions = [where]
+        if dates[0] < start or dates[1] > end:
+            conditions.append(date_filter)
+        conditions = [condition for condition in conditions if condition]
+        partition_where, where_document = country_filter(
+            collection,
+            country_of_interest,
+            conditions[0] if len(conditions) == 1 else {"$and": conditions} if conditions else None,
+            country_code,
+        )
+
+        return collection.query(
+            **query,
+            n_results=n_results,
+            where=partition_where,
+            where_document=where_document,
+            include=["documents", "embeddings", "distances"],
+        )
+
+    candidates = []
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for results in pool.map(search, collections, partitions.values()):
+            candidates.extend(zip(results["distances"][0], results["documents"][0], results["embeddings"][0]))
+
+    candidates = sorted(candidates, key=lambda candidate: candidate[0])[:n_results]
+    if not candidates:
+        return [], np.array([])
+
+    documents = [document for _, document, _ in candidates]
+    return documents, np.array([embedding for _, _, embedding in candidates], dtype=np.float32)
+
+
+def drop_partitions(client: chromadb.ClientAPI, before, prefix: str = helpers.COLLECTION_NAME) -> list[str]:
+    """Delete the partitions whose events all happened before a date.
+
+    Deleting a partition drops its whole index, rather than deleting its
+    events one at a time.
+
+    Args:
+        client (chromadb.ClientAPI): The client object.
+        before: The first SQLDATE to keep.
+        prefix (str): The prefix of the partition names.
+
+    Returns:
+        list[str]: The names of the deleted partitions.
+
+    """
+    before = to_date(before)
+    dropped = [name for name, (_, last) in list_partitions(client, prefix).items() if last < before]
+
+    for name in dropped:
+        client.delete_collection(name)
+        clear_collection_cache(name)
+    return dropped
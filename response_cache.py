@@ -0,0 +1,137 @@
+""" response_cache.py: Caches the responses of the local model on disk.
+
+Copyright 2025, Cornell University
+
+Cornell University asserts copyright ownership of this template and all derivative
+works, including solutions to the projects assigned in this course. Students
+and other users of this template code are advised not to share it with others
+or to make it available on publicly viewable websites including online repositories
+such as Github.
+
+Sharing solutions with current or future students of ENMGT5400 is
+prohibited and subject to being investigated as a Code of Academic Integrity violation.
+
+-----do not edit anything above this line---
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+class ResponseCache:
+    """Store the responses of the local model in SQLite, keyed by model, request and options.
+
+    Re-running the pipeline on the same day's data sends the same prompts, so
+    their responses are read from the cache instead of being generated again.
+    Only deterministic requests, with a temperature of zero, are cached. Entries
+    expire ttl seconds after they are stored, and the least recently used entries
+    are evicted beyond max_entries. Without a path, the cache only lives in memory.
+
+    """
+
+    def __init__(self, path: str = None, ttl: float = None, max_entries: int = 10_000):
+        """
+        Args:
+            path (str): The SQLite file of the cache, in memory only if None.
+            ttl (float): The number of seconds an entry stays valid, forever if None.
+            max_entries (int): The maximum number of cached responses.
+
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        if path is not None:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        # The connection is shared by the threads of the pipeline, one statement at a time
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path or ":memory:", check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, response TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+
+    @staticmethod
+    def key(model: str, request, options: dict = None) -> str:
+        """Return the key of a request.
+
+        Args:
+            model (str): The model answering the request.
+            request: The prompt or the messages of the request, and anything else it depends on.
+            options (dict): The options of the model.
+
+        Returns:
+            str: The sha256 hex digest of the request.
+
+        """
+        payload = json.dumps([model, request, options or {}], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def cacheable(options: dict = None) -> bool:
+        """Return whether a request with these options always gets the same response."""
+        return (options or {}).get("temperature") == 0
+
+    def get(self, key: str) -> str:
+        """Return the cached response of a key, or None if it is missing or expired."""
+        now = time.time()
+        with self._lock, self._connection:
+            row = self._connection.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.ttl is not None and row[1] + self.ttl < now:
+                self._connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                row = None
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            self._connection.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return row[0]
+
+    def set(self, key: str, response: str) -> None:
+        """Store the response of a key, evicting the least recently used responses beyond max_entries."""
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses (key, response, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, response, now, now),
+            )
+            self._connection.execute(
+                "DELETE FROM responses WHERE key IN "
+                "(SELECT key FROM responses ORDER BY accessed DESC, rowid DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def clear(self) -> None:
+        """Delete every cached response."""
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM responses")
+
+    def stats(self) -> dict:
+        """Return the hits, misses, hit rate and size of the cache."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size": len(self),
+        }
+
+    def close(self) -> None:
+        """Close the SQLite connection."""
+        with self._lock:
+            self._connection.close()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
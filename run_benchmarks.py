@@ -0,0 +1,323 @@
+""" run_benchmarks.py: Measures the performance of the data pipeline.
+
+Copyright 2025, Cornell University
+
+Cornell University asserts copyright ownership of this template and all derivative
+works, including solutions to the projects assigned in this course. Students
+and other users of this template code are advised not to share it with others
+or to make it available on publicly viewable websites including online repositories
+such as Github.
+
+Sharing solutions with current or future students of ENMGT5400 is
+prohibited and subject to being investigated as a Code of Academic Integrity violation.
+
+-----do not edit anything above this line---
+"""
+
+import argparse
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from helpers import GDELTFIELDNAMES
+from numpy_index import NumpyIndex
+from transform_data import (
+    TitleCache,
+    iter_gdelt,
+    memory_report,
+    parse_url,
+    parse_urls,
+    read_gdelt,
+    read_gdelt_files,
+)
+
+
+def make_urls(n_rows: int, seed: int = 42) -> pd.Series:
+    """Generate GDELT-like source URLs. As in a daily export, many rows share a URL."""
+    rng = random.Random(seed)
+    words = [
+        "russia", "ukraine", "talks", "trade", "deal", "election", "court", "strike",
+        "minister", "border", "storm", "market", "rally", "2025", "A999999", "1226184510",
+    ]
+    domains = ["www.yahoo.com/news", "www.express.co.uk/news/world", "www.jdsupra.com/legalnews"]
+
+    unique_urls = []
+    for i in range(max(n_rows // 3, 1)):
+        title = "-".join(rng.choice(words) for _ in range(rng.randint(2, 10)))
+        suffix = rng.choice(["", ".html", f"/{i}/", f"-{rng.randint(0, 10 ** 8)}.html"])
+        unique_urls.append(f"https://{rng.choice(domains)}/{title}{suffix}")
+
+    return pd.Series([rng.choice(unique_urls) for _ in range(n_rows)], name="SOURCEURL")
+
+
+def write_export(data_folder: str, filename: str, n_rows: int, first_event_id: int = 1226184510) -> None:
+    """Write a synthetic GDELT export of n_rows rows, ordered by GLOBALEVENTID."""
+    rng = random.Random(first_event_id)
+    urls = make_urls(n_rows, seed=first_event_id)
+    locations = ["Paris, Ile-de-France, France", "Berlin, Berlin, Germany", "Washington, District of Columbia, United States"]
+
+    columns = {name: i for i, name in enumerate(GDELTFIELDNAMES)}
+    with open(os.path.join(data_folder, filename), "w") as f:
+        for i, url in enumerate(urls):
+            fields = [""] * len(GDELTFIELDNAMES)
+            fields[columns["GLOBALEVENTID"]] = str(first_event_id + i)
+            fields[columns["SQLDATE"]] = "20250212"
+            fields[columns["EventCode"]] = str(rng.choice([20, 43, 172, 190]))
+            fields[columns["QuadClass"]] = str(rng.randint(1, 4))
+            fields[columns["GoldsteinScale"]] = str(rng.choice([-10.0, -5.0, 2.8, 3.4]))
+            fields[columns["ActionGeo_FullName"]] = rng.choice(locations)
+            fields[columns["SOURCEURL"]] = url
+            f.write("\t".join(fields) + "\n")
+
+
+def peak_memory(function, *args) -> float:
+    """Return the peak memory allocated while calling function, in MB."""
+    tracemalloc.start()
+    function(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 2 ** 20
+
+
+def time_call(function, *args, repeat: int = 3) -> float:
+    """Return the best wall time of repeat calls, in seconds."""
+    timings = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        function(*args)
+        timings.append(time.perf_counter() - start_time)
+    return min(timings)
+
+
+def benchmark_parse_urls(n_rows: int = 200_000) -> None:
+    """Compare parse_urls with applying parse_url row by row."""
+    urls = make_urls(n_rows)
+
+    assert parse_urls(urls).tolist() == [parse_url(url) for url in urls], "parse_urls differs from parse_url"
+
+    apply_time = time_call(urls.apply, parse_url)
+    vectorized_time = time_call(parse_urls, urls)
+    print(f"parse_url  (apply):      {apply_time:.3f} s for {n_rows} rows")
+    print(f"parse_urls (vectorized): {vectorized_time:.3f} s for {n_rows} rows")
+    print(f"Speedup: {apply_time / vectorized_time:.1f}x")
+
+    # The same URLs parsed again, e.g. in the next daily file
+    cache = TitleCache()
+    parse_urls(urls, cache)
+    cached_time = time_call(parse_urls, urls, cache)
+    print(f"parse_urls (warm cache): {cached_time:.3f} s for {n_rows} rows, {cache.stats()}")
+
+
+def benchmark_iter_gdelt(n_rows: int = 200_000, chunksize: int = 20_000) -> None:
+    """Compare the peak memory of read_gdelt and iter_gdelt."""
+    with tempfile.TemporaryDirectory() as data_folder:
+        write_export(data_folder, "export.CSV", n_rows)
+
+        read_peak = peak_memory(read_gdelt, data_folder, "export.CSV")
+        iter_peak = peak_memory(
+            lambda: sum(len(df) for df in iter_gdelt(data_folder, "export.CSV", chunksize=chunksize))
+        )
+    print(f"read_gdelt peak memory: {read_peak:.1f} MB for {n_rows} rows")
+    print(f"iter_gdelt peak memory: {iter_peak:.1f} MB for {n_rows} rows in chunks of {chunksize}")
+
+
+def benchmark_read_gdelt_files(n_files: int = 8, n_rows: int = 100_000) -> None:
+    """Compare reading files one at a time with read_gdelt_files."""
+    with tempfile.TemporaryDirectory() as data_folder:
+        filenames = [f"2025021{i}.export.CSV" for i in range(n_files)]
+        for i, filename in enumerate(filenames):
+            write_export(data_folder, filename, n_rows, first_event_id=1226184510 + i * n_rows)
+
+        serial_time = time_call(
+            lambda: [read_gdelt(data_folder, filename) for filename in filenames], repeat=1
+        )
+        parallel_time = time_call(read_gdelt_files, data_folder, filenames, repeat=1)
+    print(f"read_gdelt (serial):   {serial_time:.3f} s for {n_files} files of {n_rows} rows")
+    print(f"read_gdelt_files:      {parallel_time:.3f} s on {os.cpu_count()} CPUs")
+    print(f"Speedup: {serial_time / parallel_time:.1f}x")
+
+
+def benchmark_parquet_cache(n_rows: int = 200_000) -> None:
+    """Compare parsing a file with reading its cleaned dataframe back from the Parquet cache."""
+    with tempfile.TemporaryDirectory() as data_folder:
+        write_export(data_folder, "export.CSV", n_rows)
+        cache_folder = os.path.join(data_folder, "cache")
+
+        parse_time = time_call(read_gdelt, data_folder, "export.CSV", None, cache_folder, repeat=1)
+        cached_time = time_call(read_gdelt, data_folder, "export.CSV", None, cache_folder)
+        cache_size = sum(os.path.getsize(os.path.join(cache_folder, name)) for name in os.listdir(cache_folder))
+    print(f"read_gdelt (parse and cache): {parse_time:.3f} s for {n_rows} rows")
+    print(f"read_gdelt (cached):          {cached_time:.3f} s, {cache_size / 2 ** 20:.1f} MB on disk")
+    print(f"Speedup: {parse_time / cached_time:.1f}x")
+
+
+def benchmark_compact_gdelt(n_rows: int = 200_000) -> None:
+    """Report the memory saved by the compact column types of read_gdelt."""
+    with tempfile.TemporaryDirectory() as data_folder:
+        write_export(data_folder, "export.CSV", n_rows)
+        df = read_gdelt(data_folder, "export.CSV")
+
+    report = memory_report(df)
+    print(f"read_gdelt:               {report['bytes_before'] / 2 ** 20:.1f} MB for {len(df)} events")
+    print(f"read_gdelt(compact=True): {report['bytes_after'] / 2 ** 20:.1f} MB")
+    print(f"Saved {report['bytes_saved'] / 2 ** 20:.1f} MB ({report['ratio']:.1f}x smaller)")
+
+
+def benchmark_import_time(
+    modules: tuple = ("download_data", "transform_data", "vector_database", "local_model",
+                      "run_vector_database", "run_local_model", "chromadb", "ollama"),
+    repeat: int = 3,
+) -> None:
+    """Report the time taken to import each module in a new interpreter."""
+    for module in modules:
+        code = f"import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)"
+        timings = []
+        for _ in range(repeat):
+            result = subprocess.run(
+                [sys.executable, "-c", code], capture_output=True, text=True,
+                cwd=os.path.dirname(os.path.abspath(__file__)),
+            )
+            if result.returncode != 0:
+                break
+            timings.append(float(result.stdout.strip().splitlines()[-1]))
+
+        if timings:
+            print(f"import {module:<20} {min(timings):.3f} s")
+        else:
+            print(f"import {module:<20} failed: {result.stderr.strip().splitlines()[-1]}")
+
+
+def make_embeddings(n: int, dimension: int = 384, seed: int = 42) -> np.ndarray:
+    """Generate random unit embeddings of the size of Chroma's default model."""
+    embeddings = np.random.default_rng(seed).standard_normal((n, dimension)).astype(np.float32)
+    return embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+
+def benchmark_numpy_index(n_documents: int = 50_000, n_queries: int = 60, n_results: int = 10) -> None:
+    """Compare the query time of a Chroma collection and of NumpyIndex over the same embeddings."""
+    import chromadb
+
+    embeddings = make_embeddings(n_documents)
+    queries = make_embeddings(n_queries, seed=0)
+    ids = [str(i) for i in range(n_documents)]
+    documents = [f"Event {i}" for i in range(n_documents)]
+
+    index = NumpyIndex()
+    index.add(ids, documents, embeddings)
+
+    client = chromadb.EphemeralClient()
+    collection = client.create_collection("benchmark_numpy_index", configuration={"hnsw": {"space": "cosine"}})
+    batch_size = client.get_max_batch_size()
+    for start in range(0, n_documents, batch_size):
+        collection.add(
+            ids=ids[start:start + batch_size],
+            documents=documents[start:start + batch_size],
+            embeddings=embeddings[start:start + batch_size],
+        )
+
+    def query(query_embeddings):
+        return collection.query(query_embeddings=query_embeddings, n_results=n_results)
+
+    chroma_time = time_call(query, queries)
+    numpy_time = time_call(index.search, queries, n_results)
+    single_chroma_time = time_call(lambda: [query(query_embedding[None]) for query_embedding in queries])
+    single_numpy_time = time_call(lambda: [index.search(query, n_results) for query in queries])
+    client.delete_collection("benchmark_numpy_index")
+
+    print(f"Chroma:     {chroma_time * 1000:.1f} ms for {n_queries} queries in one call, "
+          f"{single_chroma_time * 1000 / n_queries:.2f} ms per single query, {n_documents} documents")
+    # A single exact query reads every embedding, so its time is bound by memory bandwidth
+    print(f"NumpyIndex: {numpy_time * 1000:.1f} ms for {n_queries} queries in one call, "
+          f"{single_numpy_time * 1000 / n_queries:.2f} ms per single query, "
+          f"{index.nbytes / 2 ** 20 * n_queries / single_numpy_time / 1024:.1f} GB/s scanned")
+
+
+def benchmark_quantization(n_documents: int = 50_000, n_queries: int = 60, n_results: int = 10) -> None:
+    """Compare the recall@k, query time and size of float32 and int8 embeddings, and of Chroma."""
+    import chromadb
+
+    # Embeddings around a few hundred topics, like the events of a few days
+    rng = np.random.default_rng(42)
+    topics = make_embeddings(300)
+    embeddings = topics[rng.integers(0, 300, n_documents)] + 0.05 * rng.standard_normal((n_documents, 384))
+    embeddings = embeddings.astype(np.float32)
+    queries = (topics[:n_queries] + 0.05 * rng.standard_normal((n_queries, 384))).astype(np.float32)
+    ids = [str(i) for i in range(n_documents)]
+    documents = [f"Event {i}" for i in range(n_documents)]
+
+    exact = NumpyIndex()
+    exact.add(ids, documents, embeddings)
+    expected = exact.search(queries, n_results)[0]
+
+    def recall(positions):
+        return np.mean([len(set(p) & set(e)) / n_results for p, e in zip(positions, expected)])
+
+    for name, quantization, keep_float32 in [
+        ("float32", None, False), ("int8", "int8", False), ("int8+f32", "int8", True)
+    ]:
+        index = NumpyIndex(quantization=quantization, keep_float32=keep_float32)
+        index.add(ids, documents, embeddings)
+        positions = index.search(queries, n_results)[0]
+        query_time = time_call(lambda: [index.search(query, n_results) for query in queries])
+        print(f"NumpyIndex {name:<8} recall@{n_results} {recall(positions):.3f}, "
+              f"{query_time * 1000 / n_queries:.2f} ms per query, {index.nbytes / 2 ** 20:.1f} MB scanned, "
+              f"{index.total_nbytes / 2 ** 20:.1f} MB stored")
+
+    client = chromadb.EphemeralClient()
+    collection = client.create_collection("benchmark_quantization", configuration={"hnsw": {"space": "cosine"}})
+    batch_size = client.get_max_batch_size()
+    for start in range(0, n_documents, batch_size):
+        collection.add(
+            ids=ids[start:start + batch_size],
+            documents=documents[start:start + batch_size],
+            embeddings=embeddings[start:start + batch_size],
+        )
+
+    def query(query_embedding, include):
+        return collection.query(query_embeddings=query_embedding[None], n_results=n_results, include=include)
+
+    positions = [[int(i) for i in query(q, [])["ids"][0]] for q in queries]
+    query_time = time_call(lambda: [query(q, []) for q in queries])
+    embeddings_time = time_call(
+        lambda: [np.ascontiguousarray(query(q, ["embeddings"])["embeddings"][0], dtype=np.float32) for q in queries]
+    )
+    client.delete_collection("benchmark_quantization")
+    print(f"Chroma     float32  recall@{n_results} {recall(positions):.3f}, {query_time * 1000 / n_queries:.2f} ms "
+          f"per query, {embeddings_time * 1000 / n_queries:.2f} ms with the embeddings")
+
+
+BENCHMARKS = {
+    "parse_urls": benchmark_parse_urls,
+    "iter_gdelt": benchmark_iter_gdelt,
+    "read_gdelt_files": benchmark_read_gdelt_files,
+    "parquet_cache": benchmark_parquet_cache,
+    "compact_gdelt": benchmark_compact_gdelt,
+    "import_time": benchmark_import_time,
+    "numpy_index": benchmark_numpy_index,
+    "quantization": benchmark_quantization,
+}
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "benchmarks", nargs="*", default=list(BENCHMARKS),
+        help=f"benchmarks to run, among {', '.join(BENCHMARKS)} (default: all)",
+    )
+    args = parser.parse_args()
+
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    for name in args.benchmarks:
+        print(f"\n=== {name}")
+        BENCHMARKS[name]()
@@ -14,14 +14,26 @@ prohibited and subject to being investigated as a Code of Academic Integrity vio
 -----do not edit anything above this line---
 """
 
-from local_model import generate_response, recommend_trade
-from vector_database import retrieve_events_by_country, get_collection
+import argparse
+import os
+import time
+
+from local_model import analyze_countries, recommend_trade, stream_response, summary_prompt
+from response_cache import ResponseCache
+from vector_database import retrieve_events_by_country, retrieve_events_by_countries, get_collection
 
 import helpers
 
 
 if __name__ == "__main__":
 
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--no-cache", action="store_true", help="ask the model again instead of reusing cached responses")
+    args = parser.parse_args()
+
+    # Responses to the same prompts are reused for a day, when the pipeline is re-run on the same data
+    cache = ResponseCache(os.path.join(helpers.CACHE_FOLDER, "responses.sqlite"), ttl=24 * 60 * 60)
+
     # Get the collection of events from the vector database
     collection = get_collection(helpers.COLLECTION_NAME)
 
@@ -38,13 +50,56 @@ if __name__ == "__main__":
 
     prompt = "Hi There!"  # What should be the prompt?
 
-    event_summary = generate_response(prompt)
-    print(event_summary)
+    # Print the summary as it is generated, instead of waiting for the whole of it
+    summary_stats = {}
+    event_summary = ""
+    for chunk in stream_response(
+        prompt, options={"temperature": 0}, stats=summary_stats, cache=cache, bypass_cache=args.no_cache
+    ):
+        print(chunk, end="", flush=True)
+        event_summary += chunk
+    print()
+    if summary_stats["tokens"] and not summary_stats["cached"]:
+        print(
+            f"First token after {summary_stats['ttft']:.2f} seconds, "
+            f"{summary_stats['tokens_per_sec']:.1f} tokens per second."
+        )
 
     #################################
     # TODO: Analyze the model's trade decisions
     # Feel free to write your code here
     #################################
 
-    trade_decision = recommend_trade(country_of_interest, event_summary)
-    print(trade_decision)
+    # The error was printed instead of a summary, and a trade guessed from it would be meaningless
+    if summary_stats["stopped"] == "error":
+        print("No trade decision, the summary failed.")
+    else:
+        trade_stats = {}
+        trade_decision = recommend_trade(
+            country_of_interest, event_summary, stats=trade_stats, cache=cache, bypass_cache=args.no_cache
+        )
+        print(trade_decision)
+        print(
+            f"Trade decided in {trade_stats['latency']:.2f} seconds, tool selected: {trade_stats['tool_selected']}, "
+            f"cached: {trade_stats['cached']}"
+        )
+
+    #################################
+    # Summaries and trade decisions for several countries at once
+    #################################
+    countries = ["United States", "China", "Germany", "France", "Japan", "India"]
+
+    start_time = time.time()
+    events = retrieve_events_by_countries(collection, countries, n_results)
+    results = analyze_countries(
+        {country: summary_prompt(country, documents) for country, (documents, _) in events.items()},
+        max_concurrency=4,
+        cache=cache,
+        options={"temperature": 0},
+        bypass_cache=args.no_cache,
+    )
+    for country, (summary, trade) in results.items():
+        print(f"\n{country}: {trade or 'no trade, the summary failed'}\n{summary}")
+    print(f"\nAnalyzed {len(countries)} countries in {time.time() - start_time:.2f} seconds.")
+    print(f"Response cache: {cache.stats()}")
+    cache.close()
@@ -15,33 +15,99 @@ prohibited and subject to being investigated as a Code of Academic Integrity vio
 -----do not edit anything above this line---
 """
 
+import argparse
 import os
 import time
 
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-from sklearn.decomposition import PCA
-from sklearn.manifold import TSNE
-import chromadb
 import numpy as np
 
 import helpers
-from transform_data import read_gdelt
-from vector_database import create_database, retrieve_events_by_country, get_collection
+from transform_data import read_gdelt, read_gdelt_files
+from vector_database import build_metadatas, create_database, retrieve_events_by_country, get_collection
+
+# The plotting libraries are imported by the functions below, only when plots are requested.
+
+
+def plot_top_countries(df) -> None:
+    """Plot the number of events of the 10 locations with the most events."""
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    top_countries = df["ActionGeo_FullName"].value_counts().head(10)
+    plt.figure(figsize=(10, 5))
+    sns.barplot(x=top_countries.index, y=top_countries.values)
+    plt.xticks(rotation=45)
+    plt.title("Top 10 Countries with Most Events")
+    plt.xlabel("Country")
+    plt.ylabel("Event Count")
+    plt.show()
+
+
+def plot_tsne(embeddings: np.ndarray, country_of_interest: str) -> None:
+    """Plot the embeddings of events reduced to 2 dimensions with t-SNE."""
+    import matplotlib.pyplot as plt
+    from sklearn.manifold import TSNE
+
+    # Perform t-SNE
+    tsne = TSNE(n_components=2, random_state=42, perplexity=min(30, len(embeddings) - 1))
+    tsne_results = tsne.fit_transform(embeddings)
+
+    # Plot t-SNE results
+    plt.figure(figsize=(8, 6))
+    plt.scatter(tsne_results[:, 0], tsne_results[:, 1], alpha=0.7)
+    plt.title(f"t-SNE Visualization of Events in {country_of_interest}")
+    plt.xlabel("t-SNE Component 1")
+    plt.ylabel("t-SNE Component 2")
+    plt.show()
+
+
+def plot_pca(embeddings: np.ndarray, country_of_interest: str) -> None:
+    """Plot the embeddings of events reduced to 2 dimensions with PCA."""
+    import matplotlib.pyplot as plt
+    from sklearn.decomposition import PCA
+
+    # Perform PCA
+    pca = PCA(n_components=2)
+    pca_results = pca.fit_transform(embeddings)
+
+    # Plot PCA results
+    plt.figure(figsize=(8, 6))
+    plt.scatter(pca_results[:, 0], pca_results[:, 1], alpha=0.7)
+    plt.title(f"PCA Visualization of Events in {country_of_interest}")
+    plt.xlabel("Principal Component 1")
+    plt.ylabel("Principal Component 2")
+    plt.show()
 
 
 if __name__ == "__main__":
 
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--plot", action="store_true", help="show the EDA, t-SNE and PCA plots")
+    parser.add_argument(
+        "--partition", choices=["day", "week"],
+        help="also store the events in one collection per day or week, and query them by date range",
+    )
+    args = parser.parse_args()
+
+    import chromadb
+    from embedding_functions import CachedEmbeddingFunction, ParallelEmbeddingFunction
+
     # Initialize a persistent client
     os.makedirs(helpers.DATABASE_FOLDER, exist_ok=True)
     client = chromadb.PersistentClient(
         path=helpers.DATABASE_FOLDER,
     )
 
+    # The same event documents recur across days, so their embeddings are cached on disk.
+    # The others are embedded on all cores, set num_workers to use fewer.
+    embedding_function = CachedEmbeddingFunction(
+        ParallelEmbeddingFunction(num_workers=None), cache_folder=os.path.join(helpers.CACHE_FOLDER, "embeddings")
+    )
+
     #################################
     # Create a vector collection. This can be a bit slow...
     # depending on your hardware and patience.
+    # Re-running only embeds the events that are new or changed since the last run.
     # If you have already created the collection, set create_database_from_files to False.
     #################################
 
@@ -52,44 +118,68 @@ if __name__ == "__main__":
     #Create vector database (if needed)
     create_database_from_files = True
 
-    for file in files:
-        file_path = os.path.join(data_folder, file)
-
-        # Check if the file exists
-        if not os.path.exists(file_path):
-            print(f"⚠️ Skipping {file} (File Not Found)")
-            continue
-
-        # Read dataset
-        df = read_gdelt(data_folder=data_folder, filename=file)
-        if df.empty:
-            print(f"Skipping {file} (Empty File)")
-            continue
+    if create_database_from_files:
+        available_files = []
+        for file in files:
+            file_path = os.path.join(data_folder, file)
+
+            # Check if the file exists
+            if not os.path.exists(file_path):
+                print(f"⚠️ Skipping {file} (File Not Found)")
+                continue
+
+            available_files.append(file)
+
+        if available_files:
+            # Parse the files in parallel and remove SOURCEURLs repeated across files.
+            # URLs repeat across daily files, so their titles are cached on disk.
+            start_time = time.time()
+            os.makedirs(helpers.CACHE_FOLDER, exist_ok=True)
+            df = read_gdelt_files(
+                data_folder=data_folder,
+                filenames=available_files,
+                title_cache_path=os.path.join(helpers.CACHE_FOLDER, "url_titles.sqlite"),
+                cache_folder=helpers.CACHE_FOLDER,
+                country_code=True,
+            )
+            print(f"Parsed {len(available_files)} files ({len(df)} events) in {time.time() - start_time:.2f} seconds.")
 
-        # Convert data into required format
-        documents = [
-            f"Event: {x}. Impact location: {y}. Goldstein scale: {z}."
-            for x, y, z in zip(df.Text, df.ActionGeo_FullName, df.GoldsteinScale)
-        ]
+            # Convert data into required format
+            documents = [
+                f"Event: {x}. Impact location: {y}. Goldstein scale: {z}."
+                for x, y, z in zip(df.Text, df.ActionGeo_FullName, df.GoldsteinScale)
+            ]
 
-        # Start time tracking
-        start_time = time.time()
+            # Start time tracking
+            start_time = time.time()
 
-        if create_database_from_files:
             collection = create_database(
                 client=client,
                 collection_name=helpers.COLLECTION_NAME,
                 doc_ids=df.index.tolist(),
                 documents=documents,
+                metadatas=build_metadatas(df),
+                embedding_function=embedding_function,
+                verbose=True,
             )
-        else:
-            collection.add(
-                documents=documents,
-                ids=df.index.tolist()
-            )
 
-        print(f"{file} -- Time taken to load data: {time.time() - start_time:.2f} seconds.")
-        create_database_from_files = False  # Ensure database creation runs only once
+            if args.partition:
+                from partitioned_database import create_partitioned_database
+
+                create_partitioned_database(
+                    client=client,
+                    doc_ids=df.index.tolist(),
+                    documents=documents,
+                    dates=df.SQLDATE.tolist(),
+                    metadatas=build_metadatas(df),
+                    period=args.partition,
+                    embedding_function=embedding_function,
+                    verbose=True,
+                )
+            embedding_function.flush()
+
+            print(f"Time taken to load data: {time.time() - start_time:.2f} seconds.")
+            print(f"Embedding cache: {embedding_function.stats()}")
 
 
     #################################
@@ -98,20 +188,14 @@ if __name__ == "__main__":
 
     #Exploratory Data Analysis (EDA)
     print("\nExploratory Data Analysis (EDA):")
-    df_sample = read_gdelt(data_folder, files[0])
+    df_sample = read_gdelt(data_folder, files[0], cache_folder=helpers.CACHE_FOLDER)
 
     if not df_sample.empty:
         print(df_sample.head())
 
         #Country Distribution
-        top_countries = df_sample["ActionGeo_FullName"].value_counts().head(10)
-        plt.figure(figsize=(10, 5))
-        sns.barplot(x=top_countries.index, y=top_countries.values)
-        plt.xticks(rotation=45)
-        plt.title("Top 10 Countries with Most Events")
-        plt.xlabel("Country")
-        plt.ylabel("Event Count")
-        plt.show()
+        if args.plot:
+            plot_top_countries(df_sample)
     else:
         print("No data available for EDA.")
 
@@ -123,54 +207,45 @@ if __name__ == "__main__":
     n_results = 5
 
     try:
-        collection = client.get_collection(helpers.COLLECTION_NAME)
+        collection = client.get_collection(helpers.COLLECTION_NAME, embedding_function=embedding_function)
         documents, embeddings = retrieve_events_by_country(collection, country_of_interest, n_results)
         print("\nRetrieved Events:\n", documents)
     except Exception as e:
         print(f"Error retrieving events: {e}")
         documents, embeddings = [], None
 
+    if args.partition:
+        from partitioned_database import retrieve_events_by_country_in_range
+
+        start_time = time.time()
+        partition_documents, _ = retrieve_events_by_country_in_range(
+            client, country_of_interest, n_results, start_date=20250213, end_date=20250213,
+            embedding_function=embedding_function,
+        )
+        print(f"\nRetrieved Events on 2025-02-13 ({time.time() - start_time:.3f} seconds):\n", partition_documents)
+
     #################################
     # TODO: Plot clusters using t-SNE
     # You probably need to import libraries in requirements.txt
     #################################
 
     # Apply t-SNE for dimensionality reduction
-    if embeddings is not None and len(embeddings) > 1:
+    if not args.plot:
+        print("Run with --plot to visualize the embeddings.")
+    elif embeddings is not None and len(embeddings) > 1:
         try:
-            # Perform t-SNE
-            tsne = TSNE(n_components=2, random_state=42, perplexity=min(30, len(embeddings) - 1))
-            tsne_results = tsne.fit_transform(embeddings)
-
-            # Plot t-SNE results
-            plt.figure(figsize=(8, 6))
-            plt.scatter(tsne_results[:, 0], tsne_results[:, 1], alpha=0.7)
-            plt.title(f"t-SNE Visualization of Events in {country_of_interest}")
-            plt.xlabel("t-SNE Component 1")
-            plt.ylabel("t-SNE Component 2")
-            plt.show()
+            plot_tsne(embeddings, country_of_interest)
         except Exception as e:
             print(f"Error in t-SNE visualization: {e}")
 
-    #################################
-    # TODO: Plot clusters using PCA
-    # You probably need to import libraries in requirements.txt
-    #################################
+        #################################
+        # TODO: Plot clusters using PCA
+        # You probably need to import libraries in requirements.txt
+        #################################
 
-    # Convert embeddings to NumPy array if not already
         try:
-            # Perform PCA
-            pca = PCA(n_components=2)
-            pca_results = pca.fit_transform(embeddings)
-
-            # Plot PCA results
-            plt.figure(figsize=(8, 6))
-            plt.scatter(pca_results[:, 0], pca_results[:, 1], alpha=0.7)
-            plt.title(f"PCA Visualization of Events in {country_of_interest}")
-            plt.xlabel("Principal Component 1")
-            plt.ylabel("Principal Component 2")
-            plt.show()
+            plot_pca(embeddings, country_of_interest)
         except Exception as e:
             print(f"Error in PCA visualization: {e}")
     else:
-        print("Not enough embeddings for visualization.")
\ No newline at end of file
+        print("Not enough embeddings for visualization.")
@@ -14,9 +14,117 @@ prohibited and subject to being investigated as a Code of Academic Integrity vio
 -----do not edit anything above this line---
 """
 
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
 import unittest
 import re
-from download_data import list_gdelt_files
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from download_data import (
+    download_gdelt_files,
+    list_gdelt_files,
+    list_new_gdelt_files,
+    make_session,
+    scrape_gdelt_files,
+)
+
+
+class FakeGDELTHandler(BaseHTTPRequestHandler):
+    """Serve a fake GDELT events index page, its ".md5" files and the archives."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.client_ports.add(self.client_address[1])
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        try:
+            if self.path == "/events/":
+                etag = f'"{hashlib.md5(server.index_page.encode()).hexdigest()}"'
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                else:
+                    self.send_body(server.index_page.encode(), headers={"ETag": etag})
+            elif self.path.endswith(".md5"):
+                filename = self.path.rsplit("/", 1)[-1][: -len(".md5")]
+                time.sleep(server.md5_delay)
+                with server.lock:
+                    server.md5_requests += 1
+                self.send_body(f"{server.md5s[filename]}  {filename}\n".encode())
+            elif self.path.rsplit("/", 1)[-1] in server.contents:
+                self.send_archive(server.contents[self.path.rsplit("/", 1)[-1]])
+            else:
+                self.send_error(404)
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def send_body(self, body, status=200, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+        with self.server.lock:
+            self.server.bytes_sent += len(body)
+
+    def send_archive(self, content):
+        range_header = self.headers.get("Range")
+        if range_header is None or self.server.ignore_range:
+            self.send_body(content)
+            return
+        start = int(re.match(r"bytes=(\d+)-", range_header).group(1))
+        if start >= len(content):
+            self.send_body(b"", status=416)
+            return
+        self.send_body(
+            content[start:],
+            status=206,
+            headers={"Content-Range": f"bytes {start}-{len(content) - 1}/{len(content)}"},
+        )
+
+
+def start_fake_gdelt_server(dates):
+    """Start a fake GDELT server in a background thread, listing one file per date."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeGDELTHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.client_ports = set()
+    server.in_flight = 0
+    server.max_in_flight = 0
+    server.bytes_sent = 0
+    server.md5_requests = 0
+    server.md5_delay = 0.05
+    server.ignore_range = False
+    server.contents = {}
+    server.md5s = {}
+    add_fake_gdelt_files(server, dates)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def add_fake_gdelt_files(server, dates):
+    """Publish one more file per date on a fake GDELT server."""
+    for date in dates:
+        filename = f"{date}.export.CSV.zip"
+        server.contents[filename] = date.encode() * 5000
+        server.md5s[filename] = hashlib.md5(server.contents[filename]).hexdigest()
+    server.index_page = "\n".join(
+        f'<a href="{filename}">{filename}</a>  01-Jan-2024 06:00  8.1'
+        for filename in server.md5s
+    )
 
 
 class TestGDELTFiles(unittest.TestCase):
@@ -74,5 +182,186 @@ class TestGDELTFiles(unittest.TestCase):
             self.assertIsInstance(info["url"], str, f"URL for '{date}' is not a string")
 
 
+class TestScrapeGDELTFiles(unittest.TestCase):
+
+    def setUp(self):
+        self.dates = [f"202301{day:02d}" for day in range(1, 31)]
+        self.server = start_fake_gdelt_server(self.dates)
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}/events/"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_scrape_listing(self):
+        files = scrape_gdelt_files(year=2023, base_url=self.base_url)
+        self.assertListEqual(sorted(files), self.dates)
+        self.assertDictEqual(
+            files["20230103"],
+            {
+                "md5": hashlib.md5(b"20230103" * 5000).hexdigest(),
+                "filesize": "8.1",
+                "url": f"{self.base_url}20230103.export.CSV.zip",
+            },
+        )
+        # Other years are filtered out
+        self.assertDictEqual(scrape_gdelt_files(year=2022, base_url=self.base_url), {})
+
+    def test_md5_fetched_concurrently_with_pooled_connections(self):
+        session = make_session(max_per_host=4)
+        files = scrape_gdelt_files(
+            year=2023, base_url=self.base_url, session=session, max_workers=8
+        )
+        session.close()
+
+        self.assertEqual(len(files), len(self.dates))
+        # The md5 files were requested concurrently, up to the cap of the
+        # connection pool on the number of requests in flight per host
+        self.assertGreater(self.server.max_in_flight, 1)
+        self.assertLessEqual(self.server.max_in_flight, 4)
+        # Connections are reused rather than opened once per file
+        self.assertLessEqual(len(self.server.client_ports), 4)
+
+
+class TestListingCache(unittest.TestCase):
+
+    def setUp(self):
+        self.dates = ["20230101", "20230102", "20230103"]
+        self.server = start_fake_gdelt_server(self.dates)
+        self.server.md5_delay = 0
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}/events/"
+        self.cache_folder = tempfile.mkdtemp()
+        self.cache_path = os.path.join(self.cache_folder, "listing.json")
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.cache_folder)
+
+    def test_unchanged_listing_is_not_fetched_again(self):
+        files = scrape_gdelt_files(
+            year=2023, base_url=self.base_url, cache_path=self.cache_path
+        )
+        self.assertEqual(self.server.md5_requests, 3)
+
+        self.server.bytes_sent = 0
+        cached_files = scrape_gdelt_files(
+            year=2023, base_url=self.base_url, cache_path=self.cache_path
+        )
+        self.assertDictEqual(cached_files, files)
+        # A single 304 response without a body, and no md5 requests
+        self.assertEqual(self.server.bytes_sent, 0)
+        self.assertEqual(self.server.md5_requests, 3)
+
+    def test_only_new_dates_fetch_md5(self):
+        scrape_gdelt_files(year=2023, base_url=self.base_url, cache_path=self.cache_path)
+        add_fake_gdelt_files(self.server, ["20230104"])
+
+        files = scrape_gdelt_files(
+            year=2023, base_url=self.base_url, cache_path=self.cache_path
+        )
+        self.assertListEqual(list(files), self.dates + ["20230104"])
+        self.assertEqual(self.server.md5_requests, 4)
+
+    def test_list_new_files(self):
+        new_files = list_new_gdelt_files(self.cache_path, base_url=self.base_url)
+        self.assertListEqual(list(new_files), self.dates)
+
+        self.assertDictEqual(list_new_gdelt_files(self.cache_path, base_url=self.base_url), {})
+
+        add_fake_gdelt_files(self.server, ["20230104", "20240101"])
+        new_files = list_new_gdelt_files(self.cache_path, year=2023, base_url=self.base_url)
+        self.assertListEqual(list(new_files), ["20230104"])
+        self.assertEqual(new_files["20230104"]["md5"], self.server.md5s["20230104.export.CSV.zip"])
+        self.assertEqual(self.server.md5_requests, 4)
+
+
+class TestDownloadGDELTFiles(unittest.TestCase):
+
+    def setUp(self):
+        self.dates = ["20230101", "20230102", "20230103"]
+        self.server = start_fake_gdelt_server(self.dates)
+        self.server.md5_delay = 0
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}/events/"
+        self.files = scrape_gdelt_files(year=2023, base_url=self.base_url)
+        self.server.bytes_sent = 0
+        self.data_folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.data_folder)
+
+    def read(self, date):
+        with open(os.path.join(self.data_folder, f"{date}.export.CSV.zip"), "rb") as f:
+            return f.read()
+
+    def test_download_files(self):
+        paths = download_gdelt_files(self.files, self.data_folder, chunk_size=1024)
+        self.assertListEqual(sorted(paths), self.dates)
+        for date in self.dates:
+            self.assertEqual(self.read(date), date.encode() * 5000)
+            self.assertFalse(os.path.exists(f"{paths[date]}.part"))
+
+    def test_skip_existing_files(self):
+        download_gdelt_files(self.files, self.data_folder)
+        bytes_sent = self.server.bytes_sent
+
+        paths = download_gdelt_files(self.files, self.data_folder)
+        self.assertTrue(all(paths.values()))
+        self.assertEqual(self.server.bytes_sent, bytes_sent)
+
+    def test_resume_partial_file(self):
+        content = b"20230102" * 5000
+        part_path = os.path.join(self.data_folder, "20230102.export.CSV.zip.part")
+        with open(part_path, "wb") as f:
+            f.write(content[:15000])
+
+        files = {"20230102": self.files["20230102"]}
+        paths = download_gdelt_files(files, self.data_folder)
+
+        self.assertEqual(self.read("20230102"), content)
+        self.assertEqual(paths["20230102"], part_path[: -len(".part")])
+        # Only the missing bytes were transferred
+        self.assertEqual(self.server.bytes_sent, len(content) - 15000)
+
+    def test_partial_file_larger_than_remote(self):
+        content = b"20230102" * 5000
+        part_path = os.path.join(self.data_folder, "20230102.export.CSV.zip.part")
+        with open(part_path, "wb") as f:
+            f.write(content + b"extra bytes")
+
+        files = {"20230102": self.files["20230102"]}
+        paths = download_gdelt_files(files, self.data_folder)
+
+        # The server answers 416 to the Range request, and the file is downloaded again
+        self.assertEqual(paths["20230102"], part_path[: -len(".part")])
+        self.assertEqual(self.read("20230102"), content)
+        self.assertEqual(self.server.bytes_sent, len(content))
+        self.assertFalse(os.path.exists(part_path))
+
+    def test_server_ignores_range(self):
+        self.server.ignore_range = True
+        content = b"20230102" * 5000
+        part_path = os.path.join(self.data_folder, "20230102.export.CSV.zip.part")
+        with open(part_path, "wb") as f:
+            f.write(content[:15000])
+
+        files = {"20230102": self.files["20230102"]}
+        paths = download_gdelt_files(files, self.data_folder)
+
+        # The whole file was sent with a 200, and replaced the partial one
+        self.assertEqual(self.read("20230102"), content)
+        self.assertEqual(paths["20230102"], part_path[: -len(".part")])
+        self.assertEqual(self.server.bytes_sent, len(content))
+
+    def test_md5_mismatch(self):
+        files = {"20230101": dict(self.files["20230101"], md5="0" * 32)}
+        paths = download_gdelt_files(files, self.data_folder)
+
+        self.assertIsNone(paths["20230101"])
+        self.assertListEqual(os.listdir(self.data_folder), [])
+
+
 if __name__ == "__main__":
     unittest.main()
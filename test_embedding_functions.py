@@ -0,0 +1,227 @@
+""" test_embedding_functions.py
+
+Copyright 2025, Cornell University
+
+Cornell University asserts copyright ownership of this template and all derivative
+works, including solutions to the projects assigned in this course. Students
+and other users of this template code are advised not to share it with others
+or to make it available on publicly viewable websites including online repositories
+such as Github.
+
+Sharing solutions with current or future students of ENMGT5400 is
+prohibited and subject to being investigated as a Code of Academic Integrity violation.
+
+-----do not edit anything above this line---
+"""
+
+import os
+import tempfile
+import unittest
+import zlib
+
+import chromadb
+import numpy as np
+
+from embedding_functions import CachedEmbeddingFunction, ParallelEmbeddingFunction
+
+
+class CountingEmbeddingFunction(chromadb.EmbeddingFunction):
+    """Deterministic embeddings that record every text they embed."""
+
+    def __init__(self, size: int = 8):
+        self.size = size
+        self.embedded = []
+
+    @staticmethod
+    def name() -> str:
+        return "counting"
+
+    def __call__(self, input: list[str]) -> list[np.ndarray]:
+        self.embedded.extend(input)
+        return [
+            np.random.default_rng(zlib.crc32(text.encode())).random(self.size, dtype=np.float32)
+            for text in input
+        ]
+
+
+class ProcessEmbeddingFunction(CountingEmbeddingFunction):
+    """Embeddings tagged with the id of the process that computed them."""
+
+    def __call__(self, input: list[str]) -> list[np.ndarray]:
+        return [np.append(embedding, os.getpid()) for embedding in super().__call__(input)]
+
+
+class OtherEmbeddingFunction(CountingEmbeddingFunction):
+    """Another model with embeddings of the same size."""
+
+    @staticmethod
+    def name() -> str:
+        return "other"
+
+
+class TestCachedEmbeddingFunction(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cache_folder = os.path.join(self.temp_dir.name, "embeddings")
+        self.base = CountingEmbeddingFunction()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_same_embeddings_as_wrapped_function(self):
+        cached = CachedEmbeddingFunction(self.base, self.cache_folder)
+        texts = ["Event A", "Event B", "Event A"]
+
+        for embedding, expected in zip(cached(texts), CountingEmbeddingFunction()(texts)):
+            np.testing.assert_array_equal(embedding, expected)
+        for embedding, expected in zip(cached(texts), CountingEmbeddingFunction()(texts)):
+            np.testing.assert_array_equal(embedding, expected)
+
+    def test_each_text_is_embedded_once(self):
+        cached = CachedEmbeddingFunction(self.base, self.cache_folder)
+        cached(["Event A", "Event B", "Event A"])
+        cached(["Event B", "Event C"])
+
+        self.assertEqual(self.base.embedded, ["Event A", "Event B", "Event C"])
+        self.assertEqual(cached.stats(), {"hits": 1, "misses": 4, "hit_rate": 0.2, "size": 3})
+
+    def test_persisted_across_instances(self):
+        cached = CachedEmbeddingFunction(self.base, self.cache_folder)
+        first = cached(["Event A", "Event B"])
+        cached.flush()
+
+        base = CountingEmbeddingFunction()
+        reopened = CachedEmbeddingFunction(base, self.cache_folder)
+        self.assertEqual(len(reopened), 2)
+        np.testing.assert_array_equal(reopened(["Event B"])[0], first[1])
+        self.assertEqual(base.embedded, [])
+
+    def test_least_recently_used_is_evicted(self):
+        cached = CachedEmbeddingFunction(self.base, self.cache_folder, capacity=2)
+        cached(["Event A", "Event B"])
+        cached(["Event A"])
+        cached(["Event C"])  # Evicts Event B
+        self.base.embedded.clear()
+
+        cached(["Event A", "Event C"])
+        self.assertEqual(self.base.embedded, [])
+        cached(["Event B"])
+        self.assertEqual(self.base.embedded, ["Event B"])
+        self.assertEqual(len(cached), 2)
+
+        # The order of use survives reopening the cache
+        cached.flush()
+        base = CountingEmbeddingFunction()
+        reopened = CachedEmbeddingFunction(base, self.cache_folder, capacity=2)
+        reopened(["Event D"])  # Evicts Event C
+        reopened(["Event B", "Event C"])
+        self.assertEqual(base.embedded, ["Event D", "Event C"])
+
+    def test_hits_are_not_evicted_by_the_same_call(self):
+        cached = CachedEmbeddingFunction(self.base, self.cache_folder, capacity=2)
+        cached(["Event A", "Event B"])
+
+        texts = ["Event A", "Event C", "Event D"]
+        for embedding, expected in zip(cached(texts), CountingEmbeddingFunction()(texts)):
+            np.testing.assert_array_equal(embedding, expected)
+
+        # Event A and Event C were kept, Event D did not fit
+        self.base.embedded.clear()
+        cached(["Event A", "Event C"])
+        self.assertEqual(self.base.embedded, [])
+        self.assertEqual(len(cached), 2)
+
+    def test_batch_larger_than_capacity(self):
+        cached = CachedEmbeddingFunction(self.base, self.cache_folder, capacity=2)
+        texts = [f"Event {i}" for i in range(5)]
+        self.assertEqual(len(cached(texts)), 5)
+        self.assertEqual(len(cached(texts)), 5)
+        self.assertEqual(len(cached), 2)
+
+    def test_new_capacity_starts_a_new_cache(self):
+        cached = CachedEmbeddingFunction(self.base, self.cache_folder, capacity=2)
+        cached(["Event A"])
+        cached.flush()
+
+        reopened = CachedEmbeddingFunction(self.base, self.cache_folder, capacity=4)
+        self.assertEqual(len(reopened), 0)
+
+    def test_new_model_starts_a_new_cache(self):
+        cached = CachedEmbeddingFunction(self.base, self.cache_folder)
+        cached(["Event A"])
+        cached.flush()
+
+        other = OtherEmbeddingFunction()
+        reopened = CachedEmbeddingFunction(other, self.cache_folder)
+        self.assertEqual(len(reopened), 0)
+        reopened(["Event A"])
+        self.assertEqual(other.embedded, ["Event A"])
+
+    def test_in_memory(self):
+        cached = CachedEmbeddingFunction(self.base)
+        cached(["Event A"])
+        cached(["Event A"])
+        self.assertEqual(self.base.embedded, ["Event A"])
+
+    def test_collection_uses_the_wrapped_name(self):
+        client = chromadb.EphemeralClient()
+        cached = CachedEmbeddingFunction(self.base, self.cache_folder)
+        self.assertEqual(cached.name(), "counting")
+
+        collection = client.create_collection("test_cached", embedding_function=cached)
+        collection.add(ids=["1", "2"], documents=["Event A", "Event B"])
+        self.assertEqual(cached.stats()["misses"], 2)
+
+        # The collection can be reopened with the wrapped function
+        collection = client.get_collection("test_cached", embedding_function=self.base)
+        self.assertEqual(collection.count(), 2)
+        client.delete_collection("test_cached")
+
+
+class TestParallelEmbeddingFunction(unittest.TestCase):
+
+    def setUp(self):
+        self.texts = [f"Event {i}" for i in range(25)]
+
+    def test_same_embeddings_in_the_same_order(self):
+        with ParallelEmbeddingFunction(num_workers=2, batch_size=4, factory=CountingEmbeddingFunction) as parallel:
+            embeddings = parallel(self.texts)
+
+        expected = CountingEmbeddingFunction()(self.texts)
+        self.assertEqual(len(embeddings), len(self.texts))
+        for embedding, expected_embedding in zip(embeddings, expected):
+            np.testing.assert_array_equal(embedding, expected_embedding)
+
+    def test_batches_run_in_worker_processes(self):
+        with ParallelEmbeddingFunction(num_workers=2, batch_size=4, factory=ProcessEmbeddingFunction) as parallel:
+            pids = {int(embedding[-1]) for embedding in parallel(self.texts)}
+            # The workers are reused across calls
+            pids |= {int(embedding[-1]) for embedding in parallel(self.texts)}
+
+        self.assertNotIn(os.getpid(), pids)
+        self.assertLessEqual(len(pids), 2)
+
+    def test_single_worker_runs_in_process(self):
+        parallel = ParallelEmbeddingFunction(num_workers=1, batch_size=4, factory=ProcessEmbeddingFunction)
+        pids = {int(embedding[-1]) for embedding in parallel(self.texts)}
+        self.assertEqual(pids, {os.getpid()})
+        self.assertIsNone(parallel._executor)
+
+    def test_name_of_the_worker_function(self):
+        parallel = ParallelEmbeddingFunction(num_workers=2, factory=CountingEmbeddingFunction)
+        self.assertEqual(parallel.name(), "counting")
+        self.assertEqual(ParallelEmbeddingFunction(num_workers=2).name(), "default")
+
+    def test_collection_add(self):
+        client = chromadb.EphemeralClient()
+        with ParallelEmbeddingFunction(num_workers=2, batch_size=4, factory=CountingEmbeddingFunction) as parallel:
+            collection = client.create_collection("test_parallel", embedding_function=parallel)
+            collection.add(ids=[str(i) for i in range(len(self.texts))], documents=self.texts)
+
+        self.assertEqual(collection.count(), len(self.texts))
+        client.delete_collection("test_parallel")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -14,9 +14,31 @@ prohibited and subject to being investigated as a Code of Academic Integrity vio
 -----do not edit anything above this line---
 """
 
+import asyncio
+import sqlite3
 import unittest
-from unittest.mock import patch, Mock
-from local_model import generate_response, recommend_trade, select_short, select_long
+from unittest.mock import patch, AsyncMock, Mock
+from local_model import (
+    aanalyze_countries,
+    agenerate_response,
+    analyze_countries,
+    arecommend_trade,
+    generate_response,
+    recommend_trade,
+    select_short,
+    select_long,
+    stream_response,
+)
+from response_cache import ResponseCache
+
+
+def make_chat_response(function_name: str) -> Mock:
+    """Return a chat response with a tool call of function_name."""
+    tool_call = Mock()
+    tool_call.function.name = function_name
+    response = Mock()
+    response.message.tool_calls = [tool_call]
+    return response
 
 
 class TestLocalModel(unittest.TestCase):
@@ -65,7 +87,7 @@ class TestLocalModel(unittest.TestCase):
             model=model, prompt=prompt
         )
 
-    @patch("local_model.ollama.Client")
+    @patch("ollama.Client")
     def test_recommend_trade_calls_chat(self, MockClient):
         """
         Tests that ollama.Client is called at least once and the chat method is called at least once.
@@ -91,7 +113,7 @@ class TestLocalModel(unittest.TestCase):
         mock_client_instance.chat.assert_called_once()
         self.assertEqual(result, "Long USA")
 
-    @patch("local_model.ollama.Client")
+    @patch("ollama.Client")
     def test_recommend_trade_calls_chat_short(self, MockClient):
         """
         Tests that ollama.Client is called at least once and the chat method is called at least once, short case.
@@ -117,6 +139,342 @@ class TestLocalModel(unittest.TestCase):
         mock_client_instance.chat.assert_called_once()
         self.assertEqual(result, "Short China")
 
+    @patch("ollama.Client")
+    def test_recommend_trade_single_tool_call(self, MockClient):
+        mock_client_instance = MockClient.return_value
+        mock_client_instance.chat.return_value = make_chat_response("select_short")
+
+        stats = {}
+        result = recommend_trade("China", "Negative economic indicators.", stats=stats)
+
+        self.assertEqual(result, "Short China")
+        mock_client_instance.chat.assert_called_once()
+        kwargs = mock_client_instance.chat.call_args.kwargs
+        self.assertEqual(kwargs["tools"], [select_long, select_short])
+        self.assertEqual(kwargs["options"], {"temperature": 0})
+        self.assertTrue(stats["tool_selected"])
+        self.assertGreaterEqual(stats["latency"], 0)
+
+    @patch("ollama.Client")
+    def test_recommend_trade_without_tool_call(self, MockClient):
+        mock_client_instance = MockClient.return_value
+        mock_client_instance.chat.return_value = Mock(message=Mock(tool_calls=None))
+
+        stats = {}
+        result = recommend_trade("China", "Negative economic indicators.", stats=stats)
+
+        # The trade is inferred from the summary
+        self.assertEqual(result, "Short China")
+        mock_client_instance.chat.assert_called_once()
+        self.assertFalse(stats["tool_selected"])
+
+
+class TestResponseCaching(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = ResponseCache()
+
+    @patch("ollama.Client")
+    def test_generate_response_cached_at_zero_temperature(self, MockClient):
+        generate = MockClient.return_value.generate
+        generate.return_value = {"response": "Some response"}
+
+        for _ in range(2):
+            result = generate_response("Hello World!", self.cache, options={"temperature": 0})
+            self.assertEqual(result, "Some response")
+        generate.assert_called_once_with(model="llama3.2", prompt="Hello World!", options={"temperature": 0})
+
+        generate_response("Hello World!", self.cache, options={"temperature": 0}, bypass_cache=True)
+        self.assertEqual(generate.call_count, 2)
+
+    @patch("ollama.Client")
+    def test_generate_response_not_cached_when_sampling(self, MockClient):
+        generate = MockClient.return_value.generate
+        generate.return_value = {"response": "Some response"}
+
+        generate_response("Hello World!", self.cache)
+        generate_response("Hello World!", self.cache, options={"temperature": 0.8})
+        self.assertEqual(generate.call_count, 2)
+        self.assertEqual(len(self.cache), 0)
+
+    @patch("ollama.Client")
+    def test_errors_are_not_cached(self, MockClient):
+        MockClient.return_value.generate.side_effect = ConnectionError("no server")
+        result = generate_response("Hello World!", self.cache, options={"temperature": 0})
+        self.assertTrue(result.startswith("Error generating response"))
+        self.assertEqual(len(self.cache), 0)
+
+    @patch("ollama.Client")
+    def test_cache_errors_are_not_generation_errors(self, MockClient):
+        MockClient.return_value.generate.return_value = {"response": "Some response"}
+
+        with patch.object(self.cache, "set", side_effect=sqlite3.OperationalError("disk is full")):
+            with self.assertRaises(sqlite3.OperationalError):
+                generate_response("Hello World!", self.cache, options={"temperature": 0})
+
+    @patch("ollama.Client")
+    def test_recommend_trade_cached(self, MockClient):
+        chat = MockClient.return_value.chat
+        chat.return_value = make_chat_response("select_short")
+
+        recommend_trade("China", "Negative economic indicators.", cache=self.cache)
+        stats = {}
+        result = recommend_trade("China", "Negative economic indicators.", stats=stats, cache=self.cache)
+
+        self.assertEqual(result, "Short China")
+        chat.assert_called_once()
+        self.assertTrue(stats["cached"])
+
+        # Another summary is another request
+        recommend_trade("China", "Positive economic indicators.", cache=self.cache)
+        self.assertEqual(chat.call_count, 2)
+
+    @patch("ollama.AsyncClient")
+    def test_analyze_countries_cached(self, MockAsyncClient):
+        client = MockAsyncClient.return_value
+        client.generate = AsyncMock(return_value={"response": "Negative outlook"})
+        client.chat = AsyncMock(return_value=make_chat_response("select_short"))
+        client.close = AsyncMock()
+
+        prompts = {"France": "prompt France", "Germany": "prompt Germany"}
+        first = analyze_countries(prompts, cache=self.cache, options={"temperature": 0})
+        second = analyze_countries(prompts, cache=self.cache, options={"temperature": 0})
+
+        self.assertEqual(first, second)
+        self.assertEqual(client.generate.await_count, 2)
+        # Both countries have the same summary, but not the same trade
+        self.assertEqual(client.chat.await_count, 2)
+
+
+class TestStreamResponse(unittest.TestCase):
+
+    def make_stream(self, pieces, done=True):
+        """Return a mocked stream of chunks, closed like a generator."""
+        chunks = [{"response": piece, "done": False} for piece in pieces]
+        if done:
+            chunks.append({"response": "", "done": True, "eval_count": len(pieces), "eval_duration": 2e9})
+
+        stream = Mock()
+        stream.__iter__ = Mock(return_value=iter(chunks))
+        return stream
+
+    @patch("ollama.Client")
+    def test_yields_chunks(self, MockClient):
+        generate = MockClient.return_value.generate
+        generate.return_value = self.make_stream(["The ", "economy ", "grows."])
+
+        stats = {}
+        chunks = list(stream_response("Hello World!", stats=stats))
+
+        self.assertEqual(chunks, ["The ", "economy ", "grows."])
+        generate.assert_called_once_with(model="llama3.2", prompt="Hello World!", stream=True)
+        self.assertIsNotNone(stats["ttft"])
+        self.assertEqual(stats["tokens"], 3)
+        self.assertEqual(stats["tokens_per_sec"], 1.5)
+        self.assertIsNone(stats["stopped"])
+
+    @patch("ollama.Client")
+    def test_stops_at_keyword(self, MockClient):
+        stream = self.make_stream(["Recommend: ", "SHO", "RT ", "because ", "of ", "the ", "events."])
+        MockClient.return_value.generate.return_value = stream
+
+        stats = {}
+        chunks = list(stream_response("Hello World!", stop_keywords=["short", "long"], stats=stats))
+
+        self.assertEqual("".join(chunks), "Recommend: SHORT ")
+        self.assertEqual(stats["stopped"], "keyword")
+        stream.close.assert_called_once()
+
+    @patch("ollama.Client")
+    def test_keywords_inside_words_do_not_stop(self, MockClient):
+        pieces = ["A shortage ", "of parts ", "belonging ", "to the ", "long", "er term, ", "so long."]
+        MockClient.return_value.generate.return_value = self.make_stream(pieces)
+
+        stats = {}
+        chunks = list(stream_response("Hello World!", stop_keywords=["short", "long"], stats=stats))
+
+        self.assertEqual(chunks, pieces)
+        self.assertEqual(stats["stopped"], "keyword")
+
+    @patch("ollama.Client")
+    def test_stops_at_max_tokens(self, MockClient):
+        stream = self.make_stream([f"word{i} " for i in range(100)], done=False)
+        MockClient.return_value.generate.return_value = stream
+
+        stats = {}
+        chunks = list(stream_response("Hello World!", max_tokens=5, stats=stats))
+
+        self.assertEqual(len(chunks), 5)
+        self.assertEqual(stats["stopped"], "max_tokens")
+        self.assertEqual(stats["tokens"], 5)
+        stream.close.assert_called_once()
+
+    @patch("ollama.Client")
+    def test_stats_when_the_caller_stops(self, MockClient):
+        stream = self.make_stream([f"word{i} " for i in range(100)], done=False)
+        MockClient.return_value.generate.return_value = stream
+
+        stats = {}
+        chunks = stream_response("Hello World!", stats=stats)
+        self.assertEqual([next(chunks) for _ in range(3)], ["word0 ", "word1 ", "word2 "])
+        chunks.close()
+
+        self.assertEqual(stats["tokens"], 3)
+        self.assertGreater(stats["seconds"], 0)
+        stream.close.assert_called_once()
+
+    @patch("ollama.Client")
+    def test_request_errors(self, MockClient):
+        cache = ResponseCache()
+        MockClient.return_value.generate.side_effect = ConnectionError("no server")
+
+        stats = {}
+        chunks = list(stream_response("Hello World!", options={"temperature": 0}, stats=stats, cache=cache))
+
+        self.assertEqual(len(chunks), 1)
+        self.assertTrue(chunks[0].startswith("Error generating response"))
+        self.assertEqual(stats["stopped"], "error")
+        self.assertEqual(len(cache), 0)
+
+    @patch("ollama.Client")
+    def test_stream_errors(self, MockClient):
+        def broken_stream():
+            yield {"response": "The ", "done": False}
+            raise ConnectionError("connection reset")
+
+        MockClient.return_value.generate.return_value = broken_stream()
+        chunks = list(stream_response("Hello World!"))
+
+        self.assertEqual(chunks[0], "The ")
+        self.assertTrue(chunks[1].startswith("Error generating response"))
+
+    @patch("ollama.Client")
+    def test_only_complete_responses_are_cached(self, MockClient):
+        generate = MockClient.return_value.generate
+        cache = ResponseCache()
+        options = {"temperature": 0}
+
+        generate.return_value = self.make_stream(["Long ", "France"])
+        list(stream_response("Hello World!", options=options, stop_keywords=["long"], cache=cache))
+        self.assertEqual(len(cache), 0)
+
+        generate.return_value = self.make_stream(["Long ", "France"])
+        list(stream_response("Hello World!", options=options, cache=cache))
+
+        stats = {}
+        self.assertEqual(list(stream_response("Hello World!", options=options, cache=cache, stats=stats)),
+                         ["Long France"])
+        self.assertTrue(stats["cached"])
+        self.assertEqual(generate.call_count, 2)
+
+
+class TestAsyncLocalModel(unittest.TestCase):
+
+    @patch("ollama.AsyncClient")
+    def test_agenerate_response(self, MockAsyncClient):
+        client = MockAsyncClient.return_value
+        client.generate = AsyncMock(return_value={"response": " Some response "})
+
+        result = asyncio.run(agenerate_response("Hello World!"))
+
+        self.assertEqual(result, "Some response")
+        client.generate.assert_awaited_once_with(model="llama3.2", prompt="Hello World!")
+
+    def test_agenerate_response_retries(self):
+        client = Mock()
+        client.generate = AsyncMock(side_effect=[ConnectionError("busy"), {"response": "Some response"}])
+
+        with patch("local_model.asyncio.sleep", AsyncMock()):
+            result = asyncio.run(agenerate_response("Hello World!", client=client, retries=1))
+
+        self.assertEqual(result, "Some response")
+        self.assertEqual(client.generate.await_count, 2)
+
+    def test_agenerate_response_does_not_retry_other_errors(self):
+        import ollama
+
+        client = Mock()
+        client.generate = AsyncMock(side_effect=ollama.ResponseError("model not found", 404))
+
+        with patch("local_model.asyncio.sleep", AsyncMock()) as sleep:
+            result = asyncio.run(agenerate_response("Hello World!", client=client, retries=2))
+
+        self.assertTrue(result.startswith("Error generating response"))
+        self.assertEqual(client.generate.await_count, 1)
+        sleep.assert_not_awaited()
+
+    def test_agenerate_response_timeout(self):
+        async def slow_generate(**kwargs):
+            await asyncio.sleep(10)
+
+        client = Mock()
+        client.generate = slow_generate
+
+        result = asyncio.run(agenerate_response("Hello World!", client=client, timeout=0.01))
+        self.assertTrue(result.startswith("Error generating response"))
+
+    def test_arecommend_trade_single_tool_call(self):
+        client = Mock()
+        client.chat = AsyncMock(return_value=make_chat_response("select_short"))
+
+        result = asyncio.run(arecommend_trade("China", "Negative economic indicators.", client=client))
+
+        self.assertEqual(result, "Short China")
+        client.chat.assert_awaited_once()
+        kwargs = client.chat.await_args.kwargs
+        self.assertEqual(kwargs["tools"], [select_long, select_short])
+        self.assertEqual(kwargs["options"], {"temperature": 0})
+
+    def test_arecommend_trade_without_tool_call(self):
+        client = Mock()
+        client.chat = AsyncMock(side_effect=ConnectionError("no server"))
+
+        result = asyncio.run(arecommend_trade("China", "Negative economic indicators.", client=client))
+        self.assertEqual(result, "Short China")
+
+    @patch("ollama.AsyncClient")
+    def test_analyze_countries_bounded_concurrency(self, MockAsyncClient):
+        in_flight = 0
+        max_in_flight = 0
+
+        async def generate(model, prompt):
+            nonlocal in_flight, max_in_flight
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return {"response": f"Summary of {prompt}"}
+
+        client = MockAsyncClient.return_value
+        client.generate = generate
+        client.chat = AsyncMock(return_value=make_chat_response("select_long"))
+        client.close = AsyncMock()
+
+        countries = [f"Country {i}" for i in range(10)]
+        results = analyze_countries({country: country for country in countries}, max_concurrency=3)
+
+        MockAsyncClient.assert_called_once()
+        self.assertEqual(list(results), countries)
+        self.assertEqual(results["Country 4"], ("Summary of Country 4", "Long Country 4"))
+        self.assertEqual(max_in_flight, 3)
+        client.close.assert_awaited_once()
+
+    @patch("ollama.AsyncClient")
+    def test_aanalyze_countries_keeps_going_after_errors(self, MockAsyncClient):
+        client = MockAsyncClient.return_value
+        client.generate = AsyncMock(side_effect=[ConnectionError("down"), {"response": "Negative outlook"}])
+        client.chat = AsyncMock(return_value=make_chat_response("select_short"))
+        client.close = AsyncMock()
+
+        results = asyncio.run(aanalyze_countries({"France": "prompt", "Germany": "prompt"}, retries=0))
+
+        # No trade is recommended from the error message
+        self.assertTrue(results["France"][0].startswith("Error generating response"))
+        self.assertIsNone(results["France"][1])
+        self.assertEqual(results["Germany"], ("Negative outlook", "Short Germany"))
+        client.chat.assert_awaited_once()
+        client.close.assert_awaited_once()
+
 
 if __name__ == "__main__":
     unittest.main()
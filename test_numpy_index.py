@@ -0,0 +1,219 @@
+""" test_numpy_index.py
+
+Copyright 2025, Cornell University
+
+Cornell University asserts copyright ownership of this template and all derivative
+works, including solutions to the projects assigned in this course. Students
+and other users of this template code are advised not to share it with others
+or to make it available on publicly viewable websites including online repositories
+such as Github.
+
+Sharing solutions with current or future students of ENMGT5400 is
+prohibited and subject to being investigated as a Code of Academic Integrity violation.
+
+-----do not edit anything above this line---
+"""
+
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from numpy_index import NumpyIndex, retrieve_events_by_country
+from test_vector_database import FakeEmbeddingFunction
+
+
+def random_embeddings(n: int, dimension: int = 16, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).standard_normal((n, dimension)).astype(np.float32)
+
+
+class TestNumpyIndexSearch(unittest.TestCase):
+
+    def setUp(self):
+        self.embeddings = random_embeddings(1000)
+        self.queries = random_embeddings(5, seed=1)
+        normalized = self.embeddings / np.linalg.norm(self.embeddings, axis=1, keepdims=True)
+        self.expected_scores = self.queries / np.linalg.norm(self.queries, axis=1, keepdims=True) @ normalized.T
+
+    def make_index(self, block_size=65_536, folder=None):
+        index = NumpyIndex(folder, block_size=block_size)
+        index.add(list(range(1000)), [f"Event {i}" for i in range(1000)], self.embeddings)
+        return index
+
+    def test_same_results_as_brute_force(self):
+        expected = np.argsort(-self.expected_scores, axis=1)[:, :10]
+        for block_size in [65_536, 64, 7]:
+            positions, scores = self.make_index(block_size).search(self.queries, 10)
+            np.testing.assert_array_equal(positions, expected)
+            np.testing.assert_allclose(scores, np.take_along_axis(self.expected_scores, expected, axis=1), rtol=1e-5)
+
+    def test_mask(self):
+        mask = np.arange(1000) % 3 == 0
+        positions, _ = self.make_index(block_size=100).search(self.queries, 10, mask=mask)
+
+        scores = np.where(mask, self.expected_scores, -np.inf)
+        np.testing.assert_array_equal(positions, np.argsort(-scores, axis=1)[:, :10])
+
+    def test_fewer_documents_than_results(self):
+        index = NumpyIndex()
+        index.add(["1", "2"], ["Event 1", "Event 2"], self.embeddings[:2])
+        positions, scores = index.search(self.queries[:1], 10)
+        self.assertEqual(positions.shape, (1, 2))
+
+        positions, scores = index.search(self.queries[:1], 10, mask=np.array([False, True]))
+        self.assertEqual(positions[0][0], 1)
+        self.assertTrue(np.isneginf(scores[0][1]))
+
+    def test_empty(self):
+        positions, scores = NumpyIndex().search(self.queries, 10)
+        self.assertEqual(positions.shape, (5, 0))
+
+    def test_grows_in_a_folder(self):
+        with tempfile.TemporaryDirectory() as folder:
+            index = NumpyIndex(folder)
+            for start in range(0, 1000, 300):
+                ids = list(range(start, min(start + 300, 1000)))
+                index.add(ids, [f"Event {i}" for i in ids], self.embeddings[start:start + 300])
+            index.save()
+
+            reopened = NumpyIndex.load(folder)
+            self.assertEqual(len(reopened), 1000)
+            self.assertEqual(reopened.ids[999], "999")
+            np.testing.assert_array_equal(
+                reopened.search(self.queries, 5)[0], self.make_index().search(self.queries, 5)[0]
+            )
+
+            # The reopened index can still grow
+            reopened.add(["1000"], ["Event 1000"], self.embeddings[:1])
+            self.assertEqual(len(reopened), 1001)
+            self.assertTrue(os.path.exists(os.path.join(folder, "embeddings.f32")))
+
+
+class TestQuantization(unittest.TestCase):
+
+    def setUp(self):
+        # Embeddings around a few topics, like the events of a day
+        rng = np.random.default_rng(0)
+        topics = rng.standard_normal((20, 64))
+        self.embeddings = (topics[rng.integers(0, 20, 2000)] + 0.5 * rng.standard_normal((2000, 64))).astype(np.float32)
+        self.queries = (topics[:10] + 0.5 * rng.standard_normal((10, 64))).astype(np.float32)
+        self.ids = list(range(2000))
+        self.documents = [f"Event {i}" for i in self.ids]
+
+        exact = NumpyIndex()
+        exact.add(self.ids, self.documents, self.embeddings)
+        self.expected_positions, self.expected_scores = exact.search(self.queries, 10)
+
+    def make_index(self, quantization, folder=None, keep_float32=False):
+        index = NumpyIndex(folder, quantization=quantization, block_size=300, keep_float32=keep_float32)
+        index.add(self.ids, self.documents, self.embeddings)
+        return index
+
+    def test_recall(self):
+        index = self.make_index("int8")
+        positions, scores = index.search(self.queries, 10)
+
+        recall = np.mean([len(set(p) & set(e)) / 10 for p, e in zip(positions, self.expected_positions)])
+        self.assertGreaterEqual(recall, 0.9)
+        # The scores come from the dequantized embeddings
+        np.testing.assert_allclose(
+            scores, np.einsum("qd,qkd->qk", _unit(self.queries), index.embeddings[positions]), rtol=1e-5
+        )
+        np.testing.assert_allclose(index.embeddings, _unit(self.embeddings), atol=0.02)
+
+    def test_rerank_with_float32(self):
+        index = self.make_index("int8", keep_float32=True)
+        positions, scores = index.search(self.queries, 10)
+
+        recall = np.mean([len(set(p) & set(e)) / 10 for p, e in zip(positions, self.expected_positions)])
+        self.assertGreaterEqual(recall, 0.95)
+        # The scores come from the float32 embeddings
+        np.testing.assert_allclose(
+            scores, np.einsum("qd,qkd->qk", _unit(self.queries), _unit(self.embeddings)[positions]), rtol=1e-5
+        )
+
+    def test_smaller_scan(self):
+        self.assertEqual(NumpyIndex().nbytes, 0)
+        self.assertEqual(NumpyIndex().total_nbytes, 0)
+        self.assertEqual(self.make_index(None).total_nbytes, 2000 * 64 * 4)
+
+        index = self.make_index("int8")
+        self.assertEqual(index.nbytes, 2000 * 64 + 2000 * 4)
+        self.assertEqual(index.total_nbytes, index.nbytes)
+
+        # The float32 embeddings kept to re-rank are not scanned, but still stored
+        index = self.make_index("int8", keep_float32=True)
+        self.assertEqual(index.nbytes, 2000 * 64 + 2000 * 4)
+        self.assertEqual(index.total_nbytes, 2000 * 64 * 5 + 2000 * 4)
+
+    def test_mask(self):
+        mask = np.arange(2000) % 2 == 1
+        positions, scores = self.make_index("int8").search(self.queries, 10, mask=mask)
+        self.assertTrue(mask[positions].all())
+
+    def test_saved_and_loaded(self):
+        with tempfile.TemporaryDirectory() as folder:
+            index = self.make_index("int8", folder)
+            index.save()
+            self.assertListEqual(sorted(os.listdir(folder)), ["documents.json", "embeddings.i8", "scales.f32"])
+
+            reopened = NumpyIndex.load(folder)
+            self.assertEqual(reopened.quantization, "int8")
+            self.assertFalse(reopened.keep_float32)
+            np.testing.assert_array_equal(reopened.search(self.queries, 10)[0], index.search(self.queries, 10)[0])
+
+            # The reopened index can still grow
+            reopened.add(["2000"], ["Event 2000"], self.embeddings[:1])
+            self.assertEqual(reopened.search(self.queries[:1], 2001)[0].shape, (1, 2001))
+
+    def test_unknown_quantization(self):
+        for quantization in ["int4", "float16"]:
+            with self.assertRaises(ValueError):
+                NumpyIndex(quantization=quantization)
+
+
+def _unit(embeddings: np.ndarray) -> np.ndarray:
+    return embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+
+class TestRetrieveEventsByCountry(unittest.TestCase):
+
+    def setUp(self):
+        self.index = NumpyIndex(embedding_function=FakeEmbeddingFunction())
+        self.index.add(
+            ["1", "2", "3", "4"],
+            [
+                "Event 1 happened at France",
+                "Event 2 happened at Germany",
+                "Event 3 happened at France",
+                "Event 4 happened at France",
+            ],
+        )
+
+    def test_same_contract_as_vector_database(self):
+        documents, embeddings = retrieve_events_by_country(self.index, "Germany", 1)
+        self.assertIsInstance(embeddings, np.ndarray)
+        self.assertEqual(documents, ["Event 2 happened at Germany"])
+        self.assertEqual(embeddings.shape, (1, 32))
+
+        documents, embeddings = retrieve_events_by_country(self.index, "France", 5)
+        self.assertEqual(len(documents), 3)
+        self.assertEqual(embeddings.shape[0], 3)
+        self.assertTrue(all("France" in document for document in documents))
+
+    def test_quantized_index(self):
+        index = NumpyIndex(embedding_function=FakeEmbeddingFunction(), quantization="int8")
+        index.add(self.index.ids, self.index.documents)
+        documents, embeddings = retrieve_events_by_country(index, "Germany", 1)
+        self.assertEqual(documents, ["Event 2 happened at Germany"])
+        np.testing.assert_allclose(embeddings, self.index.embeddings[[1]], atol=0.02)
+
+    def test_no_events(self):
+        documents, embeddings = retrieve_events_by_country(self.index, "Spain", 5)
+        self.assertEqual(documents, [])
+        self.assertIsInstance(embeddings, np.ndarray)
+
+
+if __name__ == "__main__":
+    unittest.main()
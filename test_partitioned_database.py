@@ -0,0 +1,177 @@
+""" test_partitioned_database.py
+
+Copyright 2025, Cornell University
+
+Cornell University asserts copyright ownership of this template and all derivative
+works, including solutions to the projects assigned in this course. Students
+and other users of this template code are advised not to share it with others
+or to make it available on publicly viewable websites including online repositories
+such as Github.
+
+Sharing solutions with current or future students of ENMGT5400 is
+prohibited and subject to being investigated as a Code of Academic Integrity violation.
+
+-----do not edit anything above this line---
+"""
+
+import datetime
+import os
+import unittest
+
+import chromadb
+import numpy as np
+from chromadb.utils.embedding_functions import register_embedding_function
+
+from partitioned_database import (
+    create_partitioned_database,
+    drop_partitions,
+    list_partitions,
+    partition_name,
+    retrieve_events_by_country_in_range,
+)
+from test_vector_database import TEST_DATABASE_FOLDER, FakeEmbeddingFunction
+
+# Wednesday 12 to Tuesday 18 February 2025
+DATES = [20250212, 20250212, 20250213, 20250214, 20250217, 20250218]
+DOCUMENTS = [
+    "Event 1 happened at France",
+    "Event 2 happened at Germany",
+    "Event 3 happened at France",
+    "Event 4 happened at France",
+    "Event 5 happened at France",
+    "Event 6 happened at Germany",
+]
+
+
+@register_embedding_function
+class PersistedFakeEmbeddingFunction(FakeEmbeddingFunction):
+    """A FakeEmbeddingFunction that Chroma saves with the collection and rebuilds when it is opened."""
+
+    @staticmethod
+    def name() -> str:
+        return "fake_persisted"
+
+    def get_config(self) -> dict:
+        return {"size": self.size}
+
+    @staticmethod
+    def build_from_config(config: dict) -> "PersistedFakeEmbeddingFunction":
+        return PersistedFakeEmbeddingFunction(config["size"])
+
+
+class TestPartitionName(unittest.TestCase):
+
+    def test_day(self):
+        self.assertEqual(partition_name(20250212), "gdelt_20250212")
+        self.assertEqual(partition_name("20250212", prefix="events"), "events_20250212")
+        self.assertEqual(partition_name(datetime.date(2025, 2, 12)), "gdelt_20250212")
+
+    def test_week_starts_on_monday(self):
+        self.assertEqual(partition_name(20250212, period="week"), "gdelt_w20250210")
+        self.assertEqual(partition_name(20250216, period="week"), "gdelt_w20250210")
+        self.assertEqual(partition_name(20250217, period="week"), "gdelt_w20250217")
+
+    def test_unknown_period(self):
+        with self.assertRaises(ValueError):
+            partition_name(20250212, period="month")
+
+
+class TestPartitionedDatabase(unittest.TestCase):
+
+    def setUp(self):
+        os.makedirs(TEST_DATABASE_FOLDER, exist_ok=True)
+        self.client = chromadb.PersistentClient(
+            path=TEST_DATABASE_FOLDER,
+            settings=chromadb.config.Settings(allow_reset=True),
+        )
+        self.embedding_function = FakeEmbeddingFunction()
+        self.metadatas = [{"SQLDATE": date} for date in DATES]
+
+    def tearDown(self):
+        self.client.reset()
+
+    def create(self, period="day"):
+        return create_partitioned_database(
+            self.client, list(range(1, 7)), DOCUMENTS, DATES, metadatas=self.metadatas,
+            period=period, embedding_function=self.embedding_function,
+        )
+
+    def retrieve(self, country, n_results, start_date=None, end_date=None):
+        return retrieve_events_by_country_in_range(
+            self.client, country, n_results, start_date, end_date, embedding_function=self.embedding_function
+        )
+
+    def test_one_partition_per_day(self):
+        collections = self.create()
+        self.assertEqual(
+            list(collections),
+            ["gdelt_20250212", "gdelt_20250213", "gdelt_20250214", "gdelt_20250217", "gdelt_20250218"],
+        )
+        self.assertEqual(collections["gdelt_20250212"].count(), 2)
+        self.assertEqual(list_partitions(self.client)["gdelt_20250213"], (datetime.date(2025, 2, 13),) * 2)
+
+    def test_one_partition_per_week(self):
+        collections = self.create(period="week")
+        self.assertEqual({name: c.count() for name, c in collections.items()},
+                         {"gdelt_w20250210": 4, "gdelt_w20250217": 2})
+        self.assertEqual(
+            list_partitions(self.client)["gdelt_w20250210"], (datetime.date(2025, 2, 10), datetime.date(2025, 2, 16))
+        )
+
+    def test_other_collections_are_not_partitions(self):
+        self.client.create_collection("gdelt")
+        self.client.create_collection("gdelt_2025")
+        self.create()
+        self.assertEqual(len(list_partitions(self.client)), 5)
+
+    def test_merged_top_k(self):
+        self.create()
+        documents, embeddings = self.retrieve("France", 10)
+        self.assertEqual(sorted(documents), sorted(DOCUMENTS[i] for i in (0, 2, 3, 4)))
+        self.assertEqual(embeddings.shape, (4, self.embedding_function.size))
+
+        documents, embeddings = self.retrieve("France", 2)
+        self.assertEqual(len(documents), 2)
+        self.assertEqual(embeddings.shape[0], 2)
+
+    def test_only_partitions_in_range(self):
+        self.create()
+        documents, _ = self.retrieve("France", 10, start_date=20250213, end_date=20250214)
+        self.assertEqual(sorted(documents), [DOCUMENTS[2], DOCUMENTS[3]])
+
+        documents, embeddings = self.retrieve("France", 10, start_date=20250301)
+        self.assertEqual(documents, [])
+        self.assertIsInstance(embeddings, np.ndarray)
+
+    def test_partition_embedding_function(self):
+        # Without an embedding function, each partition embeds the query with its own one
+        self.embedding_function = PersistedFakeEmbeddingFunction(size=16)
+        self.create()
+        documents, embeddings = retrieve_events_by_country_in_range(
+            self.client, "France", 10, start_date=20250213, end_date=20250214
+        )
+        self.assertEqual(sorted(documents), [DOCUMENTS[2], DOCUMENTS[3]])
+        self.assertEqual(embeddings.shape, (2, 16))
+
+    def test_week_partitions_filtered_by_date(self):
+        self.create(period="week")
+        documents, _ = self.retrieve("France", 10, start_date=20250213, end_date=20250217)
+        self.assertEqual(sorted(documents), [DOCUMENTS[2], DOCUMENTS[3], DOCUMENTS[4]])
+
+    def test_drop_partitions(self):
+        self.create()
+        dropped = drop_partitions(self.client, before=20250214)
+        self.assertEqual(dropped, ["gdelt_20250212", "gdelt_20250213"])
+        self.assertEqual(list(list_partitions(self.client)), ["gdelt_20250214", "gdelt_20250217", "gdelt_20250218"])
+
+        documents, _ = self.retrieve("France", 10)
+        self.assertEqual(sorted(documents), [DOCUMENTS[3], DOCUMENTS[4]])
+
+    def test_drop_keeps_weeks_with_recent_days(self):
+        self.create(period="week")
+        self.assertEqual(drop_partitions(self.client, before=20250216), [])
+        self.assertEqual(drop_partitions(self.client, before=20250217), ["gdelt_w20250210"])
+
+
+if __name__ == "__main__":
+    unittest.main()
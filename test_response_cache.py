@@ -0,0 +1,85 @@
+""" test_response_cache.py
+
+Copyright 2025, Cornell University
+
+Cornell University asserts copyright ownership of this template and all derivative
+works, including solutions to the projects assigned in this course. Students
+and other users of this template code are advised not to share it with others
+or to make it available on publicly viewable websites including online repositories
+such as Github.
+
+Sharing solutions with current or future students of ENMGT5400 is
+prohibited and subject to being investigated as a Code of Academic Integrity violation.
+
+-----do not edit anything above this line---
+"""
+
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from response_cache import ResponseCache
+
+
+class TestResponseCache(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, "cache", "responses.sqlite")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_key(self):
+        key = ResponseCache.key("llama3.2", "Hello", {"temperature": 0})
+        self.assertEqual(key, ResponseCache.key("llama3.2", "Hello", {"temperature": 0}))
+        self.assertNotEqual(key, ResponseCache.key("llama3.1", "Hello", {"temperature": 0}))
+        self.assertNotEqual(key, ResponseCache.key("llama3.2", "Hello!", {"temperature": 0}))
+        self.assertNotEqual(key, ResponseCache.key("llama3.2", "Hello", {"temperature": 0, "seed": 1}))
+
+    def test_only_deterministic_requests_are_cacheable(self):
+        self.assertTrue(ResponseCache.cacheable({"temperature": 0}))
+        self.assertFalse(ResponseCache.cacheable({"temperature": 0.7}))
+        self.assertFalse(ResponseCache.cacheable(None))
+
+    def test_persisted_across_instances(self):
+        cache = ResponseCache(self.path)
+        self.assertIsNone(cache.get("a"))
+        cache.set("a", "Response A")
+        self.assertEqual(cache.get("a"), "Response A")
+        self.assertEqual(cache.stats(), {"hits": 1, "misses": 1, "hit_rate": 0.5, "size": 1})
+        cache.close()
+
+        reopened = ResponseCache(self.path)
+        self.assertEqual(reopened.get("a"), "Response A")
+        reopened.clear()
+        self.assertEqual(len(reopened), 0)
+        reopened.close()
+
+    def test_expired_entries_are_dropped(self):
+        cache = ResponseCache(ttl=60)
+        with patch("response_cache.time.time", return_value=1000.0):
+            cache.set("a", "Response A")
+        with patch("response_cache.time.time", return_value=1059.0):
+            self.assertEqual(cache.get("a"), "Response A")
+        with patch("response_cache.time.time", return_value=1061.0):
+            self.assertIsNone(cache.get("a"))
+        self.assertEqual(len(cache), 0)
+
+    def test_least_recently_used_is_evicted(self):
+        cache = ResponseCache(max_entries=2)
+        with patch("response_cache.time.time", side_effect=[1.0, 2.0, 3.0, 4.0]):
+            cache.set("a", "Response A")
+            cache.set("b", "Response B")
+            cache.get("a")
+            cache.set("c", "Response C")  # Evicts b
+
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), "Response A")
+        self.assertEqual(cache.get("c"), "Response C")
+
+
+if __name__ == "__main__":
+    unittest.main()
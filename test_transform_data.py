@@ -14,10 +14,79 @@ prohibited and subject to being investigated as a Code of Academic Integrity vio
 -----do not edit anything above this line---
 """
 
+import io
 import os
+import shutil
+import tempfile
 import unittest
+import zipfile
+from unittest.mock import patch
 
-from transform_data import parse_url, read_gdelt
+import pandas as pd
+
+from helpers import GDELTFIELDNAMES
+from transform_data import (
+    TitleCache,
+    compact_gdelt,
+    iter_gdelt,
+    iter_gdelt_source,
+    memory_report,
+    parse_url,
+    parse_urls,
+    read_gdelt,
+    read_gdelt_files,
+    read_gdelt_source,
+)
+
+
+def make_gdelt_row(
+    event_id, event_code, quad_class, goldstein, location, url, sqldate="20250212", country_code=""
+):
+    """Return one tab-separated line of a GDELT export with the columns we read filled in."""
+    fields = [""] * len(GDELTFIELDNAMES)
+    values = {
+        "GLOBALEVENTID": str(event_id),
+        "SQLDATE": sqldate,
+        "EventCode": str(event_code),
+        "QuadClass": str(quad_class),
+        "GoldsteinScale": str(goldstein),
+        "ActionGeo_FullName": location,
+        "ActionGeo_CountryCode": country_code,
+        "SOURCEURL": url,
+    }
+    for column, value in values.items():
+        fields[GDELTFIELDNAMES.index(column)] = value
+    return "\t".join(fields)
+
+
+SAMPLE_ROWS = [
+    make_gdelt_row(1226184501, 20, 1, 3.4, "Paris, Ile-de-France, France",
+                   "https://www.yahoo.com/news/russian-military-convoy-blocked-entering.html"),
+    make_gdelt_row(1226184502, 172, 4, -5.0, "Washington, District of Columbia, United States",
+                   "https://www.jdsupra.com/legalnews/divided-ninth-circuit-panel-upholds-5555677/"),
+    # Same SOURCEURL as the first row, with a smaller GLOBALEVENTID
+    make_gdelt_row(1226184500, 43, 1, 2.8, "Berlin, Berlin, Germany",
+                   "https://www.yahoo.com/news/russian-military-convoy-blocked-entering.html", country_code="GM"),
+    # Missing location
+    make_gdelt_row(1226184503, 190, 4, -10.0, "",
+                   "https://www.defenseone.com/threats/2025/02/the-d-brief-february-12-2025/402951/"),
+    # No title in the URL
+    make_gdelt_row(1226184504, 36, 2, 4.0, "Kyiv, Kyyiv, Misto, Ukraine", "https://www.example.com/"),
+    make_gdelt_row(1226184505, 51, 1, 3.4, "London, London, City of, United Kingdom",
+                   "https://www.express.co.uk/showbiz/tv-radio/2013452/call-the-midwife-georgie-glen-miss-higgins",
+                   country_code="UK"),
+]
+
+SAMPLE_EVENT_IDS = ["1226184500", "1226184502", "1226184505"]
+
+
+def write_sample_export(data_folder, filename="20250212.export.CSV", rows=SAMPLE_ROWS):
+    """Write a small GDELT export, and a zipped copy of it, to data_folder."""
+    content = "\n".join(rows) + "\n"
+    with open(os.path.join(data_folder, filename), "w") as f:
+        f.write(content)
+    with zipfile.ZipFile(os.path.join(data_folder, f"{filename}.zip"), "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr(filename, content)
 
 
 class TestParseURL(unittest.TestCase):
@@ -59,6 +128,9 @@ class TestParseURL(unittest.TestCase):
             actual_title = parse_url(url)
             self.assertEqual(actual_title, expected_title, f"Failed for URL: {url}")
 
+        urls, expected_titles = zip(*test_cases)
+        self.assertListEqual(parse_urls(pd.Series(urls)).tolist(), list(expected_titles))
+
     def test_return_none(self):
         test_cases = [
             "https://www.yahoo.com/news/russian-military-convoy-blocked-entering-12345678.html",
@@ -70,6 +142,8 @@ class TestParseURL(unittest.TestCase):
             actual_title = parse_url(url)
             self.assertIsNone(actual_title, f"Failed for URL: {url}")
 
+        self.assertListEqual(parse_urls(pd.Series(test_cases)).tolist(), [None] * len(test_cases))
+
     def test_gdelt_urls(self):
         test_cases = [
             (
@@ -101,6 +175,260 @@ class TestParseURL(unittest.TestCase):
             actual_title = parse_url(url)
             self.assertEqual(actual_title, expected_title, f"Failed for URL: {url}")
 
+        urls, expected_titles = zip(*test_cases)
+        self.assertListEqual(parse_urls(pd.Series(urls)).tolist(), list(expected_titles))
+
+    def test_parse_urls_edge_cases(self):
+        urls = pd.Series(
+            [
+                None,
+                float("nan"),
+                "ftp://www.example.com/not-a-web-page-title",
+                "https://www.example.com/news/caf\u00e9-society-in-paris-\u00b2\u00b3\u00b9\u00b2\u00b3\u00b9\u00b2\u00b3/",
+                "https://www.example.com/a-b-c-d/.-.-.-./",
+                "https://www.example.com/a-b-c-d/123456-1234567-12345678-x/",
+                "https://www.example.com/story-about-the-news.cms/page-two.html.cms",
+                "https://www.yahoo.com/news/russian-military-convoy-blocked-entering.html",
+                "https://www.yahoo.com/news/russian-military-convoy-blocked-entering.html",
+            ],
+            index=[10, 20, 30, 40, 50, 60, 70, 80, 90],
+        )
+        titles = parse_urls(urls)
+        self.assertListEqual(titles.index.tolist(), urls.index.tolist())
+        self.assertListEqual(titles.tolist(), [parse_url(url) for url in urls])
+
+
+class TestParquetCache(unittest.TestCase):
+
+    def setUp(self):
+        self.data_folder = tempfile.mkdtemp()
+        self.cache_folder = os.path.join(self.data_folder, "cache")
+        write_sample_export(self.data_folder)
+        self.df = read_gdelt(self.data_folder, "20250212.export.CSV")
+
+    def tearDown(self):
+        shutil.rmtree(self.data_folder)
+
+    def test_cached_frame_is_reused(self):
+        df = read_gdelt(self.data_folder, "20250212.export.CSV", cache_folder=self.cache_folder)
+        pd.testing.assert_frame_equal(df, self.df)
+        self.assertEqual(len(os.listdir(self.cache_folder)), 1)
+
+        with patch("transform_data.read_gdelt_source", side_effect=AssertionError("file parsed again")):
+            cached_df = read_gdelt(self.data_folder, "20250212.export.CSV", cache_folder=self.cache_folder)
+        pd.testing.assert_frame_equal(cached_df, self.df)
+
+    def test_compact_storage(self):
+        read_gdelt(self.data_folder, "20250212.export.CSV", cache_folder=self.cache_folder)
+        cache_path = os.path.join(self.cache_folder, os.listdir(self.cache_folder)[0])
+        stored = pd.read_parquet(cache_path)
+
+        self.assertEqual(stored["EventCode"].dtype, "int32")
+        self.assertEqual(stored["QuadClass"].dtype, "int8")
+        self.assertIsInstance(stored["ActionGeo_FullName"].dtype, pd.CategoricalDtype)
+
+    def test_changed_file_is_parsed_again(self):
+        read_gdelt(self.data_folder, "20250212.export.CSV", cache_folder=self.cache_folder)
+        write_sample_export(self.data_folder, rows=SAMPLE_ROWS[:2])
+
+        df = read_gdelt(self.data_folder, "20250212.export.CSV", cache_folder=self.cache_folder)
+        self.assertListEqual(df.index.tolist(), ["1226184501", "1226184502"])
+        self.assertEqual(len(os.listdir(self.cache_folder)), 2)
+
+    def test_country_code_cached(self):
+        df = read_gdelt(self.data_folder, "20250212.export.CSV", country_code=True)
+        for _ in range(2):
+            pd.testing.assert_frame_equal(
+                read_gdelt(self.data_folder, "20250212.export.CSV", cache_folder=self.cache_folder, country_code=True),
+                df,
+            )
+            pd.testing.assert_frame_equal(
+                read_gdelt(self.data_folder, "20250212.export.CSV", cache_folder=self.cache_folder), self.df
+            )
+        self.assertEqual(len(os.listdir(self.cache_folder)), 1)
+
+
+class TestCompactGDELT(unittest.TestCase):
+
+    def setUp(self):
+        self.data_folder = tempfile.mkdtemp()
+        write_sample_export(self.data_folder)
+        self.df = read_gdelt(self.data_folder, "20250212.export.CSV")
+
+    def tearDown(self):
+        shutil.rmtree(self.data_folder)
+
+    def check_compact(self, df):
+        self.assertEqual(df.index.dtype, "int64")
+        self.assertEqual(df["EventCode"].dtype, "int32")
+        self.assertEqual(df["QuadClass"].dtype, "int8")
+        self.assertIsInstance(df["SQLDATE"].dtype, pd.CategoricalDtype)
+        self.assertIsInstance(df["ActionGeo_FullName"].dtype, pd.CategoricalDtype)
+        self.assertListEqual(df.index.tolist(), [int(event_id) for event_id in SAMPLE_EVENT_IDS])
+        self.assertListEqual(df["Text"].tolist(), self.df["Text"].tolist())
+        self.assertListEqual(df["EventCode"].tolist(), self.df["EventCode"].tolist())
+
+    def test_compact(self):
+        self.check_compact(compact_gdelt(self.df))
+        self.check_compact(read_gdelt(self.data_folder, "20250212.export.CSV", compact=True))
+
+    def test_compact_cached(self):
+        cache_folder = os.path.join(self.data_folder, "cache")
+        for _ in range(2):
+            self.check_compact(
+                read_gdelt(self.data_folder, "20250212.export.CSV", cache_folder=cache_folder, compact=True)
+            )
+
+    def test_memory_report(self):
+        report = memory_report(self.df)
+        self.assertEqual(report["bytes_before"], self.df.memory_usage(deep=True).sum())
+        self.assertGreater(report["bytes_saved"], 0)
+        self.assertEqual(report["bytes_saved"], report["bytes_before"] - report["bytes_after"])
+
+
+class TestReadGDELTFiles(unittest.TestCase):
+
+    def setUp(self):
+        self.data_folder = tempfile.mkdtemp()
+        # The second day repeats a SOURCEURL of the first day with a larger GLOBALEVENTID,
+        # and the first day repeats one of the second day with a larger GLOBALEVENTID
+        self.rows1 = SAMPLE_ROWS + [
+            make_gdelt_row(1226185430, 40, 1, 1.9, "Ottawa, Ontario, Canada",
+                           "https://www.example.com/news/canada-and-mexico-sign-trade-deal/"),
+        ]
+        self.rows2 = [
+            make_gdelt_row(1226185426, 40, 1, 1.9, "Mexico City, Distrito Federal, Mexico",
+                           "https://www.example.com/news/canada-and-mexico-sign-trade-deal/", "20250213"),
+            make_gdelt_row(1226185427, 841, 3, -2.0, "Tokyo, Tokyo, Japan",
+                           "https://www.yahoo.com/news/russian-military-convoy-blocked-entering.html", "20250213"),
+            make_gdelt_row(1226185428, 20, 1, 3.4, "Tokyo, Tokyo, Japan",
+                           "https://www.example.com/news/japan-central-bank-holds-rates/", "20250213"),
+        ]
+        write_sample_export(self.data_folder, "20250212.export.CSV", self.rows1)
+        write_sample_export(self.data_folder, "20250213.export.CSV", self.rows2)
+        write_sample_export(self.data_folder, "both.export.CSV", self.rows1 + self.rows2)
+
+    def tearDown(self):
+        shutil.rmtree(self.data_folder)
+
+    def test_merge_files(self):
+        df = read_gdelt_files(
+            self.data_folder, ["20250212.export.CSV", "20250213.export.CSV.zip"], max_workers=2
+        )
+        pd.testing.assert_frame_equal(df, read_gdelt(self.data_folder, "both.export.CSV"))
+        self.assertListEqual(
+            df.index.tolist(), SAMPLE_EVENT_IDS + ["1226185426", "1226185428"]
+        )
+
+    def test_merge_compact_files(self):
+        df = read_gdelt_files(
+            self.data_folder, ["20250212.export.CSV", "20250213.export.CSV"], max_workers=2, compact=True
+        )
+        pd.testing.assert_frame_equal(df, compact_gdelt(read_gdelt(self.data_folder, "both.export.CSV")))
+
+    def test_no_files(self):
+        expected = read_gdelt(self.data_folder, "both.export.CSV")
+        for compact in [False, True]:
+            df = read_gdelt_files(self.data_folder, [], compact=compact)
+            self.assertTrue(df.empty)
+            expected_dtypes = compact_gdelt(expected).dtypes if compact else expected.dtypes
+            self.assertListEqual(df.columns.tolist(), expected.columns.tolist())
+            self.assertListEqual(df.index.names, expected.index.names)
+            # The categories of compact columns are those of the rows
+            self.assertListEqual(df.dtypes.astype(str).tolist(), expected_dtypes.astype(str).tolist())
+            self.assertEqual(df.index.dtype, (compact_gdelt(expected) if compact else expected).index.dtype)
+
+    def test_shared_title_cache(self):
+        path = os.path.join(self.data_folder, "titles.sqlite")
+        filenames = ["20250212.export.CSV", "20250213.export.CSV"]
+        df = read_gdelt_files(self.data_folder, filenames, max_workers=2, title_cache_path=path)
+        cached_df = read_gdelt_files(self.data_folder, filenames, max_workers=2, title_cache_path=path)
+
+        pd.testing.assert_frame_equal(cached_df, df)
+        cache = TitleCache(path=path)
+        self.assertEqual(len(cache.lookup(df["SOURCEURL"].tolist())), len(df))
+        cache.close()
+
+
+class TestIterGDELT(unittest.TestCase):
+
+    def setUp(self):
+        self.data_folder = tempfile.mkdtemp()
+        # GDELT exports are ordered by GLOBALEVENTID
+        write_sample_export(self.data_folder, rows=sorted(SAMPLE_ROWS))
+        self.df = read_gdelt(self.data_folder, "20250212.export.CSV")
+
+    def tearDown(self):
+        shutil.rmtree(self.data_folder)
+
+    def test_chunks_match_read_gdelt(self):
+        for chunksize in [1, 2, 4, 100]:
+            chunks = list(iter_gdelt(self.data_folder, "20250212.export.CSV", chunksize=chunksize))
+            self.assertTrue(all(len(chunk) <= chunksize for chunk in chunks))
+            pd.testing.assert_frame_equal(pd.concat(chunks), self.df)
+
+    def test_zipped_buffer(self):
+        with open(os.path.join(self.data_folder, "20250212.export.CSV.zip"), "rb") as f:
+            chunks = list(iter_gdelt_source(f.read(), chunksize=2))
+        pd.testing.assert_frame_equal(pd.concat(chunks), self.df)
+
+
+class TestTitleCache(unittest.TestCase):
+
+    def setUp(self):
+        self.urls = pd.Series(
+            [
+                "https://www.yahoo.com/news/russian-military-convoy-blocked-entering.html",
+                "https://www.jdsupra.com/legalnews/divided-ninth-circuit-panel-upholds-5555677/",
+                "https://www.example.com/",
+                "https://www.yahoo.com/news/russian-military-convoy-blocked-entering.html",
+            ]
+        )
+        self.expected_titles = [parse_url(url) for url in self.urls]
+        self.cache_folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_folder)
+
+    def test_hits_and_misses(self):
+        cache = TitleCache()
+        self.assertListEqual(parse_urls(self.urls, cache=cache).tolist(), self.expected_titles)
+        self.assertDictEqual(cache.stats(), {"hits": 0, "misses": 3, "hit_rate": 0.0, "size": 3})
+
+        self.assertListEqual(parse_urls(self.urls, cache=cache).tolist(), self.expected_titles)
+        self.assertDictEqual(cache.stats(), {"hits": 3, "misses": 3, "hit_rate": 0.5, "size": 3})
+
+    def test_least_recently_used_titles_are_evicted(self):
+        cache = TitleCache(maxsize=2)
+        parse_urls(self.urls, cache=cache)
+        self.assertEqual(len(cache), 2)
+
+        cached = cache.lookup(self.urls.tolist()[:3])
+        self.assertNotIn(self.urls[0], cached)
+        self.assertDictEqual(
+            cached, {self.urls[1]: self.expected_titles[1], self.urls[2]: None}
+        )
+
+    def test_persistent_cache(self):
+        path = os.path.join(self.cache_folder, "titles.sqlite")
+        cache = TitleCache(path=path)
+        parse_urls(self.urls, cache=cache)
+        cache.close()
+
+        cache = TitleCache(maxsize=1, path=path)
+        self.assertListEqual(parse_urls(self.urls, cache=cache).tolist(), self.expected_titles)
+        self.assertEqual(cache.stats()["hits"], 3)
+        cache.close()
+
+    def test_read_gdelt_with_cache(self):
+        write_sample_export(self.cache_folder)
+        cache = TitleCache()
+        df1 = read_gdelt(self.cache_folder, "20250212.export.CSV", title_cache=cache)
+        df2 = read_gdelt(self.cache_folder, "20250212.export.CSV.zip", title_cache=cache)
+
+        pd.testing.assert_frame_equal(df1, df2)
+        self.assertEqual(cache.stats()["hit_rate"], 0.5)
+
 
 class TestReadGDELT(unittest.TestCase):
 
@@ -168,5 +496,50 @@ class TestReadGDELT(unittest.TestCase):
         self.assertEqual(self.df2.loc[event_id2]["EventCode"], expected_event_code2)
 
 
+class TestReadGDELTSources(unittest.TestCase):
+
+    def setUp(self):
+        self.data_folder = tempfile.mkdtemp()
+        write_sample_export(self.data_folder)
+        self.df = read_gdelt(self.data_folder, "20250212.export.CSV")
+
+    def tearDown(self):
+        shutil.rmtree(self.data_folder)
+
+    def test_sample_export(self):
+        self.assertListEqual(self.df.index.tolist(), SAMPLE_EVENT_IDS)
+        self.assertEqual(self.df.loc["1226184500"]["Text"], "russian military convoy blocked entering")
+        self.assertEqual(self.df.loc["1226184502"]["EventCode"], 172)
+
+    def test_read_zip(self):
+        df_zip = read_gdelt(self.data_folder, "20250212.export.CSV.zip")
+        pd.testing.assert_frame_equal(df_zip, self.df)
+
+    def test_read_buffers(self):
+        with open(os.path.join(self.data_folder, "20250212.export.CSV.zip"), "rb") as f:
+            content = f.read()
+        pd.testing.assert_frame_equal(read_gdelt_source(content), self.df)
+        pd.testing.assert_frame_equal(read_gdelt_source(io.BytesIO(content)), self.df)
+
+        with open(os.path.join(self.data_folder, "20250212.export.CSV"), "rb") as f:
+            pd.testing.assert_frame_equal(read_gdelt_source(f), self.df)
+
+    def test_country_code(self):
+        df = read_gdelt(self.data_folder, "20250212.export.CSV", country_code=True)
+        self.assertListEqual(
+            df.columns.tolist(),
+            ["SQLDATE", "EventCode", "QuadClass", "GoldsteinScale", "ActionGeo_FullName",
+             "ActionGeo_CountryCode", "SOURCEURL", "Text"],
+        )
+        # Rows without a country code are kept
+        self.assertListEqual(df["ActionGeo_CountryCode"].tolist(), ["GM", "", "UK"])
+        pd.testing.assert_frame_equal(df.drop(columns="ActionGeo_CountryCode"), self.df)
+
+        compact_df = compact_gdelt(df)
+        self.assertIsInstance(compact_df["ActionGeo_CountryCode"].dtype, pd.CategoricalDtype)
+        self.assertListEqual(read_gdelt_files(self.data_folder, [], country_code=True).columns.tolist(),
+                             df.columns.tolist())
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -14,17 +14,56 @@ prohibited and subject to being investigated as a Code of Academic Integrity vio
 -----do not edit anything above this line---
 """
 
+import threading
 import unittest
+import zlib
+from unittest.mock import patch
 import chromadb
 import numpy as np
 import os
+import pandas as pd
 
-from vector_database import create_database, retrieve_events_by_country
+from vector_database import (
+    add_documents,
+    build_metadatas,
+    clear_collection_cache,
+    content_hash,
+    create_database,
+    event_filter,
+    get_collection,
+    retrieve_events_by_country,
+    retrieve_events_by_countries,
+    sync_documents,
+)
 
 # Define a temporary directory for testing
 TEST_DATABASE_FOLDER = os.path.join(
     os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "test_db_delete_me"
 )
+# get_collection opens its own client, which Chroma requires to have the same settings
+TEST_CACHE_DATABASE_FOLDER = TEST_DATABASE_FOLDER + "_cache"
+
+
+class FakeEmbeddingFunction(chromadb.EmbeddingFunction):
+    """Deterministic bag-of-words embeddings, so tests run without downloading a model."""
+
+    def __init__(self, size: int = 32):
+        self.size = size
+        self.calls = []
+
+    @staticmethod
+    def name() -> str:
+        return "fake"
+
+    def __call__(self, input: list[str]) -> list[np.ndarray]:
+        self.calls.append(list(input))
+        embeddings = []
+        for text in input:
+            embedding = np.zeros(self.size, dtype=np.float32)
+            for word in text.lower().split():
+                embedding[zlib.crc32(word.encode()) % self.size] += 1.0
+            embeddings.append(embedding / max(np.linalg.norm(embedding), 1.0))
+        return embeddings
 
 
 class TestVectorDatabase(unittest.TestCase):
@@ -92,5 +131,343 @@ class TestVectorDatabase(unittest.TestCase):
         self.assertEqual(retrieved_embeddings.shape[0], 3)
 
 
+class TestAddDocuments(unittest.TestCase):
+
+    def setUp(self):
+        os.makedirs(TEST_DATABASE_FOLDER, exist_ok=True)
+        self.client = chromadb.PersistentClient(
+            path=TEST_DATABASE_FOLDER,
+            settings=chromadb.config.Settings(allow_reset=True),
+        )
+        self.embedding_function = FakeEmbeddingFunction()
+        self.doc_ids = list(range(1, 8))
+        self.documents = [f"Event {i} happened at France" for i in self.doc_ids]
+
+    def tearDown(self):
+        self.client.reset()
+
+    def test_create_database_in_batches(self):
+        collection = create_database(
+            self.client, "test_batches", self.doc_ids, self.documents,
+            embedding_function=self.embedding_function, batch_size=3,
+        )
+        self.assertEqual(collection.count(), 7)
+        # Each batch is embedded once, in order
+        self.assertEqual([len(batch) for batch in self.embedding_function.calls], [3, 3, 1])
+        self.assertEqual(sum(self.embedding_function.calls, []), self.documents)
+
+        stored = collection.get(ids=["5"], include=["documents", "embeddings"])
+        self.assertEqual(stored["documents"], ["Event 5 happened at France"])
+        np.testing.assert_allclose(
+            stored["embeddings"][0], self.embedding_function(["Event 5 happened at France"])[0]
+        )
+
+    def test_invalid_batch_size(self):
+        for batch_size in [0, -3]:
+            with self.assertRaises(ValueError):
+                create_database(
+                    self.client, "test_batches", self.doc_ids, self.documents,
+                    embedding_function=self.embedding_function, batch_size=batch_size,
+                )
+            collection = self.client.get_or_create_collection(
+                "test_invalid", embedding_function=self.embedding_function
+            )
+            with self.assertRaises(ValueError):
+                add_documents(collection, self.doc_ids, self.documents, self.embedding_function, batch_size=batch_size)
+        self.assertEqual(self.embedding_function.calls, [])
+
+    def test_add_documents_stats(self):
+        collection = self.client.create_collection("test_stats", embedding_function=self.embedding_function)
+        stats = add_documents(collection, self.doc_ids, self.documents, self.embedding_function, batch_size=2)
+
+        self.assertEqual(stats["documents"], 7)
+        self.assertEqual(stats["batches"], 4)
+        self.assertGreater(stats["docs_per_sec"], 0)
+        self.assertEqual(collection.count(), 7)
+
+    def test_batch_size_capped(self):
+        collection = self.client.create_collection("test_cap", embedding_function=self.embedding_function)
+        stats = add_documents(
+            collection, self.doc_ids, self.documents, self.embedding_function, batch_size=100, max_batch_size=4
+        )
+        self.assertEqual(stats["batches"], 2)
+        self.assertEqual(collection.count(), 7)
+
+    def test_no_documents(self):
+        collection = self.client.create_collection("test_empty", embedding_function=self.embedding_function)
+        stats = add_documents(collection, [], [], self.embedding_function)
+        self.assertEqual(stats["batches"], 0)
+        self.assertEqual(collection.count(), 0)
+
+
+class TestSyncDocuments(unittest.TestCase):
+
+    def setUp(self):
+        os.makedirs(TEST_DATABASE_FOLDER, exist_ok=True)
+        self.client = chromadb.PersistentClient(
+            path=TEST_DATABASE_FOLDER,
+            settings=chromadb.config.Settings(allow_reset=True),
+        )
+        self.embedding_function = FakeEmbeddingFunction()
+        self.collection = self.client.create_collection("test_sync", embedding_function=self.embedding_function)
+
+    def tearDown(self):
+        self.client.reset()
+
+    def sync(self, doc_ids, documents):
+        return sync_documents(self.collection, doc_ids, documents, self.embedding_function)
+
+    def test_first_sync_adds_everything(self):
+        stats = self.sync([1, 2, 3], ["Event 1", "Event 2", "Event 3"])
+        self.assertEqual((stats["new"], stats["changed"], stats["unchanged"]), (3, 0, 0))
+        self.assertEqual(self.collection.count(), 3)
+
+        metadata = self.collection.get(ids=["2"], include=["metadatas"])["metadatas"][0]
+        self.assertEqual(metadata["content_hash"], content_hash("Event 2"))
+
+    def test_resync_is_idempotent(self):
+        self.sync([1, 2, 3], ["Event 1", "Event 2", "Event 3"])
+        self.embedding_function.calls.clear()
+
+        stats = self.sync([1, 2, 3], ["Event 1", "Event 2", "Event 3"])
+        self.assertEqual((stats["new"], stats["changed"], stats["unchanged"]), (0, 0, 3))
+        self.assertEqual(self.embedding_function.calls, [])
+        self.assertEqual(self.collection.count(), 3)
+
+    def test_only_new_and_changed_documents_are_embedded(self):
+        self.sync([1, 2, 3], ["Event 1", "Event 2", "Event 3"])
+        self.embedding_function.calls.clear()
+
+        stats = self.sync([2, 3, 4], ["Event 2", "Event 3 updated", "Event 4"])
+        self.assertEqual((stats["new"], stats["changed"], stats["unchanged"]), (1, 1, 1))
+        self.assertEqual(sorted(sum(self.embedding_function.calls, [])), ["Event 3 updated", "Event 4"])
+        self.assertEqual(self.collection.count(), 4)
+        self.assertEqual(self.collection.get(ids=["3"])["documents"], ["Event 3 updated"])
+
+    def test_create_database_twice(self):
+        doc_ids = [1, 2, 3]
+        documents = ["Event 1", "Event 2", "Event 3"]
+        create_database(self.client, "test_twice", doc_ids, documents, embedding_function=self.embedding_function)
+        self.embedding_function.calls.clear()
+
+        collection = create_database(
+            self.client, "test_twice", doc_ids, documents, embedding_function=self.embedding_function
+        )
+        self.assertEqual(collection.count(), 3)
+        self.assertEqual(self.embedding_function.calls, [])
+
+
+class TestMetadataFilters(unittest.TestCase):
+
+    def setUp(self):
+        os.makedirs(TEST_DATABASE_FOLDER, exist_ok=True)
+        self.client = chromadb.PersistentClient(
+            path=TEST_DATABASE_FOLDER,
+            settings=chromadb.config.Settings(allow_reset=True),
+        )
+        self.embedding_function = FakeEmbeddingFunction()
+        self.df = pd.DataFrame(
+            {
+                "SQLDATE": ["20250212", "20250212", "20250213", "20250213", "20250213"],
+                "EventCode": [43, 172, 20, 190, 43],
+                "QuadClass": [1, 4, 1, 4, 1],
+                "GoldsteinScale": [2.8, -5.0, 3.4, -10.0, 2.8],
+                "ActionGeo_FullName": [
+                    "Berlin, Berlin, Germany",
+                    "Paris, Ile-de-France, France",
+                    "Lyon, Rhone-Alpes, France",
+                    "France",
+                    "Washington, District of Columbia, United States",
+                ],
+                "Text": ["talks", "strike", "trade deal", "storm", "election"],
+            },
+            index=pd.Index([1, 2, 3, 4, 5], name="GLOBALEVENTID"),
+        )
+        self.documents = [
+            f"Event: {x}. Impact location: {y}. Goldstein scale: {z}."
+            for x, y, z in zip(self.df.Text, self.df.ActionGeo_FullName, self.df.GoldsteinScale)
+        ]
+        self.collection = create_database(
+            self.client, "test_metadata", self.df.index.tolist(), self.documents,
+            embedding_function=self.embedding_function, metadatas=build_metadatas(self.df),
+        )
+
+    def tearDown(self):
+        self.client.reset()
+
+    def test_build_metadatas(self):
+        metadatas = build_metadatas(self.df)
+        self.assertEqual(
+            metadatas[1],
+            {"country": "France", "SQLDATE": 20250212, "EventCode": 172, "QuadClass": 4, "GoldsteinScale": -5.0},
+        )
+        self.assertEqual(metadatas[3]["country"], "France")
+        self.assertEqual(metadatas[4]["country"], "United States")
+
+        df = self.df.assign(ActionGeo_CountryCode=["GM", "FR", "FR", "FR", "US"])
+        self.assertEqual(build_metadatas(df)[0]["country_code"], "GM")
+
+    def test_metadata_is_stored(self):
+        metadata = self.collection.get(ids=["3"], include=["metadatas"])["metadatas"][0]
+        self.assertEqual(metadata["country"], "France")
+        self.assertEqual(metadata["SQLDATE"], 20250213)
+        self.assertIn("content_hash", metadata)
+
+    def test_event_filter(self):
+        self.assertIsNone(event_filter())
+        self.assertEqual(event_filter(country="France"), {"country": "France"})
+        self.assertEqual(
+            event_filter(country="France", start_date=20250213),
+            {"$and": [{"country": "France"}, {"SQLDATE": {"$gte": 20250213}}]},
+        )
+
+    def test_exactly_n_results(self):
+        # The closest documents to the query are not all in France
+        documents, embeddings = retrieve_events_by_country(self.collection, "France", 2)
+        self.assertEqual(len(documents), 2)
+        self.assertEqual(embeddings.shape, (2, self.embedding_function.size))
+        self.assertEqual(embeddings.dtype, np.float32)
+        self.assertTrue(embeddings.flags["C_CONTIGUOUS"])
+        self.assertTrue(all("France" in document for document in documents))
+
+    def test_where_filter(self):
+        where = event_filter(start_date=20250213, quad_classes=[4])
+        documents, embeddings = retrieve_events_by_country(self.collection, "France", 5, where=where)
+        self.assertEqual(documents, [self.documents[3]])
+        self.assertEqual(embeddings.shape[0], 1)
+
+        documents, embeddings = retrieve_events_by_country(
+            self.collection, "France", 5, where=event_filter(country="Germany")
+        )
+        self.assertEqual(documents, [])
+        self.assertIsInstance(embeddings, np.ndarray)
+
+    def test_exact_country(self):
+        df = pd.DataFrame(
+            {
+                "SQLDATE": ["20250212", "20250212", "20250213"],
+                "EventCode": [43, 172, 20],
+                "QuadClass": [1, 4, 1],
+                "GoldsteinScale": [2.8, -5.0, 3.4],
+                "ActionGeo_FullName": ["Lagos, Lagos, Nigeria", "Niamey, Niamey, Niger", "Niger"],
+                "ActionGeo_CountryCode": ["NI", "NG", "NG"],
+                "Text": ["talks", "strike", "trade deal"],
+            },
+            index=pd.Index([1, 2, 3], name="GLOBALEVENTID"),
+        )
+        documents = [
+            f"Event: {x}. Impact location: {y}. Goldstein scale: {z}."
+            for x, y, z in zip(df.Text, df.ActionGeo_FullName, df.GoldsteinScale)
+        ]
+        collection = create_database(
+            self.client, "test_countries", df.index.tolist(), documents,
+            embedding_function=self.embedding_function, metadatas=build_metadatas(df),
+        )
+
+        # "Niger" is a substring of "Nigeria"
+        niger_documents, _ = retrieve_events_by_country(collection, "Niger", 5)
+        self.assertCountEqual(niger_documents, documents[1:])
+        nigeria_documents, _ = retrieve_events_by_country(collection, "Nigeria", 5)
+        self.assertEqual(nigeria_documents, documents[:1])
+
+        code_documents, _ = retrieve_events_by_country(collection, "Niger", 5, country_code="NI")
+        self.assertEqual(code_documents, documents[:1])
+        code_documents, _ = retrieve_events_by_country(
+            collection, "Niger", 5, where=event_filter(quad_classes=[4]), country_code="NG"
+        )
+        self.assertEqual(code_documents, documents[1:2])
+
+    def test_retrieve_events_by_countries(self):
+        self.embedding_function.calls.clear()
+        countries = ["France", "Germany", "Spain"]
+        results = retrieve_events_by_countries(
+            self.collection, countries, 2, embedding_function=self.embedding_function
+        )
+
+        # All query texts are embedded in one batch
+        self.assertEqual(self.embedding_function.calls, [[f"Happened at {country}" for country in countries]])
+        self.assertEqual(list(results), countries)
+        for country in countries:
+            documents, embeddings = results[country]
+            expected_documents, expected_embeddings = retrieve_events_by_country(self.collection, country, 2)
+            self.assertEqual(documents, expected_documents)
+            np.testing.assert_allclose(embeddings, expected_embeddings)
+        self.assertEqual(len(results["France"][0]), 2)
+        self.assertEqual(results["Germany"][0], [self.documents[0]])
+        self.assertEqual(results["Spain"][0], [])
+
+        results = retrieve_events_by_countries(
+            self.collection, countries, 5, where=event_filter(quad_classes=[4]),
+            embedding_function=self.embedding_function,
+        )
+        self.assertEqual(sorted(results["France"][0]), sorted([self.documents[1], self.documents[3]]))
+        self.assertEqual(results["Germany"][0], [])
+
+    def test_retrieve_events_by_countries_collection_embedding_function(self):
+        # Without an embedding function, the queries are embedded by the one of the collection
+        self.embedding_function.calls.clear()
+        default = FakeEmbeddingFunction(size=8)
+        with patch("vector_database._default_embedding_function", default):
+            results = retrieve_events_by_countries(self.collection, ["France", "Germany"], 2)
+
+        self.assertEqual(default.calls, [])
+        self.assertEqual(self.embedding_function.calls, [["Happened at France", "Happened at Germany"]])
+        self.assertEqual(len(results["France"][0]), 2)
+        self.assertEqual(results["France"][1].shape, (2, self.embedding_function.size))
+
+
+class TestGetCollection(unittest.TestCase):
+
+    def setUp(self):
+        os.makedirs(TEST_CACHE_DATABASE_FOLDER, exist_ok=True)
+        self.client = chromadb.PersistentClient(path=TEST_CACHE_DATABASE_FOLDER)
+        self.embedding_function = FakeEmbeddingFunction()
+        create_database(self.client, "test_cached", [1, 2], ["Event 1", "Event 2"],
+                        embedding_function=self.embedding_function)
+
+    def tearDown(self):
+        clear_collection_cache()
+        for collection in self.client.list_collections():
+            self.client.delete_collection(collection.name)
+
+    def get(self, collection_name="test_cached"):
+        return get_collection(
+            collection_name, embedding_function=self.embedding_function, path=TEST_CACHE_DATABASE_FOLDER
+        )
+
+    def test_same_collection_is_returned(self):
+        collection = self.get()
+        self.assertIs(self.get(), collection)
+        self.assertEqual(collection.count(), 2)
+
+    def test_shared_across_threads(self):
+        collections = []
+        threads = [threading.Thread(target=lambda: collections.append(self.get())) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len({id(collection) for collection in collections}), 1)
+
+    def test_clear_collection_cache(self):
+        collection = self.get()
+        clear_collection_cache("test_cached", path=TEST_CACHE_DATABASE_FOLDER)
+        self.assertIsNot(self.get(), collection)
+
+        collection = self.get()
+        clear_collection_cache()
+        self.assertIsNot(self.get(), collection)
+
+    def test_default_embedding_function_is_lazy_and_shared(self):
+        self.client.create_collection("test_default_1")
+        self.client.create_collection("test_default_2")
+        first = get_collection("test_default_1", path=TEST_CACHE_DATABASE_FOLDER)
+        second = get_collection("test_default_2", path=TEST_CACHE_DATABASE_FOLDER)
+
+        self.assertIs(first._embedding_function, second._embedding_function)
+        # No model is loaded until something is embedded
+        self.assertIsNone(first._embedding_function._local)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -14,11 +14,27 @@ prohibited and subject to being investigated as a Code of Academic Integrity vio
 -----do not edit anything above this line---
 """
 
+import hashlib
+import io
 import os
 import re
+import sqlite3
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+import numpy as np
 import pandas as pd
 from helpers import GDELTFIELDNAMES
 
+try:
+    import pyarrow  # noqa: F401
+
+    # Arrow strings run the vectorized regular expressions in C++
+    STRING_DTYPE = "string[pyarrow]"
+except ImportError:
+    STRING_DTYPE = object
+
 
 def parse_url(url: str) -> str:
     """URLs may contain information on what the webpage is about. This function
@@ -131,7 +147,184 @@ def parse_url(url: str) -> str:
     return page_title
 
 
-def read_gdelt(data_folder: str, filename: str) -> pd.DataFrame:
+class TitleCache:
+    """Bounded LRU cache of the titles parsed from URLs. The same SOURCEURLs appear in
+    consecutive GDELT files, so sharing one cache across files skips most of the parsing.
+
+    If path is given, titles are also kept in a SQLite database and survive across runs.
+    The in-memory entries are bounded by maxsize, the database is not.
+
+    Args:
+        maxsize (int): The maximum number of titles kept in memory.
+        path (str): The path of the SQLite database. Titles are only kept in memory if None.
+
+    """
+
+    def __init__(self, maxsize: int = 1_000_000, path: str = None):
+        self.maxsize = maxsize
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._titles = OrderedDict()
+        self._connection = None
+        if path is not None:
+            # Wait for other processes sharing the database to finish writing
+            self._connection = sqlite3.connect(path, timeout=30)
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS titles (url TEXT PRIMARY KEY, title TEXT)"
+            )
+
+    def __len__(self) -> int:
+        return len(self._titles)
+
+    def lookup(self, urls: list[str]) -> dict:
+        """Return the cached titles of the given URLs. URLs that are not cached are left out.
+
+        Args:
+            urls (list[str]): The URLs to look up.
+
+        Returns:
+            dict: The title of each cached URL, which may be None.
+
+        """
+        found = {}
+        missing = []
+        for url in urls:
+            if url in self._titles:
+                self._titles.move_to_end(url)
+                found[url] = self._titles[url]
+            else:
+                missing.append(url)
+
+        if self._connection is not None and missing:
+            # Stay below SQLite's limit on the number of query parameters
+            from_disk = {}
+            for i in range(0, len(missing), 500):
+                batch = missing[i:i + 500]
+                rows = self._connection.execute(
+                    f"SELECT url, title FROM titles WHERE url IN ({','.join('?' * len(batch))})",
+                    batch,
+                )
+                from_disk.update(rows)
+            self._remember(from_disk)
+            found.update(from_disk)
+
+        self.hits += len(found)
+        self.misses += len(urls) - len(found)
+        return found
+
+    def store(self, titles: dict) -> None:
+        """Add parsed titles to the cache.
+
+        Args:
+            titles (dict): The title of each URL, which may be None.
+
+        """
+        self._remember(titles)
+        if self._connection is not None:
+            with self._connection:
+                self._connection.executemany(
+                    "INSERT OR REPLACE INTO titles (url, title) VALUES (?, ?)", titles.items()
+                )
+
+    def stats(self) -> dict:
+        """Return the number of hits and misses, the hit rate and the number of titles in memory."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size": len(self._titles),
+        }
+
+    def close(self) -> None:
+        """Close the SQLite database, if any."""
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def _remember(self, titles: dict) -> None:
+        """Add titles to the in-memory cache, evicting the least recently used ones."""
+        self._titles.update(titles)
+        for url in titles:
+            self._titles.move_to_end(url)
+        while len(self._titles) > self.maxsize:
+            self._titles.popitem(last=False)
+
+
+def parse_urls(urls: pd.Series, cache: TitleCache = None) -> pd.Series:
+    """Vectorized version of parse_url. Returns the same titles as
+    urls.apply(parse_url), but runs the regular expressions over the whole column
+    and parses each distinct URL only once.
+
+    URLs with characters outside of printable ASCII are passed to parse_url, since
+    str.isdigit() and str.split() accept more digits and whitespace than the
+    vectorized patterns do.
+
+    Args:
+        urls (pd.Series): a column of URLs
+        cache (TitleCache): titles of URLs that were already parsed. URLs found in the
+            cache are not parsed again, and the new titles are added to it.
+
+    Returns:
+        pd.Series: the title of each webpage, or None, with the index of urls
+
+    """
+    values = urls.to_numpy(dtype=object)
+    codes, uniques = pd.factorize(values)
+    titles = np.full(len(uniques), None, dtype=object)
+
+    # parse_url returns None for anything that is not a URL string
+    is_str = np.fromiter((isinstance(url, str) for url in uniques), bool, len(uniques))
+    to_parse = np.flatnonzero(is_str)
+
+    if cache is not None:
+        cached = cache.lookup(uniques[to_parse].tolist())
+        is_cached = np.fromiter((url in cached for url in uniques[to_parse]), bool, len(to_parse))
+        titles[to_parse[is_cached]] = [cached[url] for url in uniques[to_parse[is_cached]]]
+        to_parse = to_parse[~is_cached]
+
+    candidates = pd.Series(uniques[to_parse], index=to_parse, dtype=STRING_DTYPE)
+    candidates = candidates[candidates.str.startswith("http")]
+
+    is_plain = ~candidates.str.contains(r"[^\x20-\x7e]").to_numpy(dtype=bool)
+    titles[candidates.index[~is_plain]] = [parse_url(url) for url in candidates[~is_plain]]
+    candidates = candidates[is_plain]
+
+    # One row per segment, indexed by URL and in order from the root
+    segments = candidates.str.strip("/").str.split("/").explode()
+    segments = segments[segments.str.contains(r"(?:[^-]*-){3}")]
+    segments = segments.str.replace(r"\.cms|\.html$", "", regex=True)
+    segments = segments[~segments.str.contains(r"(?:\D*\d){8}")]
+
+    # Replace dashes with spaces, then drop words with six or more digits
+    segments = " " + segments.str.replace(r"-+", " ", regex=True)
+    segments = segments.str.replace(r" (?:[^ \d]*\d){6}[^ ]*", "", regex=True)
+    segments = segments.str.replace(r" +", " ", regex=True).str.strip(" ")
+
+    # The furthest segment with words left is the title
+    segments = segments[segments != ""]
+    segments = segments[~segments.index.duplicated(keep="last")]
+    segments = segments.str.strip(" /.").str.lower()
+    segments = segments[segments != ""]
+    titles[segments.index.to_numpy()] = segments.to_numpy(dtype=object)
+
+    if cache is not None:
+        cache.store(dict(zip(uniques[to_parse], titles[to_parse])))
+
+    page_titles = np.full(len(values), None, dtype=object)
+    page_titles[codes >= 0] = titles[codes[codes >= 0]]
+    return pd.Series(page_titles, index=urls.index, name=urls.name, dtype=object)
+
+
+def read_gdelt(
+    data_folder: str,
+    filename: str,
+    title_cache: TitleCache = None,
+    cache_folder: str = None,
+    compact: bool = False,
+    country_code: bool = False,
+) -> pd.DataFrame:
     """
     Given a raw CSV file, create a dataframe with the following characteristics:
 
@@ -148,9 +341,27 @@ def read_gdelt(data_folder: str, filename: str) -> pd.DataFrame:
     5. Remove rows with duplicated SOURCEURL. If multiple rows share the same SOURCEURL,
     keep the row with the smallest GLOBALEVENTID.
 
+    The file may also be a zipped export (e.g. "20250212.export.CSV.zip"), which is
+    decompressed while it is parsed instead of being extracted to disk first.
+
+    If cache_folder is given, the cleaned dataframe is saved there as a Parquet file
+    named after the file and its MD5 hash, and later calls on the same file read it back
+    instead of parsing the file again.
+
+    If compact is True, the dataframe uses the memory-lean column types of compact_gdelt
+    instead of the types listed above.
+
+    If country_code is True, the ActionGeo_CountryCode (str) column is kept as well,
+    after ActionGeo_FullName. It is empty for rows without a country code, which are
+    not removed.
+
     Args:
         data_folder (str): the folder containing the file
         filename (str): the name of the file to read
+        title_cache (TitleCache): the cache of URL titles, shared across files
+        cache_folder (str): the folder of the Parquet cache. No cache is used if None.
+        compact (bool): whether to return the column types of compact_gdelt
+        country_code (bool): whether to keep the ActionGeo_CountryCode column
 
     Returns:
         pd.DataFrame, the cleaned dataframe
@@ -163,54 +374,290 @@ def read_gdelt(data_folder: str, filename: str) -> pd.DataFrame:
     # Hint: the resulting df should have 7 columns.
     # Hint: Do GDELT files contain a header row?
 
-    GDELTFIELDNAMES = [
-    "GLOBALEVENTID", "SQLDATE", "MonthYear", "Year", "FractionDate", "Actor1Code", "Actor1Name",
-    "Actor1CountryCode", "Actor1KnownGroupCode", "Actor1EthnicCode", "Actor1Religion1Code", "Actor1Religion2Code",
-    "Actor1Type1Code", "Actor1Type2Code", "Actor1Type3Code", "Actor2Code", "Actor2Name", "Actor2CountryCode",
-    "Actor2KnownGroupCode", "Actor2EthnicCode", "Actor2Religion1Code", "Actor2Religion2Code", "Actor2Type1Code",
-    "Actor2Type2Code", "Actor2Type3Code", "IsRootEvent", "EventCode", "EventBaseCode", "EventRootCode",
-    "QuadClass", "GoldsteinScale", "NumMentions", "NumSources", "NumArticles", "AvgTone", "Actor1Geo_Type",
-    "Actor1Geo_FullName", "Actor1Geo_CountryCode", "Actor1Geo_ADM1Code", "Actor1Geo_Lat", "Actor1Geo_Long",
-    "Actor1Geo_FeatureID", "Actor2Geo_Type", "Actor2Geo_FullName", "Actor2Geo_CountryCode", "Actor2Geo_ADM1Code",
-    "Actor2Geo_Lat", "Actor2Geo_Long", "Actor2Geo_FeatureID", "ActionGeo_Type", "ActionGeo_FullName",
-    "ActionGeo_CountryCode", "ActionGeo_ADM1Code", "ActionGeo_Lat", "ActionGeo_Long", "ActionGeo_FeatureID",
-    "DATEADDED", "SOURCEURL"
-]
+    file_path = os.path.join(data_folder, filename)
+    if cache_folder is not None:
+        df = _read_gdelt_cached(file_path, cache_folder, title_cache, compact, country_code)
+    elif compact:
+        df = compact_gdelt(read_gdelt_source(file_path, title_cache=title_cache, country_code=country_code))
+    else:
+        df = read_gdelt_source(file_path, title_cache=title_cache, country_code=country_code)
+
+    ##############################################################################
+
+    return df
+
+
+def read_gdelt_source(source, title_cache: TitleCache = None, country_code: bool = False) -> pd.DataFrame:
+    """Same as read_gdelt, but reads from a path, raw bytes or a binary file-like object.
+    Zipped exports are detected from their content and decompressed while they are
+    parsed, so a freshly downloaded archive can be read straight from memory.
+
+    Args:
+        source (str | bytes | file-like): the export file, plain or zipped
+        title_cache (TitleCache): the cache of URL titles, shared across files
+        country_code (bool): whether to keep the ActionGeo_CountryCode column
+
+    Returns:
+        pd.DataFrame, the cleaned dataframe
+
+    """
+    df = _read_gdelt_csv(source, country_code=country_code)
+    df = _clean_gdelt(df, title_cache)
+    
+    # Remove duplicates based on SOURCEURL, keeping the first occurrence (smallest GLOBALEVENTID)
+    df = df.sort_values('GLOBALEVENTID').drop_duplicates(subset=['SOURCEURL'], keep='first')
+    
+    # Set the index to GLOBALEVENTID
+    df = df.set_index('GLOBALEVENTID')
+
+    return df
+
+
+def compact_gdelt(df: pd.DataFrame) -> pd.DataFrame:
+    """Return a copy of a read_gdelt dataframe with memory-lean column types:
+
+    - an integer GLOBALEVENTID index
+    - int32 EventCode and int8 QuadClass
+    - categorical SQLDATE, ActionGeo_FullName and ActionGeo_CountryCode, which repeat a few values
+    - Arrow-backed strings for SOURCEURL and Text, if pyarrow is installed
+
+    GoldsteinScale stays a float64, so that documents built from it do not change.
+
+    Args:
+        df (pd.DataFrame): a dataframe returned by read_gdelt
+
+    Returns:
+        pd.DataFrame, the compact dataframe
+
+    """
+    dtypes = {
+        'SQLDATE': 'category',
+        'EventCode': 'int32',
+        'QuadClass': 'int8',
+        'ActionGeo_FullName': 'category',
+        'ActionGeo_CountryCode': 'category',
+        'SOURCEURL': STRING_DTYPE,
+        'Text': STRING_DTYPE,
+    }
+    df = df.astype({col: dtype for col, dtype in dtypes.items() if col in df.columns})
+    df.index = df.index.astype('int64')
+    return df
+
+
+def memory_report(df: pd.DataFrame, compact_df: pd.DataFrame = None) -> dict:
+    """Compare the memory used by a read_gdelt dataframe and its compact version.
+
+    Args:
+        df (pd.DataFrame): a dataframe returned by read_gdelt
+        compact_df (pd.DataFrame): its compact version, computed with compact_gdelt if None
+
+    Returns:
+        dict: the bytes used before and after, the bytes saved and the ratio of both
+
+    """
+    if compact_df is None:
+        compact_df = compact_gdelt(df)
+
+    bytes_before = int(df.memory_usage(deep=True).sum())
+    bytes_after = int(compact_df.memory_usage(deep=True).sum())
+    return {
+        "bytes_before": bytes_before,
+        "bytes_after": bytes_after,
+        "bytes_saved": bytes_before - bytes_after,
+        "ratio": bytes_before / bytes_after if bytes_after else 0.0,
+    }
+
+
+def read_gdelt_files(
+    data_folder: str,
+    filenames: list[str],
+    max_workers: int = None,
+    title_cache_path: str = None,
+    cache_folder: str = None,
+    compact: bool = False,
+    country_code: bool = False,
+) -> pd.DataFrame:
+    """Read many GDELT files in parallel and merge them into one dataframe.
+
+    Each file is cleaned by read_gdelt in a separate process, then rows with a SOURCEURL
+    seen in several files are removed, keeping the row with the smallest GLOBALEVENTID.
+
+    Args:
+        data_folder (str): the folder containing the files
+        filenames (list[str]): the names of the files to read
+        max_workers (int): the number of processes, by default the number of CPUs
+        title_cache_path (str): the path of a SQLite TitleCache shared by the processes.
+            Each process only caches the titles of its own files in memory if None.
+        cache_folder (str): the folder of the Parquet cache used by read_gdelt
+        compact (bool): whether to return the column types of compact_gdelt
+        country_code (bool): whether to keep the ActionGeo_CountryCode column
+
+    Returns:
+        pd.DataFrame, the cleaned dataframe, without rows if there are no files
+
+    """
+    if not filenames:
+        df = _empty_gdelt(country_code)
+        return compact_gdelt(df) if compact else df
+
+    with ProcessPoolExecutor(
+        max_workers=max_workers, initializer=_init_worker, initargs=(title_cache_path,)
+    ) as pool:
+        dfs = list(pool.map(
+            _read_gdelt_in_worker,
+            repeat(data_folder), filenames, repeat(cache_folder), repeat(compact), repeat(country_code),
+        ))
+
+    # Remove duplicates across files, keeping the smallest GLOBALEVENTID
+    df = pd.concat(dfs).reset_index()
+    df = df.sort_values('GLOBALEVENTID').drop_duplicates(subset=['SOURCEURL'], keep='first')
+    df = df.set_index('GLOBALEVENTID')
+
+    # Categories differ between files, so concat falls back to plain strings
+    return compact_gdelt(df) if compact else df
+
+
+_worker_title_cache = None
+
+
+def _empty_gdelt(country_code: bool = False) -> pd.DataFrame:
+    """Return a dataframe with the index, columns and column types of read_gdelt, without rows."""
+    columns = {
+        'SQLDATE': pd.Series(dtype=str),
+        'EventCode': pd.Series(dtype=int),
+        'QuadClass': pd.Series(dtype=int),
+        'GoldsteinScale': pd.Series(dtype=float),
+        'ActionGeo_FullName': pd.Series(dtype=str),
+        'ActionGeo_CountryCode': pd.Series(dtype=str),
+        'SOURCEURL': pd.Series(dtype=str),
+        'Text': pd.Series(dtype=object),
+    }
+    if not country_code:
+        del columns['ActionGeo_CountryCode']
+
+    df = pd.DataFrame(columns)
+    df.index = pd.Index([], dtype=str, name='GLOBALEVENTID')
+    return df
+
+
+def _init_worker(title_cache_path: str) -> None:
+    """Create the title cache of a read_gdelt_files process."""
+    global _worker_title_cache
+    _worker_title_cache = TitleCache(path=title_cache_path)
 
+
+def _read_gdelt_in_worker(
+    data_folder: str, filename: str, cache_folder: str, compact: bool, country_code: bool
+) -> pd.DataFrame:
+    """Call read_gdelt in a read_gdelt_files process."""
+    return read_gdelt(
+        data_folder, filename, title_cache=_worker_title_cache, cache_folder=cache_folder,
+        compact=compact, country_code=country_code,
+    )
+
+
+def iter_gdelt(
+    data_folder: str, filename: str, chunksize: int = 50_000, title_cache: TitleCache = None
+):
+    """Chunked version of read_gdelt. Yields the cleaned dataframe in pieces of at most
+    chunksize rows, so memory use depends on chunksize rather than on the size of the file.
+
+    Args:
+        data_folder (str): the folder containing the file
+        filename (str): the name of the file to read
+        chunksize (int): the number of raw rows read at a time
+        title_cache (TitleCache): the cache of URL titles, shared across files
+
+    Yields:
+        pd.DataFrame, the cleaned rows of each chunk
+
+    """
     file_path = os.path.join(data_folder, filename)
+    yield from iter_gdelt_source(file_path, chunksize=chunksize, title_cache=title_cache)
+
+
+def iter_gdelt_source(source, chunksize: int = 50_000, title_cache: TitleCache = None):
+    """Chunked version of read_gdelt_source.
+
+    Rows with a SOURCEURL that was already yielded are dropped. Only a 64-bit hash of
+    each SOURCEURL is kept to do so. GDELT exports are written in increasing
+    GLOBALEVENTID order, so the first row of a SOURCEURL is the one with the smallest
+    GLOBALEVENTID, as in read_gdelt. In a file that is not ordered, a duplicate in a
+    later chunk with a smaller GLOBALEVENTID is dropped instead.
+
+    Args:
+        source (str | bytes | file-like): the export file, plain or zipped
+        chunksize (int): the number of raw rows read at a time
+        title_cache (TitleCache): the cache of URL titles, shared across files
+
+    Yields:
+        pd.DataFrame, the cleaned rows of each chunk
+
+    """
+    seen_urls = set()
+
+    with _read_gdelt_csv(source, chunksize=chunksize) as reader:
+        for df in reader:
+            df = _clean_gdelt(df, title_cache)
+            df = df.sort_values('GLOBALEVENTID').drop_duplicates(subset=['SOURCEURL'], keep='first')
+
+            # Remove the SOURCEURLs of previous chunks
+            url_hashes = pd.util.hash_array(df['SOURCEURL'].to_numpy(dtype=object)).tolist()
+            is_new = np.fromiter(
+                (url_hash not in seen_urls for url_hash in url_hashes), dtype=bool, count=len(url_hashes)
+            )
+            seen_urls.update(url_hashes)
+
+            df = df[is_new].set_index('GLOBALEVENTID')
+            if not df.empty:
+                yield df
+
+
+def _read_gdelt_csv(source, chunksize: int = None, country_code: bool = False):
+    """Read the columns we want from a GDELT export, as strings.
+
+    Returns:
+        pd.DataFrame, or a reader of dataframes if chunksize is given
+
+    """
+    source, compression = _gdelt_source(source)
 
     # Define the columns we want
     columns = ["GLOBALEVENTID", "SQLDATE", "EventCode", "QuadClass", 
                "GoldsteinScale", "ActionGeo_FullName", "SOURCEURL"]
+    if country_code:
+        # In the order of the file, which is the order of the columns read
+        columns.insert(columns.index("ActionGeo_FullName") + 1, "ActionGeo_CountryCode")
     
     # Get the column indices from GDELTFIELDNAMES
     usecols = [GDELTFIELDNAMES.index(col) for col in columns]
     
     # Read the raw file
-    df = pd.read_csv(
-        file_path,
+    return pd.read_csv(
+        source,
         sep='\t',
         header=None,
         usecols=usecols,
         names=columns,
-        dtype={
-            'GLOBALEVENTID': str,
-            'SQLDATE': str,
-            'EventCode': str,
-            'QuadClass': str,
-            'GoldsteinScale': str,
-            'ActionGeo_FullName': str,
-            'SOURCEURL': str
-        }
+        compression=compression,
+        chunksize=chunksize,
+        dtype=str,
     )
-    
+
+
+def _clean_gdelt(df: pd.DataFrame, title_cache: TitleCache = None) -> pd.DataFrame:
+    """Convert the column types, add the Text column and remove rows with missing values."""
     # First, ensure we have the correct data types
     df['EventCode'] = pd.to_numeric(df['EventCode'], errors='coerce').astype('Int64')
     df['QuadClass'] = pd.to_numeric(df['QuadClass'], errors='coerce').astype('Int64')
     df['GoldsteinScale'] = pd.to_numeric(df['GoldsteinScale'], errors='coerce')
     
     # Add the Text column
-    df['Text'] = df['SOURCEURL'].apply(parse_url)
+    df['Text'] = parse_urls(df['SOURCEURL'], cache=title_cache)
+
+    # A missing country code does not remove the row, which read_gdelt keeps without it
+    if 'ActionGeo_CountryCode' in df.columns:
+        df['ActionGeo_CountryCode'] = df['ActionGeo_CountryCode'].fillna('')
     
     # Remove rows with missing values in any column
     df = df.dropna()
@@ -218,13 +665,84 @@ def read_gdelt(data_folder: str, filename: str) -> pd.DataFrame:
     # Convert Int64 to regular int
     df['EventCode'] = df['EventCode'].astype(int)
     df['QuadClass'] = df['QuadClass'].astype(int)
-    
-    # Remove duplicates based on SOURCEURL, keeping the first occurrence (smallest GLOBALEVENTID)
-    df = df.sort_values('GLOBALEVENTID').drop_duplicates(subset=['SOURCEURL'], keep='first')
-    
-    # Set the index to GLOBALEVENTID
-    df = df.set_index('GLOBALEVENTID')
 
-    ##############################################################################
+    return df
+
 
+# Part of the name of the cached files; increase it when the cleaning rules change
+_PARQUET_CACHE_VERSION = 3
+
+
+def _read_gdelt_cached(
+    file_path: str,
+    cache_folder: str,
+    title_cache: TitleCache = None,
+    compact: bool = False,
+    country_code: bool = False,
+) -> pd.DataFrame:
+    """Return read_gdelt_source(file_path), reusing the Parquet file saved by a previous call.
+    The dataframe is stored with the column types of compact_gdelt and its country codes,
+    which are dropped when they are not asked for."""
+    md5 = hashlib.md5()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            md5.update(chunk)
+
+    cache_path = os.path.join(
+        cache_folder,
+        f"{os.path.basename(file_path)}.{md5.hexdigest()}.v{_PARQUET_CACHE_VERSION}.parquet",
+    )
+    if os.path.exists(cache_path):
+        df = pd.read_parquet(cache_path)
+        if not country_code:
+            df = df.drop(columns='ActionGeo_CountryCode')
+        return df if compact else _restore_dtypes(df)
+
+    df = read_gdelt_source(file_path, title_cache=title_cache, country_code=True)
+    compact_df = compact_gdelt(df)
+
+    # Write to a temporary file first, so other processes never read a partial file
+    os.makedirs(cache_folder, exist_ok=True)
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    compact_df.to_parquet(tmp_path)
+    os.replace(tmp_path, cache_path)
+
+    if not country_code:
+        df = df.drop(columns='ActionGeo_CountryCode')
+        compact_df = compact_df.drop(columns='ActionGeo_CountryCode')
+
+    return compact_df if compact else df
+
+
+def _restore_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """Undo compact_gdelt, returning the column types of read_gdelt."""
+    dtypes = {
+        'SQLDATE': str,
+        'EventCode': int,
+        'QuadClass': int,
+        'ActionGeo_FullName': str,
+        'ActionGeo_CountryCode': str,
+        'SOURCEURL': str,
+        'Text': object,
+    }
+    df = df.astype({col: dtype for col, dtype in dtypes.items() if col in df.columns})
+    df.index = df.index.astype(str)
     return df
+
+
+def _gdelt_source(source) -> tuple:
+    """Return a path or binary buffer that pd.read_csv can read, and its compression."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+
+    if isinstance(source, (str, os.PathLike)):
+        return source, "zip" if zipfile.is_zipfile(source) else None
+
+    # Zip archives need random access to their central directory
+    if not source.seekable():
+        source = io.BytesIO(source.read())
+
+    position = source.tell()
+    magic = source.read(4)
+    source.seek(position)
+    return source, "zip" if magic == b"PK\x03\x04" else None
@@ -14,27 +14,49 @@ prohibited and subject to being investigated as a Code of Academic Integrity vio
 -----do not edit anything above this line---
 """
 
-import chromadb
-import chromadb.utils.embedding_functions as ef
+from __future__ import annotations
+
+import hashlib
+import json
 import numpy as np
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
 
 import helpers
 
+# chromadb and pandas take a second to import, so they are imported by the functions that use them
+if TYPE_CHECKING:
+    import chromadb
+    import pandas as pd
+
 
 def create_database(
     client: chromadb.PersistentClient,
     collection_name: str,
     doc_ids: list[int],
     documents: list[str],
+    embedding_function: chromadb.EmbeddingFunction = None,
+    batch_size: int = None,
+    verbose: bool = False,
+    metadatas: list[dict] = None,
 ) -> chromadb.Collection:
     """Create a persistent vector database in a local folder, then create and populate a collection with documents.
 
+    Documents are inserted with sync_documents, so calling it again with the same
+    documents only embeds the new or changed ones.
+
     Args:
         client (chromadb.PersistentClient): The persistent client object.
         collection_name (str): The name of the collection.
         doc_ids (list[int]): The list of document ids.
         documents (list[str]): The list of documents.
+        embedding_function (chromadb.EmbeddingFunction): The embedding function, Chroma's default if None.
+        batch_size (int): The number of documents per batch, capped at the client's maximum batch size.
+        verbose (bool): Whether to print the progress and throughput of the insertion.
+        metadatas (list[dict]): The metadata of each document, e.g. from build_metadatas.
 
     Returns:
         chromadb.Collection: The collection object.
@@ -42,7 +64,10 @@ def create_database(
     """
 
     collection = None
-    embedding_function = ef.DefaultEmbeddingFunction()
+    _check_batch_size(batch_size)
+    if embedding_function is None:
+        import chromadb.utils.embedding_functions as ef
+        embedding_function = ef.DefaultEmbeddingFunction()
 
     ##############################################################################
     # TODO: Implement your code here
@@ -53,45 +78,392 @@ def create_database(
         name=collection_name, embedding_function=embedding_function
     )
 
-    # Insert documents
-    collection.add(ids=[str(doc_id) for doc_id in doc_ids], documents=documents)
+    # Insert new and changed documents
+    sync_documents(
+        collection,
+        doc_ids,
+        documents,
+        embedding_function=embedding_function,
+        batch_size=batch_size,
+        max_batch_size=client.get_max_batch_size(),
+        verbose=verbose,
+        metadatas=metadatas,
+    )
 
     ##############################################################################
 
     return collection
 
 
-def get_collection(collection_name: str) -> chromadb.Collection:
+def add_documents(
+    collection: chromadb.Collection,
+    doc_ids: list[int],
+    documents: list[str],
+    embedding_function: chromadb.EmbeddingFunction,
+    batch_size: int = None,
+    max_batch_size: int = None,
+    verbose: bool = False,
+    metadatas: list[dict] = None,
+    upsert: bool = False,
+) -> dict:
+    """Add documents to a collection in batches. The next batch is embedded in a
+    background thread while the current one is written, so both steps overlap.
+
+    Args:
+        collection (chromadb.Collection): The collection object.
+        doc_ids (list[int]): The list of document ids.
+        documents (list[str]): The list of documents.
+        embedding_function (chromadb.EmbeddingFunction): The embedding function of the collection.
+        batch_size (int): The number of documents per batch, max_batch_size if None.
+        max_batch_size (int): The largest batch the client accepts, e.g. client.get_max_batch_size().
+        verbose (bool): Whether to print the progress and throughput of the insertion.
+        metadatas (list[dict]): The metadata of each document, if any.
+        upsert (bool): Whether to overwrite documents whose ids already exist.
+
+    Returns:
+        dict: The number of documents and batches, the time taken and the documents per second.
+
+    """
+    _check_batch_size(batch_size)
+    batch_size = min(batch_size or max_batch_size or 1000, max_batch_size or float("inf"))
+    ids = [str(doc_id) for doc_id in doc_ids]
+    batches = [(i, min(i + batch_size, len(ids))) for i in range(0, len(ids), batch_size)]
+
+    write = collection.upsert if upsert else collection.add
+
+    start_time = time.time()
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        next_embeddings = pool.submit(embedding_function, documents[0:batch_size]) if batches else None
+
+        for k, (start, end) in enumerate(batches):
+            embeddings = next_embeddings.result()
+            if k + 1 < len(batches):
+                next_start, next_end = batches[k + 1]
+                next_embeddings = pool.submit(embedding_function, documents[next_start:next_end])
+
+            write(
+                ids=ids[start:end],
+                documents=documents[start:end],
+                embeddings=embeddings,
+                metadatas=metadatas[start:end] if metadatas else None,
+            )
+
+            if verbose:
+                print(f"Batch {k + 1}/{len(batches)}: {end} documents, {end / (time.time() - start_time):.1f} docs/sec")
+
+    seconds = time.time() - start_time
+    stats = {
+        "documents": len(ids),
+        "batches": len(batches),
+        "seconds": seconds,
+        "docs_per_sec": len(ids) / seconds if seconds else 0.0,
+    }
+    if verbose:
+        print(f"Added {stats['documents']} documents in {seconds:.2f} seconds ({stats['docs_per_sec']:.1f} docs/sec)")
+    return stats
+
+
+def _check_batch_size(batch_size: int) -> None:
+    """Raise a ValueError unless batch_size is None or a positive integer."""
+    if batch_size is not None and (not isinstance(batch_size, int) or batch_size < 1):
+        raise ValueError(f"batch_size must be a positive integer, not {batch_size!r}")
+
+
+def content_hash(document: str, metadata: dict = None) -> str:
+    """Return the hash stored in a document's metadata to detect changed documents."""
+    if metadata:
+        document += json.dumps(metadata, sort_keys=True)
+    return hashlib.md5(document.encode("utf-8")).hexdigest()
+
+
+def build_metadatas(df: pd.DataFrame) -> list[dict]:
+    """Build the metadata of the events of a dataframe from read_gdelt, to filter queries with.
+
+    The country is the last part of ActionGeo_FullName, e.g. "France" for
+    "Paris, Ile-de-France, France". The country code is added if the dataframe
+    has an ActionGeo_CountryCode column.
+
+    Args:
+        df (pd.DataFrame): The dataframe of events.
+
+    Returns:
+        list[dict]: The metadata of each event, in the order of the rows.
+
+    """
+    import pandas as pd
+
+    columns = {
+        "country": df["ActionGeo_FullName"].astype(str).str.rsplit(",", n=1).str[-1].str.strip(),
+        "SQLDATE": pd.to_numeric(df["SQLDATE"].astype(str)).astype(int),
+        "EventCode": df["EventCode"].astype(int),
+        "QuadClass": df["QuadClass"].astype(int),
+        "GoldsteinScale": df["GoldsteinScale"].astype(float),
+    }
+    if "ActionGeo_CountryCode" in df.columns:
+        columns["country_code"] = df["ActionGeo_CountryCode"].astype(str)
+
+    return pd.DataFrame(columns).to_dict("records")
+
+
+def event_filter(
+    country: str = None,
+    country_code: str = None,
+    start_date: int = None,
+    end_date: int = None,
+    quad_classes: list[int] = None,
+    event_codes: list[int] = None,
+    min_goldstein: float = None,
+    max_goldstein: float = None,
+) -> dict:
+    """Build a where filter on the metadata of build_metadatas. Conditions left to None are ignored.
+
+    Args:
+        country (str): The country of the events.
+        country_code (str): The country code of the events.
+        start_date (int): The first SQLDATE, e.g. 20250212.
+        end_date (int): The last SQLDATE.
+        quad_classes (list[int]): The allowed QuadClass values.
+        event_codes (list[int]): The allowed EventCode values.
+        min_goldstein (float): The minimum GoldsteinScale.
+        max_goldstein (float): The maximum GoldsteinScale.
+
+    Returns:
+        dict: The where filter, or None if there is no condition.
+
+    """
+    conditions = []
+    if country is not None:
+        conditions.append({"country": country})
+    if country_code is not None:
+        conditions.append({"country_code": country_code})
+    if start_date is not None:
+        conditions.append({"SQLDATE": {"$gte": int(start_date)}})
+    if end_date is not None:
+        conditions.append({"SQLDATE": {"$lte": int(end_date)}})
+    if quad_classes is not None:
+        conditions.append({"QuadClass": {"$in": [int(c) for c in quad_classes]}})
+    if event_codes is not None:
+        conditions.append({"EventCode": {"$in": [int(c) for c in event_codes]}})
+    if min_goldstein is not None:
+        conditions.append({"GoldsteinScale": {"$gte": float(min_goldstein)}})
+    if max_goldstein is not None:
+        conditions.append({"GoldsteinScale": {"$lte": float(max_goldstein)}})
+
+    if not conditions:
+        return None
+    return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+
+def country_filter(
+    collection: chromadb.Collection, country: str, where: dict = None, country_code: str = None
+) -> tuple[dict, dict]:
+    """Build the filters of the events of a country, on top of another where filter.
+
+    Collections with the metadata of build_metadatas are filtered on the exact
+    country, or on the country code if one is given, so that "Niger" does not
+    match the events of Nigeria. Collections without metadata fall back to the
+    documents containing the country.
+
+    Args:
+        collection (chromadb.Collection): The collection object.
+        country (str): The country of the events.
+        where (dict): An optional filter on the metadata of the events, e.g. from event_filter.
+        country_code (str): The country code of the events, which needs an ActionGeo_CountryCode
+            column in the dataframe given to build_metadatas.
+
+    Returns:
+        dict: The where filter, or None if there is no condition.
+        dict: The where_document filter, or None if there is no condition.
+
+    """
+    metadatas = collection.get(limit=1, include=["metadatas"])["metadatas"]
+    if not metadatas or not metadatas[0] or "country" not in metadatas[0]:
+        return where, {"$contains": country}
+
+    condition = event_filter(country_code=country_code) if country_code else event_filter(country=country)
+    return (condition if where is None else {"$and": [where, condition]}), None
+
+
+def sync_documents(
+    collection: chromadb.Collection,
+    doc_ids: list[int],
+    documents: list[str],
+    embedding_function: chromadb.EmbeddingFunction,
+    batch_size: int = None,
+    max_batch_size: int = None,
+    verbose: bool = False,
+    metadatas: list[dict] = None,
+) -> dict:
+    """Upsert the documents that are new or changed since the last sync.
+
+    The content hash of each document and its metadata is kept in its metadata. Documents whose id
+    is already in the collection with the same hash are skipped without being
+    embedded, so syncing a new day of events costs as much as that day alone.
+
+    Args:
+        collection (chromadb.Collection): The collection object.
+        doc_ids (list[int]): The list of document ids.
+        documents (list[str]): The list of documents.
+        embedding_function (chromadb.EmbeddingFunction): The embedding function of the collection.
+        batch_size (int): The number of documents per batch, max_batch_size if None.
+        max_batch_size (int): The largest batch the client accepts, e.g. client.get_max_batch_size().
+        verbose (bool): Whether to print the progress and throughput of the insertion.
+        metadatas (list[dict]): The metadata of each document, if any.
+
+    Returns:
+        dict: The number of new, changed and unchanged documents, and the statistics of add_documents.
+
+    """
+    _check_batch_size(batch_size)
+
+    # The last document wins if an id is repeated
+    incoming = {str(doc_id): document for doc_id, document in zip(doc_ids, documents)}
+    incoming_metadatas = dict(zip(incoming, [{}] * len(incoming)))
+    if metadatas:
+        incoming_metadatas.update((str(doc_id), metadata) for doc_id, metadata in zip(doc_ids, metadatas))
+    hashes = {
+        doc_id: content_hash(document, incoming_metadatas[doc_id]) for doc_id, document in incoming.items()
+    }
+    stored = _stored_hashes(collection, list(incoming), max_batch_size or 1000) if collection.count() else {}
+
+    new_ids = [doc_id for doc_id in incoming if doc_id not in stored]
+    changed_ids = [doc_id for doc_id in incoming if doc_id in stored and stored[doc_id] != hashes[doc_id]]
+    ids = new_ids + changed_ids
+
+    stats = add_documents(
+        collection,
+        ids,
+        [incoming[doc_id] for doc_id in ids],
+        embedding_function=embedding_function,
+        batch_size=batch_size,
+        max_batch_size=max_batch_size,
+        verbose=verbose,
+        metadatas=[{**incoming_metadatas[doc_id], "content_hash": hashes[doc_id]} for doc_id in ids],
+        upsert=True,
+    )
+    stats.update(new=len(new_ids), changed=len(changed_ids), unchanged=len(incoming) - len(ids))
+    if verbose:
+        print(f"Synced {len(incoming)} documents: {stats['new']} new, {stats['changed']} changed, {stats['unchanged']} unchanged")
+    return stats
+
+
+def _stored_hashes(collection: chromadb.Collection, ids: list[str], chunk_size: int) -> dict:
+    """Return the content hash stored for each id already in the collection."""
+    hashes = {}
+    for i in range(0, len(ids), chunk_size):
+        result = collection.get(ids=ids[i:i + chunk_size], include=["metadatas"])
+        for doc_id, metadata in zip(result["ids"], result["metadatas"]):
+            hashes[doc_id] = (metadata or {}).get("content_hash")
+    return hashes
+
+
+# Clients by path and collections by (path, name), shared by the threads of the process
+_clients = {}
+_collections = {}
+_collections_lock = threading.Lock()
+_default_embedding_function = None
+
+
+def get_collection(
+    collection_name: str, embedding_function: chromadb.EmbeddingFunction = None, path: str = None
+) -> chromadb.Collection:
     """Get a collection from a persistent vector database.
 
+    The client and collection are opened once per process and reused by later
+    calls, until clear_collection_cache is called. The default embedding
+    function is shared by all collections and loads its model on its first use.
+
     Args:
         collection_name (str): The name of the collection.
+        embedding_function (chromadb.EmbeddingFunction): The embedding function, Chroma's default if None.
+        path (str): The folder of the database, helpers.DATABASE_FOLDER if None.
 
     Returns:
         chromadb.Collection: The collection object.
 
     """
-    ##############################################################################
-    # TODO: Implement your code here
-    ##############################################################################
-    client = chromadb.PersistentClient(path=helpers.DATABASE_FOLDER)
-    embedding_function = ef.DefaultEmbeddingFunction()
+    import chromadb
+
+    path = os.path.abspath(path or helpers.DATABASE_FOLDER)
+    embedding_function = embedding_function or default_embedding_function()
+
+    with _collections_lock:
+        ##############################################################################
+        # TODO: Implement your code here
+        ##############################################################################
+        cached = _collections.get((path, collection_name))
+        if cached is not None and cached[0] is embedding_function:
+            return cached[1]
+
+        if path not in _clients:
+            _clients[path] = chromadb.PersistentClient(path=path)
+        collection = _clients[path].get_collection(
+            name=collection_name, embedding_function=embedding_function
+        )
+        _collections[(path, collection_name)] = (embedding_function, collection)
+        ##############################################################################
+
+    return collection
 
-    return client.get_collection(
-        name=collection_name, embedding_function=embedding_function
-    )
-    ##############################################################################
+
+def default_embedding_function() -> chromadb.EmbeddingFunction:
+    """Return the default embedding function shared by the collections of get_collection.
+
+    It is created on the first call, and loads its model on its first use.
+
+    Returns:
+        chromadb.EmbeddingFunction: The embedding function, named like Chroma's default.
+
+    """
+    import embedding_functions
+
+    global _default_embedding_function
+
+    with _collections_lock:
+        if _default_embedding_function is None:
+            _default_embedding_function = embedding_functions.default_embedding_function()
+        return _default_embedding_function
+
+
+def clear_collection_cache(collection_name: str = None, path: str = None) -> None:
+    """Forget the collections opened by get_collection, e.g. after a collection is deleted or recreated.
+
+    Args:
+        collection_name (str): The name of the collection to forget, all of them if None.
+        path (str): The folder of the database to forget, including its client, all of them if None.
+
+    """
+    path = os.path.abspath(path) if path else None
+
+    with _collections_lock:
+        for key in list(_collections):
+            if (path is None or key[0] == path) and (collection_name is None or key[1] == collection_name):
+                del _collections[key]
+
+        if collection_name is None:
+            for client_path in list(_clients):
+                if path is None or client_path == path:
+                    del _clients[client_path]
 
 
 def retrieve_events_by_country(
-    collection: chromadb.Collection, country_of_interest: str, n_results: int
+    collection: chromadb.Collection,
+    country_of_interest: str,
+    n_results: int,
+    where: dict = None,
+    country_code: str = None,
 ) -> tuple[list[str], np.array]:
     """Search for events that happened in a specific country.
 
+    Only the events of the country are searched, as selected by country_filter,
+    so up to n_results of them are returned by a single query.
+
     Args:
         collection (chromadb.Collection): The collection object.
-        query_texts (list[str]): The list of query texts.
+        country_of_interest (str): The country of the events.
         n_results (int): The number of results to return.
+        where (dict): An optional filter on the metadata of the events, e.g. from event_filter.
+        country_code (str): The country code of the events, to filter on instead of the country.
 
     Returns:
         list[str]: The list of documents.
@@ -108,26 +480,78 @@ def retrieve_events_by_country(
     # TODO: Implement your code here
     ##############################################################################
 
-    # Perform query with embeddings included
+    # Filter inside the index rather than on the top n_results
+    where, where_document = country_filter(collection, country_of_interest, where, country_code)
     results = collection.query(
-        query_texts=[query], n_results=n_results, include=["documents", "embeddings"]
+        query_texts=[query],
+        n_results=n_results,
+        where=where,
+        where_document=where_document,
+        include=["documents", "embeddings"],
     )
 
     # If no documents are retrieved, return empty results
-    if not results["documents"]:
+    if not results["documents"] or not results["documents"][0]:
         return [], np.array([])
 
-    # Flatten nested lists
-    documents = [doc for sublist in results["documents"] for doc in sublist]
-    embeddings = np.array(results["embeddings"]).squeeze(axis=0)  # Ensure correct shape
-
-    # Apply filtering directly to documents and embeddings
-    documents, embeddings = zip(*[
-        (doc, emb) for doc, emb in zip(documents, embeddings) if country_of_interest in doc
-        ]) if any(country_of_interest in doc for doc in documents) else ([], np.array([]))
-
-    # Convert `zip` object back to lists for consistency
-    documents, embeddings = list(documents), np.array(embeddings)
+    # Chroma returns the embeddings of each query as one float64 array, converted back to a float32 buffer
+    documents = results["documents"][0]
+    embeddings = np.ascontiguousarray(results["embeddings"][0], dtype=np.float32)
     ##############################################################################
 
     return documents, embeddings
+
+
+def retrieve_events_by_countries(
+    collection: chromadb.Collection,
+    countries: list[str],
+    n_results: int,
+    where: dict = None,
+    embedding_function: chromadb.EmbeddingFunction = None,
+    max_workers: int = 8,
+) -> dict:
+    """Search for events that happened in each of several countries.
+
+    The query texts of all countries are embedded in a single batch. Chroma
+    applies one filter to all the queries of a call, so each country is then
+    searched with its own filter, on a pool of threads.
+
+    Args:
+        collection (chromadb.Collection): The collection object.
+        countries (list[str]): The countries of the events.
+        n_results (int): The number of results to return for each country.
+        where (dict): An optional filter on the metadata of the events, e.g. from event_filter.
+        embedding_function (chromadb.EmbeddingFunction): The embedding function of the queries,
+            the one of the collection if None.
+        max_workers (int): The number of queries run at the same time.
+
+    Returns:
+        dict: The documents and embeddings of each country, as returned by retrieve_events_by_country.
+
+    """
+    countries = list(dict.fromkeys(countries))
+    if not countries:
+        return {}
+
+    query_texts = [f"Happened at {country}" for country in countries]
+    if embedding_function is not None:
+        query_embeddings = embedding_function.embed_query(query_texts)
+    else:
+        # Embedded as collection.query(query_texts=...) would, with the function the collection was opened with
+        query_embeddings = collection._embed(input=query_texts, is_query=True)
+
+    def query(country, query_embedding):
+        country_where, where_document = country_filter(collection, country, where)
+        results = collection.query(
+            query_embeddings=[query_embedding],
+            n_results=n_results,
+            where=country_where,
+            where_document=where_document,
+            include=["documents", "embeddings"],
+        )
+        if not results["documents"] or not results["documents"][0]:
+            return [], np.array([])
+        return results["documents"][0], np.ascontiguousarray(results["embeddings"][0], dtype=np.float32)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return dict(zip(countries, pool.map(query, countries, query_embeddings)))